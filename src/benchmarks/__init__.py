@@ -0,0 +1,3 @@
+"""
+Các script đo hiệu năng của hệ thống giám sát giao thông
+"""
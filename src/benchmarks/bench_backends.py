@@ -0,0 +1,71 @@
+"""
+So sánh độ trễ và thông lượng giữa backend PyTorch (ultralytics) và ONNX Runtime
+
+Cách dùng:
+    python -m src.benchmarks.bench_backends --video data/uploads/sample.mp4 --backends torch onnx
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.config import MODEL_PATH
+from src.models.detector import TrafficDetector
+from src.utils.video_utils import sample_video_frames
+
+def measure_latency(detector, frames, warmup=3):
+    """
+    Đo độ trễ từng frame (batch = 1)
+    
+    Returns:
+        np.ndarray: Độ trễ từng frame (ms)
+    """
+    for frame in frames[:warmup]:
+        detector.detect(frame)
+    
+    latencies = []
+    for frame in frames:
+        start_time = time.perf_counter()
+        detector.detect(frame)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return np.array(latencies)
+
+def measure_throughput(detector, frames, batch_size):
+    """
+    Đo thông lượng khi chạy theo lô
+    
+    Returns:
+        float: Số frame mỗi giây
+    """
+    start_time = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        detector.detect_batch(frames[i:i + batch_size])
+    return len(frames) / (time.perf_counter() - start_time)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend suy luận của TrafficDetector")
+    parser.add_argument('--model', default=MODEL_PATH, help="Đường dẫn mô hình .pt")
+    parser.add_argument('--video', default=None, help="Video lấy mẫu frame (mặc định: frame ngẫu nhiên)")
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx'])
+    args = parser.parse_args()
+    
+    frames = sample_video_frames(args.video, args.frames)
+    
+    print(f"{'backend':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'fps (b=1)':>9} | {f'fps (b={args.batch_size})':>10}")
+    print("-" * 57)
+    for backend in args.backends:
+        detector = TrafficDetector(args.model, backend=backend)
+        latencies = measure_latency(detector, frames)
+        throughput = measure_throughput(detector, frames, args.batch_size)
+        print(f"{backend:>8} | {np.percentile(latencies, 50):>8.2f} | {np.percentile(latencies, 95):>8.2f} | "
+              f"{1000 / latencies.mean():>9.2f} | {throughput:>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Đo thông lượng (frame/giây) của bộ lập lịch suy luận theo lô theo kích thước lô
+
+Cách dùng:
+    python -m src.benchmarks.bench_batch_inference --video data/uploads/sample.mp4 --batch-sizes 1 2 4 8
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.config import MODEL_PATH, BATCH_MAX_WAIT_MS
+from src.models.detector import TrafficDetector
+from src.services.batch_scheduler import BatchInferenceScheduler
+from src.utils.video_utils import sample_video_frames
+
+def run_producers(scheduler, frames, producers):
+    """
+    Chạy nhiều nguồn gửi frame song song, mỗi nguồn gửi toàn bộ danh sách frame
+    
+    Returns:
+        float: Thời gian chạy (giây)
+    """
+    def producer():
+        # Mỗi nguồn giữ nhiều frame đang chờ giống như pipeline trong VideoProcessor
+        futures = [scheduler.submit(frame) for frame in frames]
+        for future in futures:
+            future.result()
+    
+    threads = [threading.Thread(target=producer) for _ in range(producers)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suy luận theo lô cho TrafficDetector")
+    parser.add_argument('--model', default=MODEL_PATH, help="Đường dẫn mô hình")
+    parser.add_argument('--video', default=None, help="Video lấy mẫu frame (mặc định: frame ngẫu nhiên)")
+    parser.add_argument('--frames', type=int, default=32, help="Số frame mỗi nguồn")
+    parser.add_argument('--producers', type=int, default=2, help="Số nguồn (luồng video) gửi frame đồng thời")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--max-wait-ms', type=float, default=BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+    
+    detector = TrafficDetector(args.model)
+    frames = sample_video_frames(args.video, args.frames)
+    
+    # Khởi động mô hình một lần trước khi đo
+    detector.detect_batch(frames[:1])
+    
+    total_frames = len(frames) * args.producers
+    print(f"{'batch':>5} | {'fps':>8} | {'avg batch':>9} | {'ms/frame':>8}")
+    print("-" * 40)
+    for batch_size in args.batch_sizes:
+        scheduler = BatchInferenceScheduler(detector, max_batch_size=batch_size, max_wait_ms=args.max_wait_ms)
+        scheduler.start()
+        try:
+            elapsed = run_producers(scheduler, frames, args.producers)
+        finally:
+            scheduler.stop()
+        stats = scheduler.get_stats()
+        print(f"{batch_size:>5} | {total_frames / elapsed:>8.2f} | {stats['avg_batch_size']:>9.2f} | {stats['avg_ms_per_frame']:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Đo thời gian import khi khởi động máy chủ (python -X importtime) và chặn hồi quy
+
+Cách dùng:
+    python -m src.benchmarks.bench_import_time --module src.app --max-ms 800
+
+Script trả về mã lỗi 1 nếu tổng thời gian import vượt ngưỡng hoặc nếu một module
+nặng (torch, ultralytics, discord, telegram, ...) bị nạp ngay khi khởi động.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Các module chỉ được nạp khi dùng lần đầu hoặc trong luồng tải mô hình nền
+HEAVY_MODULES = ('torch', 'ultralytics', 'onnxruntime', 'shapely', 'discord', 'telegram')
+
+def measure_import_time(module, runs=3):
+    """
+    Import module trong tiến trình Python mới với -X importtime
+
+    Tham số:
+        module: Tên module cần đo (ví dụ 'src.app')
+        runs: Số lần đo, lấy lần nhanh nhất để giảm nhiễu
+
+    Trả về:
+        (tổng thời gian ms, {tên module: (self ms, cumulative ms)}) của lần nhanh nhất
+    """
+    best = None
+    for _ in range(max(1, runs)):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=PROJECT_ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Không thể import {module}:\n{result.stderr[-2000:]}")
+
+        modules = parse_importtime(result.stderr)
+        total_ms = modules.get(module, (0.0, 0.0))[1]
+        if best is None or total_ms < best[0]:
+            best = (total_ms, modules)
+    return best
+
+def parse_importtime(output):
+    """
+    Phân tích đầu ra của -X importtime
+
+    Mỗi dòng có dạng 'import time: <self us> | <cumulative us> | <tên module>'
+
+    Trả về:
+        dict: {tên module: (self ms, cumulative ms)}
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Dòng tiêu đề
+        modules[parts[2].strip()] = (int(parts[0]) / 1000.0, int(parts[1]) / 1000.0)
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian import khi khởi động máy chủ")
+    parser.add_argument('--module', default='src.app', help="Module cần đo")
+    parser.add_argument('--max-ms', type=float, default=800.0, help="Ngưỡng tổng thời gian import (ms)")
+    parser.add_argument('--runs', type=int, default=3, help="Số lần đo")
+    parser.add_argument('--top', type=int, default=10, help="Số module chậm nhất cần in")
+    args = parser.parse_args()
+
+    total_ms, modules = measure_import_time(args.module, args.runs)
+
+    print(f"Import {args.module}: {total_ms:.1f}ms (ngưỡng {args.max_ms:.0f}ms)")
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_ms, cumulative_ms) in slowest:
+        print(f"{self_ms:9.1f} {cumulative_ms:9.1f}  {name}")
+
+    failures = []
+    if total_ms > args.max_ms:
+        failures.append(f"tổng thời gian import {total_ms:.1f}ms vượt ngưỡng {args.max_ms:.0f}ms")
+    heavy = sorted(name for name in modules if name.split('.')[0] in HEAVY_MODULES)
+    if heavy:
+        failures.append(f"module nặng bị nạp khi khởi động: {', '.join(heavy[:10])}")
+
+    for failure in failures:
+        print(f"LỖI: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+So sánh chi phí và số biển số tìm được giữa một lượt toàn khung hình và phát hiện theo ô
+
+Cách dùng:
+    python -m src.benchmarks.bench_tiled_plates --video data/uploads/sample.mp4 --zone 0 0.3 1 1
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.config import MODEL_PATH, PLATE_TILE_OVERLAP
+from src.models.backends import non_max_suppression
+from src.models.detector import TrafficDetector
+from src.utils.video_utils import sample_video_frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phát hiện biển số theo ô")
+    parser.add_argument('--model', default=MODEL_PATH, help="Đường dẫn mô hình")
+    parser.add_argument('--video', default=None, help="Video lấy mẫu frame (mặc định: frame ngẫu nhiên)")
+    parser.add_argument('--frames', type=int, default=16)
+    parser.add_argument('--zone', type=float, nargs=4, default=[0, 0, 1, 1],
+                        help="Vùng phương tiện chuẩn hóa x1 y1 x2 y2")
+    parser.add_argument('--tile-size', type=int, default=0, help="Cạnh ô (0 = kích thước đầu vào mô hình)")
+    parser.add_argument('--overlap', type=float, default=PLATE_TILE_OVERLAP)
+    args = parser.parse_args()
+
+    frames = sample_video_frames(args.video, args.frames)
+    detector = TrafficDetector(args.model)
+    detector.detect(frames[0])  # Khởi động
+
+    full_ms, tiled_ms, tiles = [], [], []
+    full_plates = merged_plates = 0
+    for frame in frames:
+        height, width = frame.shape[:2]
+        bounds = (args.zone[0] * width, args.zone[1] * height, args.zone[2] * width, args.zone[3] * height)
+
+        start_time = time.perf_counter()
+        plates = detector.detect(frame).license_plates
+        full_ms.append((time.perf_counter() - start_time) * 1000)
+
+        start_time = time.perf_counter()
+        tiled, tile_count = detector.detect_tiled(frame, bounds, args.tile_size or None, args.overlap)
+        merged = plates + tiled.license_plates
+        if len(merged) > 1:
+            merged = [merged[i] for i in non_max_suppression([p[:4] for p in merged], [p[4] for p in merged])]
+        tiled_ms.append((time.perf_counter() - start_time) * 1000)
+        tiles.append(tile_count)
+
+        full_plates += len(plates)
+        merged_plates += len(merged)
+
+    print(f"Frame: {len(frames)}, ô trung bình: {np.mean(tiles):.1f}")
+    print(f"Lượt toàn khung hình: {np.mean(full_ms):.1f}ms/frame, {full_plates} biển số")
+    print(f"Thêm theo ô:          {np.mean(tiled_ms):.1f}ms/frame, {merged_plates} biển số sau khi gộp")
+    if merged_plates:
+        print(f"Tỉ lệ biển số chỉ một lượt toàn khung hình tìm được: {min(1.0, full_plates / merged_plates):.2%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Đo thời gian ghép cặp phát hiện với phương tiện đang theo dõi theo số phương tiện mỗi frame:
+vòng lặp tham lam theo khoảng cách tâm (cách cũ) so với ma trận chi phí NumPy + thuật toán Hungary
+
+Dữ liệu là giao thông tổng hợp dày đặc (hộp cỡ xe máy dịch chuyển vài pixel giữa hai frame),
+nên không cần mô hình hay video.
+
+Cách dùng:
+    python -m src.benchmarks.bench_tracking --objects 10 100 500
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.config import FRAME_WIDTH, FRAME_HEIGHT
+from src.models.association import associate
+
+def make_scene(count, rng, box_size=(40, 80), max_motion=8.0):
+    """
+    Tạo hộp của các phương tiện ở frame trước và frame hiện tại (thứ tự phát hiện bị xáo trộn)
+
+    Returns:
+        (track_boxes, detection_boxes, truth): truth[i] là chỉ số phương tiện đúng của phát hiện i
+    """
+    width, height = box_size
+    x1 = rng.uniform(0, FRAME_WIDTH - width, count)
+    y1 = rng.uniform(0, FRAME_HEIGHT - height, count)
+    track_boxes = np.stack([x1, y1, x1 + width, y1 + height], axis=1)
+
+    motion = rng.uniform(-max_motion, max_motion, (count, 2))
+    detection_boxes = track_boxes + np.concatenate([motion, motion], axis=1)
+    truth = rng.permutation(count)
+    return track_boxes, detection_boxes[truth], truth
+
+def greedy_associate(detection_boxes, track_boxes, max_distance):
+    """
+    Cách ghép cũ: mỗi phát hiện lấy phương tiện có tâm gần nhất, hai phát hiện có thể lấy cùng một phương tiện
+    """
+    track_centers = [((x1 + x2) / 2, (y1 + y2) / 2) for x1, y1, x2, y2 in track_boxes]
+    matches = []
+    for detection_index, (x1, y1, x2, y2) in enumerate(detection_boxes):
+        center_x, center_y = (x1 + x2) / 2, (y1 + y2) / 2
+        min_distance = float('inf')
+        closest = None
+        for track_index, (last_x, last_y) in enumerate(track_centers):
+            distance = ((center_x - last_x) ** 2 + (center_y - last_y) ** 2) ** 0.5
+            if distance < min_distance and distance < max_distance:
+                min_distance = distance
+                closest = track_index
+        if closest is not None:
+            matches.append((detection_index, closest))
+    return matches
+
+def measure(function, repeats):
+    """
+    Returns:
+        (kết quả lần chạy cuối, thời gian trung bình ms)
+    """
+    function()  # Lần chạy khởi động không tính giờ
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return result, (time.perf_counter() - start_time) * 1000 / repeats
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ghép cặp phát hiện - phương tiện đang theo dõi")
+    parser.add_argument('--objects', type=int, nargs='+', default=[10, 100, 500], help="Số phương tiện mỗi frame")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--max-distance', type=float, default=100.0, help="Ngưỡng khoảng cách tâm (pixel)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'objects':>7} | {'greedy ms':>9} | {'hungarian ms':>12} | {'greedy dup':>10} | {'greedy acc':>10} | {'hungarian acc':>13}")
+    print("-" * 80)
+    for count in args.objects:
+        track_boxes, detection_boxes, truth = make_scene(count, rng)
+        track_list = [tuple(box) for box in track_boxes]
+        detection_list = [tuple(box) for box in detection_boxes]
+
+        greedy, greedy_ms = measure(lambda: greedy_associate(detection_list, track_list, args.max_distance),
+                                    args.repeats)
+        (matches, _, _), hungarian_ms = measure(lambda: associate(detection_list, track_list, args.max_distance),
+                                                args.repeats)
+
+        # Số phát hiện tranh cùng một phương tiện và tỉ lệ ghép đúng
+        duplicates = len(greedy) - len({track_index for _, track_index in greedy})
+        greedy_accuracy = sum(truth[d] == t for d, t in greedy) / count
+        hungarian_accuracy = sum(truth[d] == t for d, t in matches) / count
+        print(f"{count:>7} | {greedy_ms:>9.2f} | {hungarian_ms:>12.2f} | {duplicates:>10} | "
+              f"{greedy_accuracy:>10.3f} | {hungarian_accuracy:>13.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -6,14 +6,11 @@ import os
 import random
 import traceback
 import time
-import asyncio
 from functools import wraps
 
 from src.core.config import logger, PROCESSED_FOLDER, VIOLATIONS_FOLDER
 from src.utils.file_utils import save_uploaded_file, save_boundaries, load_boundaries
 from src.utils.video_utils import get_latest_frame, create_empty_frame, save_frame, read_frame
-from src.bot.discord_bot import send_violation_to_discord
-from src.bot.telegram_bot import send_violation_to_telegram
 
 # Create API blueprint
 api = Blueprint('api', __name__)
@@ -106,6 +103,14 @@ def upload_file():
             logger.error(f"File quá lớn: {file_size} bytes (giới hạn: {max_size} bytes)")
             return jsonify({'error': f'File too large. Maximum size is 2GB'}), 413
         
+        # Mô hình riêng cho camera này (tùy chọn, tên file trong thư mục mô hình)
+        model_path = None
+        model_name = request.form.get('model')
+        if model_name and video_processor is not None:
+            model_path = video_processor.resolve_model_path(model_name)
+            if model_path is None:
+                return jsonify({'error': f'Unknown model: {model_name}'}), 400
+        
         # Save uploaded file
         logger.info(f"Bắt đầu lưu file: {file.filename}")
         video_id, video_path = save_uploaded_file(file)
@@ -146,7 +151,7 @@ def upload_file():
                 logger.error("Video processor is None, không thể xử lý video")
                 return jsonify({'error': 'Video processor not initialized'}), 500
                 
-            video_processor.start_processing(video_path, boundaries)
+            video_processor.start_processing(video_path, boundaries, model_path)
             logger.info(f"Đã bắt đầu xử lý video: {video_path}")
         except Exception as e:
             logger.error(f"Lỗi khi bắt đầu xử lý video: {str(e)}")
@@ -195,6 +200,35 @@ def save_boundaries_route():
         'message': 'Boundary data saved successfully'
     })
 
+@api.route('/what_if_boundaries', methods=['POST'])
+def what_if_boundaries_route():
+    """Re-evaluate violations for new boundaries over the recorded track log of a video"""
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No boundary data sent'}), 400
+    
+    boundaries = data.get('boundaries')
+    if not boundaries:
+        return jsonify({'error': 'Invalid boundary data'}), 400
+    
+    try:
+        result = video_processor.evaluate_boundaries(boundaries, data.get('video_id'))
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Lỗi khi đánh giá biên mới: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'message': f'Error evaluating boundaries: {str(e)}'}), 500
+    
+    if result is None:
+        return jsonify({
+            'success': False,
+            'message': 'No track log found for this video, process it first'
+        }), 404
+    
+    result['success'] = True
+    return jsonify(result)
+
 @api.route('/get_boundaries/<video_id>', methods=['GET'])
 @cached('boundaries', ttl_seconds=60)  # Cache boundaries for 60 seconds
 def get_boundaries_route(video_id):
@@ -325,6 +359,37 @@ def stop_processing():
             'message': 'Đã xảy ra lỗi khi dừng xử lý video'
         }), 500
 
+@api.route('/models', methods=['GET'])
+def list_models():
+    """List selectable model files, the active model and the resident models"""
+    return jsonify(video_processor.list_models())
+
+@api.route('/model', methods=['POST'])
+def swap_model():
+    """Swap the model of the running stream between two frames without stopping it"""
+    data = request.json or {}
+    model_name = data.get('model')
+    model_path = video_processor.resolve_model_path(model_name)
+    if model_path is None:
+        return jsonify({'success': False, 'message': f'Unknown model: {model_name}'}), 400
+    
+    try:
+        swapped = video_processor.swap_model(model_path)
+    except Exception as e:
+        logger.error(f"Lỗi khi đổi mô hình: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'message': f'Error loading model: {str(e)}'}), 500
+    
+    # Clear cache so that stats show the new model
+    global cache
+    cache = {}
+    
+    return jsonify({
+        'success': swapped,
+        'model': os.path.basename(model_path),
+        'message': 'Model swap scheduled' if swapped else 'Model file not found'
+    })
+
 @api.route('/processed/<path:filename>')
 def processed_file(filename):
     """Serve processed files"""
@@ -398,6 +463,10 @@ def confirm_violation():
         # Gửi thông báo vi phạm lên Discord
         if violation_info:
             try:
+                # Chỉ nạp thư viện Discord khi thực sự gửi thông báo để máy chủ khởi động nhanh
+                import asyncio
+                from src.bot.discord_bot import send_violation_to_discord
+                
                 # Chạy hàm bất đồng bộ trong luồng chính
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
@@ -423,6 +492,9 @@ def confirm_violation():
             
             # Gửi thông báo vi phạm lên Telegram
             try:
+                # Chỉ nạp thư viện Telegram khi thực sự gửi thông báo
+                from src.bot.telegram_bot import send_violation_to_telegram
+                
                 logger.info(f"Bắt đầu gửi thông tin vi phạm #{violation_id} lên Telegram")
                 
                 # Gọi hàm gửi thông báo đến Telegram
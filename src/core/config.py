@@ -2,6 +2,7 @@
 Module cấu hình cho hệ thống giám sát giao thông
 """
 import os
+import json
 import logging
 import sys
 import time
@@ -17,20 +18,158 @@ UPLOAD_FOLDER = os.path.join(DATA_DIR, 'uploads')
 PROCESSED_FOLDER = os.path.join(DATA_DIR, 'processed')
 BOUNDARIES_FOLDER = os.path.join(DATA_DIR, 'boundaries')
 VIOLATIONS_FOLDER = os.path.join(DATA_DIR, 'violations')
+REPORTS_FOLDER = os.path.join(DATA_DIR, 'reports')
+DETECTION_CACHE_FOLDER = os.path.join(DATA_DIR, 'cache', 'detections')
+TRACK_LOG_FOLDER = os.path.join(DATA_DIR, 'cache', 'tracks')
 
 # Đảm bảo tất cả các thư mục đều tồn tại
-for folder in [UPLOAD_FOLDER, PROCESSED_FOLDER, BOUNDARIES_FOLDER, VIOLATIONS_FOLDER]:
+for folder in [UPLOAD_FOLDER, PROCESSED_FOLDER, BOUNDARIES_FOLDER, VIOLATIONS_FOLDER, DETECTION_CACHE_FOLDER, TRACK_LOG_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
+# Các giá trị đã được tinh chỉnh tự động (python -m src.models.autotune) được lưu tại đây
+# và được ưu tiên hơn giá trị mặc định (nhưng không hơn biến môi trường)
+TUNING_FILE = os.path.join(DATA_DIR, 'tuning.json')
+
+def load_tuning(path=TUNING_FILE):
+    """
+    Đọc các giá trị đã tinh chỉnh tự động (trả về dict rỗng nếu chưa có hoặc file lỗi)
+    """
+    try:
+        with open(path, 'r') as f:
+            values = json.load(f)
+        return values if isinstance(values, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_tuning(values, path=TUNING_FILE):
+    """
+    Gộp và ghi các giá trị đã tinh chỉnh vào file tinh chỉnh
+
+    Trả về:
+        dict: Toàn bộ giá trị tinh chỉnh sau khi gộp
+    """
+    tuning = load_tuning(path)
+    tuning.update(values)
+    with open(path, 'w') as f:
+        json.dump(tuning, f, indent=2)
+    return tuning
+
+TUNING = load_tuning()
+
 # Cấu hình mô hình
 MODEL_PATH = os.path.join(MODEL_DIR, 'v5.pt')
 
+# Backend suy luận: 'torch' (ultralytics/PyTorch) hoặc 'onnx' (ONNX Runtime trên CPU)
+# Với 'onnx', file v5.onnx sẽ được xuất tự động từ v5.pt ở lần tải đầu tiên nếu chưa có
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'torch')
+
+# Độ chính xác của mô hình: 'fp32' hoặc 'int8' (ONNX Runtime, tạo bằng python -m src.models.quantization)
+DETECTOR_PRECISION = os.environ.get('DETECTOR_PRECISION', 'fp32')
+QUANTIZED_MODEL_PATH = os.path.join(MODEL_DIR, 'v5.int8.onnx')
+
+# Sổ đăng ký mô hình: các mô hình (ví dụ trọng số riêng cho từng camera) được tải khi cần và
+# giữ lại theo thứ tự dùng gần đây nhất trong giới hạn bộ nhớ ước tính
+MODEL_REGISTRY_BUDGET_MB = int(os.environ.get('MODEL_REGISTRY_BUDGET_MB', 2048))
+MODEL_MEMORY_FACTOR = 4.0  # Bộ nhớ ước tính của một mô hình đã tải = kích thước file x hệ số này
+MODEL_EXTENSIONS = ('.pt', '.onnx')
+
+# Kích thước đầu vào của mô hình (cạnh ảnh vuông sau letterbox), độc lập với kích thước khung hình
+INFERENCE_IMGSZ = int(os.environ.get('INFERENCE_IMGSZ', TUNING.get('inference_imgsz', 640)))
+
+# Suy luận hai tầng: mô hình nhỏ chạy trên mọi frame được chọn, mô hình đầy đủ (v5.pt) chỉ chạy
+# khi đèn đỏ và có phương tiện gần vạch dừng, hoặc khi kết quả của mô hình nhỏ không chắc chắn
+ENABLE_CASCADE = os.environ.get('ENABLE_CASCADE', 'False').lower() == 'true'
+CASCADE_FAST_MODEL_PATH = os.environ.get('CASCADE_FAST_MODEL_PATH', os.path.join(MODEL_DIR, 'v5n.pt'))
+CASCADE_NEAR_LINE_DISTANCE = 150  # Khoảng cách (pixel ở FRAME_HEIGHT) từ đuôi xe tới vạch để chạy mô hình đầy đủ
+CASCADE_CONFIDENT_SCORE = 0.5  # Độ tin cậy dưới ngưỡng này được coi là không chắc chắn
+CASCADE_AMBIGUOUS_RATIO = 0.3  # Tỉ lệ đối tượng không chắc chắn tối thiểu để chạy mô hình đầy đủ
+
 # Cờ tối ưu hóa hiệu suất
 ENABLE_LAZY_LOADING = True  # Bật/tắt lazy loading của mô hình
 PRELOAD_MODEL = True  # Tự động tải mô hình sau khi khởi động
+MODEL_WARMUP_RUNS = 3  # Số lần suy luận khởi động sau khi tải mô hình (0 = tắt)
 WORKER_THREADS = 2  # Số lượng worker thread xử lý frame
 FRAME_BUFFER_SIZE = 30  # Kích thước buffer cho frame đang xử lý
 
+# Phân bổ lõi CPU giữa giải mã video, suy luận và mã hóa ảnh (chia đều cho các luồng video đang chạy)
+# THREAD_BUDGET_CORES = 0 dùng toàn bộ lõi của máy; tỉ lệ được tinh chỉnh bằng
+# python -m src.models.autotune threads
+ENABLE_THREAD_BUDGET = True
+THREAD_BUDGET_CORES = int(os.environ.get('THREAD_BUDGET_CORES', 0))
+THREAD_SPLIT = TUNING.get('thread_split', {'decode': 0.25, 'inference': 0.625, 'encode': 0.125})
+
+# Chế độ suy luận khi đã có vùng phát hiện:
+# 'full' = chạy mô hình trên toàn khung hình
+# 'zones' = chỉ chạy trên hình chữ nhật bao vehiclePolygon và trafficLightPolygon (một lần gọi theo lô);
+#           khi đó số lượng phương tiện chỉ được đếm trong các vùng này
+# 'tracks' = chạy toàn khung hình mỗi ROI_REFRESH_INTERVAL frame đã phân tích; ở các frame giữa chỉ chạy trên
+#            vùng mở rộng quanh các xe đang theo dõi, dải ở mép vào của vehiclePolygon và vùng đèn (một lần gọi theo lô)
+INFERENCE_MODE = os.environ.get('INFERENCE_MODE', 'full')
+ZONE_CROP_MARGIN = 32  # Số pixel mở rộng quanh mỗi vùng cắt để không cắt cụt phương tiện ở mép vùng
+ROI_REFRESH_INTERVAL = 5  # Số frame đã phân tích giữa hai lần chạy toàn khung hình ở chế độ 'tracks'
+ROI_TRACK_MARGIN = 0.5  # Mở rộng vùng quanh mỗi xe theo tỉ lệ kích thước xe (mỗi phía)
+ROI_ENTRY_STRIP = 0.2  # Chiều cao dải ở mép vào theo tỉ lệ chiều cao vehiclePolygon
+ROI_MAX_AREA_RATIO = 0.6  # Chạy toàn khung hình khi tổng diện tích các vùng vượt tỉ lệ này
+
+# Bộ xác định trạng thái đèn bằng màu HSV (khóa vị trí đèn sau vài lần YOLO phát hiện,
+# sau đó phân loại màu mỗi frame và chỉ dùng lại YOLO định kỳ hoặc khi độ tin cậy giảm)
+ENABLE_LIGHT_STATE_ENGINE = True
+LIGHT_REFRESH_INTERVAL = 30  # Số frame tối đa giữa hai lần chạy YOLO cho vùng đèn
+LIGHT_RETRY_INTERVAL = 10  # Số frame tối thiểu giữa hai lần chạy YOLO cho vùng đèn khi chưa khóa hoặc màu không chắc chắn
+
+# Di chuyển hộp phương tiện bằng optical flow Lucas-Kanade trên các frame không chạy mô hình
+# (khi đèn đỏ và đang theo dõi phương tiện) để phát hiện vượt vạch đúng frame
+ENABLE_BOX_PROPAGATION = True
+PROPAGATION_MAX_WIDTH = 960  # Chiều rộng tối đa của ảnh xám dùng cho optical flow
+PROPAGATION_POINTS_PER_BOX = 10  # Số điểm đặc trưng tối đa trong mỗi hộp
+PROPAGATION_MAX_FB_ERROR = 1.0  # Sai số tiến-lùi tối đa (pixel) để giữ một điểm
+
+# Mô hình chuyển động vận tốc không đổi (Kalman) của các phương tiện đang theo dõi: ghép cặp theo
+# vị trí dự đoán (đúng cả khi bỏ qua frame) và dự đoán frame đuôi xe chạm vạch dừng
+KALMAN_PROCESS_NOISE = 1.0  # Phương sai gia tốc ngẫu nhiên (pixel ở FRAME_HEIGHT, theo frame)
+KALMAN_MEASUREMENT_NOISE = 4.0  # Độ lệch chuẩn tâm hộp phát hiện (pixel ở FRAME_HEIGHT)
+KALMAN_GATE_SIGMA = 3.0  # Ngưỡng ghép cặp được nới thêm số lần độ lệch chuẩn vị trí dự đoán
+TRACK_MAX_MISSES = 2  # Số frame phân tích liên tiếp giữ lại phương tiện không được phát hiện
+TRACK_MAX_AGE_SECONDS = 30  # Thời gian video tối đa theo dõi một phương tiện (có thể đã rời khỏi khung hình)
+
+# Bảng phương tiện đang theo dõi dạng mảng: số ô ban đầu (gấp đôi khi cần) và số vị trí
+# gần nhất được giữ cho mỗi phương tiện (bộ đệm vòng, bộ nhớ không tăng theo thời lượng luồng)
+TRACK_STORE_CAPACITY = 64
+TRACK_HISTORY_SIZE = 32
+
+# Phát hiện biển số theo ô ở độ phân giải gốc trong vùng phương tiện (chỉ khi đèn đỏ)
+ENABLE_TILED_PLATES = True
+PLATE_TILE_SIZE = 0  # Cạnh ô (pixel), 0 = kích thước đầu vào của mô hình
+PLATE_TILE_OVERLAP = 0.2  # Tỉ lệ chồng lấn giữa hai ô liền kề
+
+# Tìm biển số trên vùng cắt độ phân giải gốc của từng phương tiện vi phạm (chạy theo lô)
+ENABLE_CROP_PLATES = True
+PLATE_CROP_MARGIN = 0.1  # Mở rộng vùng cắt theo tỉ lệ kích thước xe
+
+# Cấu hình suy luận theo lô (gom frame từ một hoặc nhiều luồng video)
+ENABLE_BATCH_INFERENCE = True  # Bật/tắt bộ lập lịch suy luận theo lô
+BATCH_MAX_SIZE = 4  # Số frame tối đa trong một lô
+BATCH_MAX_WAIT_MS = 10  # Thời gian chờ tối đa (ms) để gom đủ lô
+# Số frame đã chọn của một luồng được giữ trong pipeline trước khi dùng kết quả khi phát theo thời gian
+# thực: mỗi frame thêm làm kết quả (và quyết định chọn frame, vùng suy luận, suy luận hai tầng) trễ
+# thêm một bước nhảy frame (3 frame ~ 100ms ở 30 FPS khi đèn đỏ). Khi PLAYBACK_SPEED = 0 pipeline
+# sâu bằng BATCH_MAX_SIZE để lô được lấp đầy
+BATCH_PIPELINE_DEPTH = 2
+PLAYBACK_SPEED = 1.0  # Tốc độ phát lại (1.0 = tốc độ thực, 0 = xử lý nhanh nhất có thể)
+
+# Cấu hình chọn frame thích ứng theo trạng thái cảnh
+SAMPLER_SPARSE_STRIDE = 8  # Bước nhảy frame khi đèn xanh hoặc chưa xác định
+SAMPLER_DENSE_STRIDE = 3  # Bước nhảy frame khi đèn đỏ hoặc vàng
+SAMPLER_NEAR_LINE_STRIDE = 1  # Bước nhảy frame khi đèn đỏ và có phương tiện sát vạch dừng
+SAMPLER_NEAR_LINE_DISTANCE = 80  # Khoảng cách (pixel ở FRAME_HEIGHT) từ đuôi xe tới vạch được coi là sát vạch
+
+# Cấu hình bộ lọc chuyển động (bỏ qua suy luận khi vùng phương tiện không có hoạt động)
+ENABLE_MOTION_GATE = True
+MOTION_GATE_WIDTH = 160  # Chiều rộng ảnh thu nhỏ dùng để so sánh frame
+MOTION_PIXEL_THRESHOLD = 25  # Chênh lệch độ sáng tối thiểu để pixel được coi là thay đổi
+MOTION_ACTIVITY_THRESHOLD = 0.002  # Tỉ lệ pixel thay đổi tối thiểu trong vùng phương tiện
+MOTION_MAX_SKIPPED_FRAMES = 15  # Số frame bỏ qua liên tiếp tối đa trước khi bắt buộc suy luận lại
+
 # Cấu hình Flask
 FLASK_HOST = os.environ.get('FLASK_HOST', '0.0.0.0')
 FLASK_PORT = int(os.environ.get('FLASK_PORT', 5000))
@@ -89,12 +228,20 @@ logger = logging.getLogger('traffic')
 logger.addFilter(log_filter)
 
 # Cấu hình xử lý video
+# Độ phân giải tham chiếu: frame được xử lý ở độ phân giải gốc của luồng, các ngưỡng
+# tính bằng pixel được quy đổi theo FRAME_HEIGHT
 FRAME_WIDTH = 1920  # Tăng từ 1280 để có chất lượng cao hơn
 FRAME_HEIGHT = 1080  # Tăng từ 720 để có chất lượng cao hơn
 
 # Cấu hình cache
 ENABLE_RESULT_CACHING = True  # Bật cache kết quả xử lý
 CACHE_TIMEOUT = 3600  # Thời gian cache kết quả (giây)
+# Lưu kết quả phát hiện của từng video xuống đĩa để xử lý lại (sau khi chỉnh vùng/vạch dừng) không cần chạy lại mô hình
+ENABLE_DETECTION_CACHE = True
+DETECTION_CACHE_MAX_ENTRIES = 20  # Số video tối đa được giữ trong cache
+# Ghi nhật ký hộp phương tiện và trạng thái đèn của từng frame để đánh giá lại vạch dừng/vùng mới
+# (POST /api/what_if_boundaries) mà không phải phát lại video
+ENABLE_TRACK_LOG = True
 
 # Cấu hình Discord
 DISCORD_WEBHOOK_URL = os.environ.get('DISCORD_WEBHOOK_URL', 'https://discord.com/api/webhooks/1372935139474280489/tD2uU2vOLyeaq-dhDWWWF9ze64azEdI1yetZaUvyp-l3YNwap-4D5GgXa3tfHystbJCf')
@@ -106,7 +253,7 @@ TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID', '7519520037')  # Cần thi
 # Chỉ log cấu hình quan trọng khi khởi động
 logger.warning(f"Starting Traffic Monitoring System - Model path: {MODEL_PATH}")
 logger.warning(f"Flask config: host={FLASK_HOST}, port={FLASK_PORT}, debug={FLASK_DEBUG}")
-logger.warning(f"Video resolution set to: {FRAME_WIDTH}x{FRAME_HEIGHT}")
+logger.warning(f"Reference resolution set to: {FRAME_WIDTH}x{FRAME_HEIGHT} (frames are processed at native resolution)")
 
 # Log cấu hình
 logger.info(f"Model path: {MODEL_PATH}")
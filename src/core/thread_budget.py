@@ -0,0 +1,134 @@
+"""
+Phân bổ lõi CPU giữa giải mã video, suy luận và mã hóa ảnh
+
+OpenCV, PyTorch và ONNX Runtime đều mặc định dùng toàn bộ lõi của máy; khi máy chủ web,
+bộ giải mã và detector chạy cùng lúc (nhiều luồng video) chúng tranh nhau lõi. ThreadBudget
+chia số lõi cho các luồng video đang chạy rồi chia tiếp theo tỉ lệ decode/inference/encode.
+"""
+import os
+import sys
+import threading
+
+import cv2
+
+from src.core.config import logger, ENABLE_THREAD_BUDGET, THREAD_BUDGET_CORES, THREAD_SPLIT
+
+class ThreadBudget:
+    def __init__(self, total_cores=None, split=None):
+        """
+        Tham số:
+            total_cores: Tổng số lõi được phép dùng (mặc định: THREAD_BUDGET_CORES hoặc toàn bộ lõi)
+            split: Tỉ lệ {'decode', 'inference', 'encode'} (mặc định: THREAD_SPLIT)
+        """
+        self.total_cores = total_cores or THREAD_BUDGET_CORES or os.cpu_count() or 1
+        self.split = dict(split or THREAD_SPLIT)
+        self.active_streams = 0
+        self.current = None
+        self.lock = threading.Lock()
+
+    def allocate(self, active_streams=1):
+        """
+        Tính số thread cho mỗi luồng video
+
+        Tham số:
+            active_streams: Số luồng video đang chạy
+
+        Trả về:
+            dict: {'decode', 'inference', 'encode', 'streams', 'cores_per_stream'}
+        """
+        streams = max(1, active_streams)
+        cores = max(1, self.total_cores // streams)
+        total_share = sum(self.split.values()) or 1.0
+        allocation = {name: max(1, int(round(cores * self.split.get(name, 0) / total_share)))
+                      for name in ('decode', 'inference', 'encode')}
+        allocation['streams'] = streams
+        allocation['cores_per_stream'] = cores
+        return allocation
+
+    def apply(self, active_streams=None):
+        """
+        Áp dụng phân bổ cho OpenCV và PyTorch (nếu đã được nạp)
+
+        OpenCV dùng chung một thread pool cho giải mã, thay đổi kích thước và mã hóa JPEG nên
+        nhận phần decode + encode. Phiên ONNX Runtime chỉ đọc số thread khi được tạo
+        (xem session_options).
+
+        Trả về:
+            dict: Phân bổ đã áp dụng
+        """
+        with self.lock:
+            if active_streams is not None:
+                self.active_streams = active_streams
+            allocation = self.allocate(self.active_streams)
+            if allocation == self.current:
+                return allocation
+            self.current = allocation
+
+        cv2.setNumThreads(allocation['decode'] + allocation['encode'])
+        # Không tự nạp torch ở đây để giữ thời gian khởi động máy chủ
+        if 'torch' in sys.modules:
+            apply_torch_threads(sys.modules['torch'], allocation['inference'])
+
+        logger.info(f"Phân bổ thread cho {allocation['streams']} luồng video: decode={allocation['decode']}, "
+                    f"inference={allocation['inference']}, encode={allocation['encode']}")
+        return allocation
+
+    def acquire_stream(self):
+        """
+        Đăng ký một luồng video bắt đầu chạy và phân bổ lại
+        """
+        return self.apply(self.active_streams + 1)
+
+    def release_stream(self):
+        """
+        Hủy đăng ký một luồng video đã dừng và phân bổ lại
+        """
+        return self.apply(max(0, self.active_streams - 1))
+
+    def inference_threads(self):
+        """
+        Số thread suy luận theo phân bổ hiện tại
+        """
+        return (self.current or self.allocate(self.active_streams))['inference']
+
+    def session_options(self, ort):
+        """
+        Tạo SessionOptions của ONNX Runtime theo phân bổ hiện tại
+
+        Tham số:
+            ort: Module onnxruntime
+
+        Trả về:
+            ort.SessionOptions
+        """
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.inference_threads()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        return options
+
+    def get_stats(self):
+        """
+        Lấy thông tin phân bổ hiện tại
+        """
+        return {
+            'enabled': ENABLE_THREAD_BUDGET,
+            'total_cores': self.total_cores,
+            'split': self.split,
+            'allocation': self.current or self.allocate(self.active_streams)
+        }
+
+def apply_torch_threads(torch, inference_threads):
+    """
+    Đặt số thread intra-op/inter-op của PyTorch
+
+    Số thread inter-op chỉ đặt được trước khi PyTorch chạy tác vụ song song đầu tiên
+    """
+    torch.set_num_threads(inference_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+# Bộ phân bổ dùng chung cho toàn bộ tiến trình
+thread_budget = ThreadBudget()
@@ -0,0 +1,170 @@
+"""
+Ghép cặp phát hiện với phương tiện đang theo dõi bằng ma trận chi phí NumPy và phép gán một-một
+"""
+import numpy as np
+
+# Chi phí của cặp không hợp lệ (ngoài ngưỡng), đủ lớn để không bao giờ được chọn thay cặp hợp lệ
+INFEASIBLE_COST = 1e6
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Tính IoU của mọi cặp hộp trong một lần
+
+    Tham số:
+        boxes_a: Mảng (N, 4) các hộp x1, y1, x2, y2
+        boxes_b: Mảng (M, 4) các hộp x1, y1, x2, y2
+
+    Trả về:
+        np.ndarray: Ma trận (N, M) IoU
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    xx1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    yy1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    xx2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    yy2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def center_distance_matrix(boxes_a, boxes_b):
+    """
+    Tính khoảng cách giữa tâm của mọi cặp hộp
+
+    Trả về:
+        np.ndarray: Ma trận (N, M) khoảng cách (pixel)
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    centers_a = (boxes_a[:, :2] + boxes_a[:, 2:]) / 2
+    centers_b = (boxes_b[:, :2] + boxes_b[:, 2:]) / 2
+    difference = centers_a[:, None, :] - centers_b[None, :, :]
+    return np.sqrt((difference ** 2).sum(axis=2))
+
+def linear_assignment(cost):
+    """
+    Phép gán một-một có tổng chi phí nhỏ nhất (thuật toán Hungary, đường tăng ngắn nhất)
+
+    Mỗi bước tăng chỉ duyệt Python theo số cột được thêm vào cây; phần cập nhật
+    thế vị và khoảng cách nhỏ nhất được tính bằng NumPy trên cả hàng.
+
+    Tham số:
+        cost: Ma trận chi phí (N, M)
+
+    Trả về:
+        (rows, cols): Hai mảng chỉ số, hàng rows[k] được gán cho cột cols[k], sắp theo hàng
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # Thuật toán cần số hàng <= số cột
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # Trường hợp thường gặp: mỗi hàng có cột chi phí nhỏ nhất riêng, đó đã là phép gán tối ưu
+    best_cols = np.argmin(cost, axis=1)
+    if len(np.unique(best_cols)) == n:
+        if not transposed:
+            return np.arange(n), best_cols
+        order = np.argsort(best_cols)
+        return best_cols[order], order
+
+    # Chỉ số bắt đầu từ 1, cột 0 là cột ảo giữ hàng đang được thêm vào
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # owner[j]: hàng được gán cho cột j (0 = chưa gán)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        owner[0] = i
+        column = 0
+        min_slack = np.full(m, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            row = owner[column]
+            free = ~used[1:]
+
+            slack = cost[row - 1] - u[row] - v[1:]
+            improved = free & (slack < min_slack)
+            min_slack[improved] = slack[improved]
+            way[1:][improved] = column
+
+            candidates = np.where(free, min_slack, np.inf)
+            next_column = int(np.argmin(candidates))
+            delta = candidates[next_column]
+
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_slack[free] -= delta
+
+            column = next_column + 1
+            if owner[column] == 0:
+                break
+
+        # Đảo các cạnh dọc đường tăng
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    cols = np.nonzero(owner[1:])[0]
+    rows = owner[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+def associate(detection_boxes, track_boxes, max_distance, min_iou=0.0):
+    """
+    Ghép một-một các phát hiện với các phương tiện đang theo dõi
+
+    Chi phí của một cặp là 1 - IoU khi hai hộp chồng lên nhau, và 1 + khoảng cách tâm / max_distance
+    khi không chồng lên nhau (phương tiện di chuyển nhanh hoặc bỏ qua nhiều frame). Cặp có
+    IoU <= min_iou và khoảng cách tâm >= max_distance không được ghép.
+
+    Tham số:
+        detection_boxes: Mảng (N, 4) hộp phát hiện trong frame hiện tại
+        track_boxes: Mảng (M, 4) hộp cuối cùng của các phương tiện đang theo dõi
+        max_distance: Khoảng cách tâm tối đa (pixel) để ghép hai hộp không chồng lên nhau; một số
+            cho mọi phương tiện hoặc mảng (M,) ngưỡng riêng của từng phương tiện
+        min_iou: IoU tối thiểu để ghép khi khoảng cách tâm vượt ngưỡng
+
+    Trả về:
+        (matches, unmatched_detections, unmatched_tracks): matches là danh sách (chỉ số phát hiện,
+        chỉ số phương tiện), hai danh sách còn lại là các chỉ số không được ghép
+    """
+    detection_count, track_count = len(detection_boxes), len(track_boxes)
+    if detection_count == 0 or track_count == 0:
+        return [], list(range(detection_count)), list(range(track_count))
+
+    iou = iou_matrix(detection_boxes, track_boxes)
+    distance = center_distance_matrix(detection_boxes, track_boxes)
+    max_distance = np.asarray(max_distance, dtype=np.float64)
+    feasible = (distance < max_distance) | (iou > min_iou)
+    cost = np.where(iou > 0, 1.0 - iou, 1.0 + distance / max_distance)
+    cost[~feasible] = INFEASIBLE_COST
+
+    # Chỉ giải trên các hàng/cột có ít nhất một cặp hợp lệ
+    detection_indices = np.nonzero(feasible.any(axis=1))[0]
+    track_indices = np.nonzero(feasible.any(axis=0))[0]
+    matches = []
+    if len(detection_indices) and len(track_indices):
+        rows, cols = linear_assignment(cost[np.ix_(detection_indices, track_indices)])
+        for row, col in zip(rows, cols):
+            detection_index, track_index = int(detection_indices[row]), int(track_indices[col])
+            if feasible[detection_index, track_index]:
+                matches.append((detection_index, track_index))
+
+    matched_detections = {detection_index for detection_index, _ in matches}
+    matched_tracks = {track_index for _, track_index in matches}
+    return (matches,
+            [i for i in range(detection_count) if i not in matched_detections],
+            [j for j in range(track_count) if j not in matched_tracks])
@@ -0,0 +1,298 @@
+"""
+Tự động tinh chỉnh cấu hình suy luận trên frame của video đã tải lên
+
+Cách dùng:
+    python -m src.models.autotune imgsz --video data/uploads/sample.mp4
+
+    python -m src.models.autotune threads --video data/uploads/sample.mp4 --streams 2
+
+Lệnh 'imgsz' chạy mô hình với nhiều kích thước đầu vào, so sánh độ trễ và mức
+đồng thuận với kích thước lớn nhất, chọn kích thước nhanh nhất vẫn đạt ngưỡng đồng
+thuận rồi ghi vào TUNING_FILE (được config đọc khi khởi động lại máy chủ).
+
+Lệnh 'threads' chạy đường ống giải mã -> suy luận -> mã hóa JPEG cho một hoặc nhiều
+luồng video song song với từng cách chia lõi CPU và ghi cách chia có thông lượng cao
+nhất vào TUNING_FILE.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.config import (
+    logger, MODEL_PATH, UPLOAD_FOLDER, ALLOWED_EXTENSIONS, REPORTS_FOLDER,
+    DETECTOR_BACKEND, INFERENCE_IMGSZ, TUNING_FILE, THREAD_SPLIT, save_tuning
+)
+from src.core.thread_budget import thread_budget
+from src.models.detector import TrafficDetector
+from src.models.evaluation import agreement_summary, measure_latency
+from src.utils.video_utils import sample_video_frames
+
+DEFAULT_IMGSZ_CANDIDATES = (320, 416, 512, 640, 768, 960, 1280)
+DEFAULT_INFERENCE_SHARES = (0.375, 0.5, 0.625, 0.75, 0.875)
+
+def latest_uploaded_video(upload_folder=UPLOAD_FOLDER):
+    """
+    Lấy video được tải lên gần nhất
+
+    Trả về:
+        str: Đường dẫn video, hoặc None nếu không có
+    """
+    if not os.path.isdir(upload_folder):
+        return None
+    videos = [os.path.join(upload_folder, f) for f in os.listdir(upload_folder)
+              if f.rsplit('.', 1)[-1].lower() in ALLOWED_EXTENSIONS]
+    return max(videos, key=os.path.getmtime) if videos else None
+
+def sweep_input_sizes(model_path, frames, sizes, backend=None, iou_threshold=0.5):
+    """
+    Đo độ trễ và mức đồng thuận của từng kích thước đầu vào so với kích thước lớn nhất
+
+    Tham số:
+        model_path: Đường dẫn mô hình
+        frames: Frame mẫu
+        sizes: Các kích thước đầu vào cần thử
+        backend: Backend suy luận (mặc định theo cấu hình)
+        iou_threshold: Ngưỡng IoU để coi hai hộp là cùng một đối tượng
+
+    Trả về:
+        list: [{'imgsz', 'latency_p50_ms', 'latency_p95_ms', 'agreement'}, ...] theo kích thước tăng dần
+    """
+    sizes = sorted(set(sizes))
+    results = {}
+    for size in sizes:
+        detector = TrafficDetector(model_path, backend=backend, imgsz=size)
+        detections, latencies = measure_latency(detector, frames)
+        results[size] = (detections, latencies)
+        logger.info(f"imgsz={size}: p50={np.percentile(latencies, 50):.1f}ms")
+
+    # Kích thước lớn nhất được dùng làm tham chiếu
+    reference = results[sizes[-1]][0]
+    rows = []
+    for size in sizes:
+        detections, latencies = results[size]
+        rows.append({
+            'imgsz': size,
+            'latency_p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'latency_p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'agreement': agreement_summary(reference, detections, iou_threshold)
+        })
+    return rows
+
+def choose_input_size(rows, min_agreement=0.95):
+    """
+    Chọn kích thước có độ trễ thấp nhất mà recall và precision so với tham chiếu đều đạt ngưỡng
+
+    Trả về:
+        int: Kích thước đầu vào được chọn
+    """
+    accepted = [row for row in rows
+                if min(row['agreement']['recall_vs_reference'],
+                       row['agreement']['precision_vs_reference']) >= min_agreement]
+    # Kích thước tham chiếu luôn đạt ngưỡng nên danh sách không bao giờ rỗng
+    return min(accepted or rows[-1:], key=lambda row: row['latency_p50_ms'])['imgsz']
+
+def write_report(report, name, folder=REPORTS_FOLDER):
+    """
+    Ghi kết quả tinh chỉnh ra JSON
+
+    Trả về:
+        str: Đường dẫn file JSON
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"autotune_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def tune_input_size(args):
+    video_path = args.video or latest_uploaded_video()
+    if not video_path:
+        logger.warning(f"Không có video nào trong {UPLOAD_FOLDER}, dùng frame ngẫu nhiên")
+    frames = sample_video_frames(video_path, args.num_frames)
+
+    rows = sweep_input_sizes(args.model, frames, args.sizes, args.backend, args.iou)
+    chosen = choose_input_size(rows, args.min_agreement)
+
+    print(f"{'imgsz':>6} {'p50 ms':>8} {'p95 ms':>8} {'recall':>8} {'precision':>10} {'class':>7}")
+    for row in rows:
+        agreement = row['agreement']
+        marker = ' <' if row['imgsz'] == chosen else ''
+        print(f"{row['imgsz']:>6} {row['latency_p50_ms']:>8.1f} {row['latency_p95_ms']:>8.1f} "
+              f"{agreement['recall_vs_reference']:>8.2%} {agreement['precision_vs_reference']:>10.2%} "
+              f"{agreement['class_match_rate']:>7.2%}{marker}")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'video': video_path,
+        'frames': len(frames),
+        'backend': args.backend or DETECTOR_BACKEND,
+        'min_agreement': args.min_agreement,
+        'previous_imgsz': INFERENCE_IMGSZ,
+        'chosen_imgsz': chosen,
+        'sizes': rows
+    }
+    print(f"Đã ghi báo cáo: {write_report(report, 'imgsz')}")
+
+    if args.dry_run:
+        print(f"Kích thước đề xuất: {chosen} (không ghi cấu hình)")
+    else:
+        save_tuning({'inference_imgsz': chosen})
+        print(f"Đã ghi inference_imgsz={chosen} vào {TUNING_FILE}, khởi động lại máy chủ để áp dụng")
+
+def candidate_thread_splits(inference_shares=DEFAULT_INFERENCE_SHARES):
+    """
+    Tạo các cách chia lõi: phần còn lại sau suy luận chia cho giải mã và mã hóa theo tỉ lệ 2:1
+
+    Trả về:
+        list: [{'decode', 'inference', 'encode'}, ...]
+    """
+    splits = []
+    for share in sorted(set(inference_shares)):
+        rest = 1.0 - share
+        splits.append({'decode': round(rest * 2 / 3, 4), 'inference': share, 'encode': round(rest / 3, 4)})
+    return splits
+
+def run_pipeline(detector, video_path, streams, num_frames):
+    """
+    Chạy giải mã -> suy luận -> mã hóa JPEG cho nhiều luồng video song song
+
+    Suy luận được tuần tự hóa bằng khóa giống như bộ lập lịch theo lô dùng chung một detector.
+
+    Trả về:
+        float: Thông lượng tổng (frame/giây)
+    """
+    inference_lock = threading.Lock()
+    processed = [0] * streams
+
+    def worker(stream_idx):
+        cap = cv2.VideoCapture(video_path)
+        try:
+            while processed[stream_idx] < num_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    # Quay lại đầu video nếu video ngắn hơn số frame cần đo
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                with inference_lock:
+                    detector.detect(frame)
+                cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+                processed[stream_idx] += 1
+        finally:
+            cap.release()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(streams)]
+    start_time = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    elapsed = time.perf_counter() - start_time
+    return sum(processed) / elapsed if elapsed > 0 else 0.0
+
+def sweep_thread_splits(model_path, video_path, splits, streams=1, num_frames=64, backend=None):
+    """
+    Đo thông lượng đường ống với từng cách chia lõi CPU
+
+    Detector được tạo lại cho mỗi cách chia vì phiên ONNX Runtime chỉ đọc số thread khi được tạo.
+
+    Trả về:
+        list: [{'split', 'allocation', 'fps'}, ...]
+    """
+    rows = []
+    for split in splits:
+        thread_budget.split = dict(split)
+        allocation = thread_budget.apply(streams)
+        detector = TrafficDetector(model_path, backend=backend)
+        detector.warmup(runs=2)
+
+        fps = run_pipeline(detector, video_path, streams, num_frames)
+        rows.append({'split': split, 'allocation': allocation, 'fps': round(fps, 2)})
+        logger.info(f"split={split}: {fps:.1f} frame/s")
+    return rows
+
+def tune_threads(args):
+    video_path = args.video or latest_uploaded_video()
+    if not video_path:
+        print(f"Không có video nào trong {UPLOAD_FOLDER}, cần --video để đo thời gian giải mã")
+        sys.exit(1)
+
+    previous_split = dict(THREAD_SPLIT)
+    if args.cores:
+        thread_budget.total_cores = args.cores
+    rows = sweep_thread_splits(args.model, video_path, candidate_thread_splits(args.inference_shares),
+                               args.streams, args.num_frames, args.backend)
+    best = max(rows, key=lambda row: row['fps'])
+
+    print(f"Lõi: {thread_budget.total_cores}, luồng video: {args.streams}")
+    print(f"{'decode':>7} {'infer':>7} {'encode':>7} {'frame/s':>9}")
+    for row in rows:
+        allocation = row['allocation']
+        marker = ' <' if row is best else ''
+        print(f"{allocation['decode']:>7} {allocation['inference']:>7} {allocation['encode']:>7} "
+              f"{row['fps']:>9.1f}{marker}")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'video': video_path,
+        'backend': args.backend or DETECTOR_BACKEND,
+        'total_cores': thread_budget.total_cores,
+        'streams': args.streams,
+        'frames_per_stream': args.num_frames,
+        'previous_split': previous_split,
+        'chosen_split': best['split'],
+        'splits': rows
+    }
+    print(f"Đã ghi báo cáo: {write_report(report, 'threads')}")
+
+    if args.dry_run:
+        print(f"Cách chia đề xuất: {best['split']} (không ghi cấu hình)")
+    else:
+        save_tuning({'thread_split': best['split']})
+        print(f"Đã ghi thread_split={best['split']} vào {TUNING_FILE}, khởi động lại máy chủ để áp dụng")
+
+def main():
+    parser = argparse.ArgumentParser(description="Tự động tinh chỉnh cấu hình suy luận")
+    subparsers = parser.add_subparsers(dest='target', required=True)
+
+    imgsz_parser = subparsers.add_parser('imgsz', help="Chọn kích thước đầu vào của mô hình")
+    imgsz_parser.add_argument('--video', default=None, help="Video mẫu (mặc định: video tải lên gần nhất)")
+    imgsz_parser.add_argument('--model', default=MODEL_PATH, help="Đường dẫn mô hình")
+    imgsz_parser.add_argument('--backend', default=None, help="Backend suy luận (torch hoặc onnx)")
+    imgsz_parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_IMGSZ_CANDIDATES),
+                              help="Các kích thước đầu vào cần thử (bội số của 32)")
+    imgsz_parser.add_argument('--num-frames', type=int, default=32, help="Số frame mẫu")
+    imgsz_parser.add_argument('--min-agreement', type=float, default=0.95,
+                              help="Recall/precision tối thiểu so với kích thước lớn nhất")
+    imgsz_parser.add_argument('--iou', type=float, default=0.5, help="Ngưỡng IoU khi so khớp")
+    imgsz_parser.add_argument('--dry-run', action='store_true', help="Chỉ báo cáo, không ghi cấu hình")
+    imgsz_parser.set_defaults(func=tune_input_size)
+
+    threads_parser = subparsers.add_parser('threads', help="Chọn cách chia lõi CPU giữa giải mã, suy luận và mã hóa")
+    threads_parser.add_argument('--video', default=None, help="Video mẫu (mặc định: video tải lên gần nhất)")
+    threads_parser.add_argument('--model', default=MODEL_PATH, help="Đường dẫn mô hình")
+    threads_parser.add_argument('--backend', default=None, help="Backend suy luận (torch hoặc onnx)")
+    threads_parser.add_argument('--streams', type=int, default=1, help="Số luồng video chạy song song")
+    threads_parser.add_argument('--cores', type=int, default=0, help="Số lõi được phép dùng (0 = theo cấu hình)")
+    threads_parser.add_argument('--inference-shares', type=float, nargs='+', default=list(DEFAULT_INFERENCE_SHARES),
+                                help="Các tỉ lệ lõi dành cho suy luận cần thử")
+    threads_parser.add_argument('--num-frames', type=int, default=64, help="Số frame đo cho mỗi luồng video")
+    threads_parser.add_argument('--dry-run', action='store_true', help="Chỉ báo cáo, không ghi cấu hình")
+    threads_parser.set_defaults(func=tune_threads)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+Các backend suy luận cho TrafficDetector
+
+Mỗi backend nhận một danh sách khung hình BGR và trả về, cho từng khung hình,
+bộ ba mảng (boxes xyxy theo tọa độ khung hình, scores, class_ids).
+"""
+import os
+import sys
+import cv2
+import numpy as np
+
+from src.core.config import logger, ENABLE_THREAD_BUDGET
+from src.core.thread_budget import thread_budget, apply_torch_threads
+
+class DetectorBackend:
+    """
+    Giao diện chung cho các backend suy luận
+    """
+    name = 'base'
+    # Kích thước đầu vào (cạnh ảnh vuông) mà mô hình xử lý không cần thu phóng
+    input_size = 640
+
+    def predict(self, frames, conf=0.25):
+        """
+        Chạy suy luận cho một lô khung hình
+
+        Tham số:
+            frames: Danh sách khung hình BGR
+            conf: Ngưỡng độ tin cậy
+
+        Trả về:
+            list: [(boxes (N, 4), scores (N,), class_ids (N,)), ...] theo thứ tự khung hình
+        """
+        raise NotImplementedError
+
+class UltralyticsBackend(DetectorBackend):
+    """
+    Backend PyTorch thông qua thư viện ultralytics
+    """
+    name = 'torch'
+
+    def __init__(self, model_path, imgsz=640):
+        from ultralytics import YOLO
+
+        if ENABLE_THREAD_BUDGET and 'torch' in sys.modules:
+            apply_torch_threads(sys.modules['torch'], thread_budget.inference_threads())
+
+        logger.info(f"Đang tải mô hình YOLO (PyTorch) từ {model_path}")
+        self.model = YOLO(model_path)
+        self.imgsz = imgsz
+        self.input_size = imgsz
+
+    def predict(self, frames, conf=0.25):
+        results = self.model(list(frames), conf=conf, imgsz=self.imgsz)
+        return [(result.boxes.xyxy.cpu().numpy(),
+                 result.boxes.conf.cpu().numpy(),
+                 result.boxes.cls.cpu().numpy())
+                for result in results]
+
+def letterbox(image, new_shape=640, color=(114, 114, 114)):
+    """
+    Thay đổi kích thước ảnh giữ nguyên tỉ lệ và thêm viền để đạt kích thước đầu vào của mô hình
+
+    Tham số:
+        image: Ảnh BGR
+        new_shape: Kích thước đích (int hoặc (height, width))
+        color: Màu viền
+
+    Trả về:
+        (ảnh đã xử lý, tỉ lệ thu phóng, (pad_x, pad_y))
+    """
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+
+    height, width = image.shape[:2]
+    ratio = min(new_shape[0] / height, new_shape[1] / width)
+    new_unpad = (int(round(width * ratio)), int(round(height * ratio)))
+
+    pad_w = (new_shape[1] - new_unpad[0]) / 2
+    pad_h = (new_shape[0] - new_unpad[1]) / 2
+
+    if (width, height) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+
+    return image, ratio, (left, top)
+
+def box_iou(boxes1, boxes2):
+    """
+    Tính ma trận IoU giữa hai tập hộp xyxy
+
+    Trả về:
+        np.ndarray: Ma trận (len(boxes1), len(boxes2))
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float32).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    area2 = np.prod(boxes2[:, 2:] - boxes2[:, :2], axis=1)
+    union = area1[:, None] + area2[None, :] - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+def non_max_suppression(boxes, scores, iou_threshold=0.45, class_ids=None, max_det=300):
+    """
+    NMS tham lam bằng NumPy, tách theo lớp nếu có class_ids
+
+    Trả về:
+        np.ndarray: Chỉ số các hộp được giữ lại, sắp xếp theo score giảm dần
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+
+    # Dịch các hộp theo lớp để các lớp khác nhau không bao giờ chồng lên nhau
+    if class_ids is not None:
+        offsets = np.asarray(class_ids, dtype=np.float32).reshape(-1, 1) * (boxes.max() + 1)
+        boxes = boxes + offsets
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0 and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        intersection = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = intersection / np.maximum(areas[i] + areas[order[1:]] - intersection, 1e-9)
+
+        order = order[1:][iou <= iou_threshold]
+
+    return np.array(keep, dtype=int)
+
+def export_onnx(model_path, imgsz=640, onnx_path=None):
+    """
+    Xuất mô hình .pt sang ONNX (batch động) bằng ultralytics nếu chưa có file ONNX
+
+    Trả về:
+        str: Đường dẫn file ONNX
+    """
+    if onnx_path is None:
+        onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+    if os.path.exists(onnx_path):
+        return onnx_path
+
+    from ultralytics import YOLO
+
+    logger.info(f"Đang xuất mô hình {model_path} sang ONNX (imgsz={imgsz})")
+    exported_path = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    if exported_path and os.path.abspath(exported_path) != os.path.abspath(onnx_path):
+        os.replace(exported_path, onnx_path)
+    return onnx_path
+
+class OnnxRuntimeBackend(DetectorBackend):
+    """
+    Backend ONNX Runtime trên CPU, tự thực hiện letterbox và NMS bằng NumPy
+    """
+    name = 'onnx'
+
+    def __init__(self, model_path, num_classes=8, imgsz=640, iou_threshold=0.45, max_det=300):
+        import onnxruntime as ort
+
+        if model_path.endswith('.pt'):
+            model_path = export_onnx(model_path, imgsz=imgsz)
+
+        logger.info(f"Đang tải mô hình ONNX từ {model_path}")
+        # Số thread suy luận của phiên được cố định khi tạo, theo phân bổ lõi CPU hiện tại
+        session_options = thread_budget.session_options(ort) if ENABLE_THREAD_BUDGET else None
+        self.session = ort.InferenceSession(model_path, sess_options=session_options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_path = model_path
+        self.num_classes = num_classes
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+        # Dùng kích thước đầu vào cố định của mô hình nếu có, và kiểm tra mô hình có hỗ trợ batch động không
+        input_shape = self.session.get_inputs()[0].shape
+        if isinstance(input_shape[2], int) and isinstance(input_shape[3], int):
+            self.imgsz = (input_shape[2], input_shape[3])
+        else:
+            self.imgsz = (imgsz, imgsz)
+        self.input_size = min(self.imgsz)
+        self.dynamic_batch = not isinstance(input_shape[0], int)
+
+    def preprocess(self, frames):
+        """
+        Letterbox, BGR->RGB, HWC->CHW và chuẩn hóa về [0, 1]
+
+        Trả về:
+            (blob (N, 3, H, W) float32, danh sách (ratio, pad, shape) của từng khung hình)
+        """
+        blob = np.empty((len(frames), 3, self.imgsz[0], self.imgsz[1]), dtype=np.float32)
+        metas = []
+        for i, frame in enumerate(frames):
+            image, ratio, pad = letterbox(frame, self.imgsz)
+            blob[i] = image[:, :, ::-1].transpose(2, 0, 1)
+            metas.append((ratio, pad, frame.shape[:2]))
+        blob /= 255.0
+        return blob, metas
+
+    def postprocess(self, output, meta, conf):
+        """
+        Giải mã đầu ra thô của một khung hình thành hộp trên tọa độ khung hình gốc
+        """
+        # YOLOv8 xuất (4 + nc, anchors), YOLOv5 xuất (anchors, 5 + nc) với objectness
+        if output.shape[0] == 4 + self.num_classes and output.shape[1] != 4 + self.num_classes:
+            output = output.T
+        if output.shape[1] == 5 + self.num_classes:
+            class_scores = output[:, 5:] * output[:, 4:5]
+        else:
+            class_scores = output[:, 4:4 + self.num_classes]
+
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+        mask = scores >= conf
+        if not mask.any():
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=int)
+
+        xywh = output[mask, :4]
+        scores = scores[mask]
+        class_ids = class_ids[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        keep = non_max_suppression(boxes, scores, self.iou_threshold, class_ids, self.max_det)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Bỏ phần viền letterbox và đưa về tọa độ khung hình gốc
+        ratio, (pad_x, pad_y), (height, width) = meta
+        boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - pad_x) / ratio, 0, width)
+        boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - pad_y) / ratio, 0, height)
+
+        return boxes, scores, class_ids
+
+    def predict(self, frames, conf=0.25):
+        frames = list(frames)
+        if not frames:
+            return []
+
+        blob, metas = self.preprocess(frames)
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: blob[i:i + 1]})[0]
+                                      for i in range(len(frames))])
+
+        return [self.postprocess(output, meta, conf) for output, meta in zip(outputs, metas)]
+
+def create_backend(name, model_path, **kwargs):
+    """
+    Tạo backend suy luận theo tên ('torch' hoặc 'onnx')
+    """
+    if name == 'onnx':
+        return OnnxRuntimeBackend(model_path, **kwargs)
+    if name in ('torch', 'pytorch', 'ultralytics'):
+        return UltralyticsBackend(model_path, imgsz=kwargs.get('imgsz', 640))
+    raise ValueError(f"Backend suy luận không được hỗ trợ: {name}")
@@ -0,0 +1,147 @@
+"""
+Di chuyển hộp phương tiện giữa các frame không chạy mô hình bằng optical flow Lucas-Kanade thưa
+"""
+import time
+
+import cv2
+import numpy as np
+
+class BoxPropagator:
+    def __init__(self, max_width=960, points_per_box=10, win_size=21, max_level=3, max_fb_error=1.0):
+        """
+        Theo dõi vài điểm đặc trưng trong mỗi hộp từ frame tham chiếu sang frame hiện tại
+        và dịch hộp theo trung vị độ dịch chuyển của các điểm
+
+        Tham số:
+            max_width: Chiều rộng tối đa của ảnh xám dùng cho optical flow (ảnh lớn hơn được thu nhỏ)
+            points_per_box: Số điểm đặc trưng tối đa trong mỗi hộp
+            win_size: Kích thước cửa sổ tìm kiếm của calcOpticalFlowPyrLK
+            max_level: Số tầng kim tự tháp ảnh (cho phép dịch chuyển lớn khi bỏ qua nhiều frame)
+            max_fb_error: Sai số tiến-lùi tối đa (pixel ảnh thu nhỏ) để giữ một điểm
+        """
+        self.max_width = max_width
+        self.points_per_box = points_per_box
+        self.lk_params = dict(winSize=(win_size, win_size), maxLevel=max_level,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        self.max_fb_error = max_fb_error
+
+        self.previous = None
+        self.scale = 1.0
+
+        # Thống kê
+        self.frames = 0
+        self.boxes = 0
+        self.moved_boxes = 0
+        self.total_ms = 0.0
+
+    def _prepare(self, frame):
+        """
+        Chuyển frame sang ảnh xám (thu nhỏ nếu rộng hơn max_width)
+
+        Trả về:
+            (ảnh xám, tỉ lệ thu nhỏ)
+        """
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(1.0, self.max_width / frame_width)
+        if scale < 1.0:
+            frame = cv2.resize(frame, (int(frame_width * scale), max(1, int(frame_height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), scale
+
+    def set_reference(self, frame):
+        """
+        Đặt frame tham chiếu (frame vừa chạy mô hình, hộp của các phương tiện ứng với frame này)
+        """
+        self.previous, self.scale = self._prepare(frame)
+
+    def reset(self):
+        """
+        Xóa frame tham chiếu (ví dụ khi độ phân giải luồng thay đổi)
+        """
+        self.previous = None
+
+    def _box_points(self, gray, box):
+        """
+        Chọn điểm đặc trưng bên trong một hộp (theo tọa độ ảnh thu nhỏ)
+        """
+        height, width = gray.shape[:2]
+        x1, y1, x2, y2 = (int(round(v * self.scale)) for v in box)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(width, x2), min(height, y2)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return None
+
+        corners = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], maxCorners=self.points_per_box,
+                                          qualityLevel=0.01, minDistance=3)
+        if corners is None:
+            # Vùng ít kết cấu: dùng lưới điểm cố định ở giữa hộp
+            xs = np.linspace(x1, x2, 5)[1:-1]
+            ys = np.linspace(y1, y2, 5)[1:-1]
+            return np.array([[x, y] for y in ys for x in xs], dtype=np.float32)
+        return corners.reshape(-1, 2) + np.array([x1, y1], dtype=np.float32)
+
+    def propagate(self, frame, boxes):
+        """
+        Di chuyển các hộp từ frame tham chiếu sang frame hiện tại, rồi lấy frame hiện tại làm tham chiếu
+
+        Tham số:
+            frame: Frame BGR hiện tại
+            boxes: Danh sách hộp (x1, y1, x2, y2) theo tọa độ frame, ứng với frame tham chiếu
+
+        Trả về:
+            list: Các hộp đã di chuyển theo thứ tự đầu vào (hộp không theo dõi được giữ nguyên)
+        """
+        start_time = time.perf_counter()
+        gray, scale = self._prepare(frame)
+        previous = self.previous
+        self.previous = gray
+
+        boxes = [tuple(float(v) for v in box[:4]) for box in boxes]
+        if previous is None or previous.shape != gray.shape or scale != self.scale or not boxes:
+            self.scale = scale
+            return boxes
+
+        points, owners = [], []
+        for i, box in enumerate(boxes):
+            box_points = self._box_points(previous, box)
+            if box_points is not None:
+                points.append(box_points)
+                owners.append(np.full(len(box_points), i))
+        if not points:
+            return boxes
+
+        points = np.concatenate(points).reshape(-1, 1, 2)
+        owners = np.concatenate(owners)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(previous, gray, points, None, **self.lk_params)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, previous, moved, None, **self.lk_params)
+
+        # Chỉ giữ điểm theo dõi được theo cả hai chiều và quay về gần vị trí ban đầu
+        fb_error = np.linalg.norm((points - back).reshape(-1, 2), axis=1)
+        good = (status.reshape(-1) == 1) & (back_status.reshape(-1) == 1) & (fb_error <= self.max_fb_error)
+        displacement = (moved - points).reshape(-1, 2) / scale
+
+        result = list(boxes)
+        for i in range(len(boxes)):
+            box_good = good & (owners == i)
+            if np.count_nonzero(box_good) < 2:
+                continue
+            dx, dy = np.median(displacement[box_good], axis=0)
+            x1, y1, x2, y2 = boxes[i]
+            result[i] = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+            self.moved_boxes += 1
+
+        self.frames += 1
+        self.boxes += len(boxes)
+        self.total_ms += (time.perf_counter() - start_time) * 1000
+        return result
+
+    def get_stats(self):
+        """
+        Lấy thống kê số frame đã di chuyển hộp và tỉ lệ hộp theo dõi được
+        """
+        return {
+            'frames': self.frames,
+            'boxes': self.boxes,
+            'tracked_ratio': round(self.moved_boxes / self.boxes, 3) if self.boxes else 0.0,
+            'avg_ms_per_frame': round(self.total_ms / self.frames, 2) if self.frames else 0.0
+        }
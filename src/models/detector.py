@@ -1,24 +1,133 @@
 """
 Mô hình phát hiện giao thông sử dụng YOLO
 """
+import time
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from shapely.geometry import Point, Polygon
 
-from src.core.config import logger
+from src.core.config import (
+    logger, DETECTOR_BACKEND, INFERENCE_IMGSZ, FRAME_WIDTH, FRAME_HEIGHT,
+    CASCADE_CONFIDENT_SCORE, CASCADE_AMBIGUOUS_RATIO
+)
+from src.models.backends import create_backend, non_max_suppression
+
+class Detections:
+    """
+    Kết quả phát hiện của một khung hình
+
+    Được tạo đúng một lần cho mỗi khung hình đã xử lý và được dùng chung cho
+    lọc vùng, theo dõi phương tiện, ghi nhận vi phạm và vẽ kết quả.
+    """
+    # Vehicles: bus(0), car(1), motorbike(4), truck(6)
+    VEHICLE_CLASS_IDS = (0, 1, 4, 6)
+    # Traffic lights: green-light(2), red-light(5), yellow-light(7)
+    TRAFFIC_LIGHT_CLASS_IDS = (2, 5, 7)
+    # License plates: license-plate(3)
+    LICENSE_PLATE_CLASS_ID = 3
+
+    def __init__(self, boxes, scores, class_ids):
+        """
+        Tham số:
+            boxes: Mảng (N, 4) các hộp giới hạn x1, y1, x2, y2
+            scores: Mảng (N,) độ tin cậy
+            class_ids: Mảng (N,) chỉ số lớp
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids).reshape(-1).astype(int)
+
+        # Phân loại đối tượng theo định dạng tuple mà phần còn lại của hệ thống sử dụng
+        self.vehicles = []
+        self.traffic_lights = []
+        self.license_plates = []
+
+        for box, score, class_id in zip(self.boxes, self.scores, self.class_ids):
+            x1, y1, x2, y2 = box.astype(int)
+            class_id = int(class_id)
+
+            if class_id in self.VEHICLE_CLASS_IDS:
+                self.vehicles.append((x1, y1, x2, y2, class_id, score))
+            elif class_id in self.TRAFFIC_LIGHT_CLASS_IDS:
+                self.traffic_lights.append((x1, y1, x2, y2, class_id, score))
+            elif class_id == self.LICENSE_PLATE_CLASS_ID:
+                self.license_plates.append((x1, y1, x2, y2, score))
+
+    @classmethod
+    def from_yolo(cls, result):
+        """
+        Tạo Detections từ một kết quả của mô hình YOLO (ultralytics Results)
+        """
+        return cls(result.boxes.xyxy.cpu().numpy(),
+                   result.boxes.conf.cpu().numpy(),
+                   result.boxes.cls.cpu().numpy())
+
+    @classmethod
+    def empty(cls):
+        """
+        Tạo kết quả phát hiện rỗng
+        """
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def scaled(self, scale_x, scale_y):
+        """
+        Trả về bản sao với tọa độ hộp được nhân theo tỉ lệ (khi khung hình bị resize)
+        """
+        factors = np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+        return Detections(self.boxes * factors, self.scores, self.class_ids)
+
+    def as_tuple(self):
+        """
+        Trả về (vehicles, traffic_lights, license_plates) như detect_objects
+        """
+        return self.vehicles, self.traffic_lights, self.license_plates
 
 class TrafficDetector:
-    def __init__(self, model_path):
+    # Ánh xạ chỉ số lớp sang loại phương tiện (không phụ thuộc mô hình đã tải)
+    VEHICLE_CLASSES = {
+        0: 'bus',
+        1: 'car',
+        4: 'motorbike',
+        6: 'truck'
+    }
+    
+    def __init__(self, model_path, backend=None, imgsz=None, fast_model_path=None):
         """
         Khởi tạo bộ phát hiện giao thông với mô hình YOLO
         
         Tham số:
-            model_path: Đường dẫn đến file mô hình YOLO
+            model_path: Đường dẫn đến file mô hình YOLO (.pt hoặc .onnx)
+            backend: Backend suy luận ('torch' hoặc 'onnx', mặc định theo cấu hình)
+            imgsz: Kích thước đầu vào của mô hình (mặc định INFERENCE_IMGSZ); khung hình
+                được letterbox về kích thước này, tọa độ kết quả vẫn theo khung hình gốc
+            fast_model_path: Mô hình nhỏ cùng bộ lớp cho chế độ suy luận hai tầng (tùy chọn)
         """
-        # Tải mô hình YOLO
+        # Tải mô hình YOLO qua backend đã chọn
         logger.info(f"Đang tải mô hình YOLO từ {model_path}")
-        self.model = YOLO(model_path)
+        self.model_path = model_path
+        self.backend = create_backend(backend or DETECTOR_BACKEND, model_path, imgsz=imgsz or INFERENCE_IMGSZ)
+        
+        # Giữ tham chiếu tới mô hình ultralytics (chỉ có với backend torch)
+        self.model = getattr(self.backend, 'model', None)
+        self.input_size = self.backend.input_size
+        
+        # Tầng 1 của chế độ hai tầng: mô hình nhỏ chạy trên mọi frame, mô hình đầy đủ chỉ khi cần
+        self.fast_backend = None
+        if fast_model_path:
+            logger.info(f"Đang tải mô hình nhỏ cho suy luận hai tầng từ {fast_model_path}")
+            self.fast_backend = create_backend(backend or DETECTOR_BACKEND, fast_model_path,
+                                               imgsz=imgsz or INFERENCE_IMGSZ)
+        self.cascade_stats = {
+            'frames': 0,
+            'escalated': 0,
+            'near_line': 0,
+            'ambiguous': 0,
+            'fast_ms': 0.0,
+            'full_ms': 0.0
+        }
         
         # Tên các lớp trong mô hình
         self.class_names = ['bus', 'car', 'green-light', 'license-plate', 
@@ -37,12 +146,7 @@ class TrafficDetector:
         }
         
         # Ánh xạ chỉ số lớp sang loại phương tiện
-        self.vehicle_classes = {
-            0: 'bus',
-            1: 'car',
-            4: 'motorbike',
-            6: 'truck'
-        }
+        self.vehicle_classes = dict(self.VEHICLE_CLASSES)
         
         # Ánh xạ chỉ số lớp sang trạng thái đèn giao thông
         self.traffic_light_classes = {
@@ -51,8 +155,51 @@ class TrafficDetector:
             7: 'yellow'
         }
         
+        # Độ trễ lần chạy đầu (nguội) và sau khi khởi động (ấm), được ghi lại bởi warmup()
+        self.warmup_stats = None
+        
         logger.info("Khởi tạo TrafficDetector thành công")
     
+    def warmup(self, runs=3, frame_size=None, batch_size=1):
+        """
+        Chạy vài lần suy luận trên khung hình giả để khởi tạo đồ thị tính toán và bộ cấp phát
+        bộ nhớ của backend, giúp frame đầu tiên của video đạt độ trễ ổn định
+        
+        Tham số:
+            runs: Số lần suy luận khởi động (lần đầu được tính là độ trễ nguội)
+            frame_size: Kích thước khung hình giả (height, width), mặc định theo cấu hình
+            batch_size: Kích thước lô tối đa sẽ dùng khi suy luận theo lô (khởi động thêm lô này nếu > 1)
+            
+        Trả về:
+            dict: Độ trễ nguội và ấm (ms)
+        """
+        height, width = frame_size or (FRAME_HEIGHT, FRAME_WIDTH)
+        frame = np.full((height, width, 3), 114, dtype=np.uint8)
+        
+        latencies = []
+        for _ in range(max(1, runs)):
+            start_time = time.perf_counter()
+            self.detect(frame)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        
+        if batch_size > 1:
+            self.detect_batch([frame] * batch_size)
+        
+        # Mô hình nhỏ chạy trên mọi frame nên cũng cần được khởi động
+        if self.fast_backend is not None:
+            for _ in range(max(1, runs)):
+                self.detect_batch([frame], fast=True)
+        
+        warm_latencies = latencies[1:] or latencies
+        self.warmup_stats = {
+            'runs': len(latencies),
+            'cold_ms': round(latencies[0], 2),
+            'warm_ms': round(float(np.median(warm_latencies)), 2)
+        }
+        logger.info(f"Khởi động mô hình xong: nguội {self.warmup_stats['cold_ms']}ms, "
+                    f"ấm {self.warmup_stats['warm_ms']}ms")
+        return self.warmup_stats
+    
     def process_video(self, video_path, display=True):
         """
         Xử lý luồng video và phát hiện đối tượng
@@ -73,7 +220,7 @@ class TrafficDetector:
         fps = cap.get(cv2.CAP_PROP_FPS)
         
         logger.info(f"Độ phân giải video gốc: {original_width}x{original_height}, FPS: {fps}")
-        logger.info(f"Đang thay đổi kích thước video thành 1280x720")
+        logger.info(f"Kích thước đầu vào mô hình: {self.input_size} (letterbox, giữ nguyên khung hình gốc)")
         
         while True:
             # Đọc khung hình từ video
@@ -82,14 +229,11 @@ class TrafficDetector:
                 logger.info("Kết thúc luồng video")
                 break
             
-            # Thay đổi kích thước khung hình thành 1280x720
-            frame = cv2.resize(frame, (1280, 720))
-            
-            # Thực hiện phát hiện đối tượng
-            results = self.model(frame, conf=0.25)
+            # Thực hiện phát hiện đối tượng (backend tự letterbox về kích thước đầu vào của mô hình)
+            detections = self.detect(frame)
             
             # Xử lý kết quả phát hiện
-            processed_frame = self.draw_detections(frame, results[0])
+            processed_frame = self.draw_detections(frame, detections)
             
             if display:
                 # Hiển thị khung hình
@@ -109,7 +253,7 @@ class TrafficDetector:
         
         Tham số:
             frame: Khung hình gốc
-            results: Kết quả phát hiện từ mô hình YOLO
+            results: Kết quả phát hiện (Detections hoặc kết quả YOLO)
             vehicle_polygon: Đa giác giới hạn vùng phát hiện (tùy chọn)
         
         Trả về:
@@ -119,9 +263,11 @@ class TrafficDetector:
         annotated_frame = frame.copy()
         
         # Trích xuất kết quả phát hiện
-        boxes = results.boxes.xyxy.cpu().numpy()
-        scores = results.boxes.conf.cpu().numpy()
-        class_ids = results.boxes.cls.cpu().numpy().astype(int)
+        if not isinstance(results, Detections):
+            results = Detections.from_yolo(results)
+        boxes = results.boxes
+        scores = results.scores
+        class_ids = results.class_ids
         
         # Vẽ các hộp giới hạn và nhãn
         for box, score, class_id in zip(boxes, scores, class_ids):
@@ -155,6 +301,297 @@ class TrafficDetector:
         
         return annotated_frame
     
+    def detect(self, frame):
+        """
+        Chạy mô hình đúng một lần trên khung hình
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            
+        Trả về:
+            Detections: Kết quả phát hiện đã được phân loại
+        """
+        boxes, scores, class_ids = self.backend.predict([frame], conf=0.25)[0]
+        return Detections(boxes, scores, class_ids)
+    
+    def detect_batch(self, frames, fast=False):
+        """
+        Chạy mô hình một lần cho cả lô khung hình
+        
+        Tham số:
+            frames: Danh sách khung hình đầu vào
+            fast: Dùng mô hình nhỏ của chế độ hai tầng thay vì mô hình đầy đủ
+            
+        Trả về:
+            list: Danh sách Detections theo đúng thứ tự các khung hình
+        """
+        if not frames:
+            return []
+        backend = self.fast_backend if fast else self.backend
+        return [Detections(boxes, scores, class_ids)
+                for boxes, scores, class_ids in backend.predict(frames, conf=0.25)]
+    
+    def pack_regions(self, frame, regions, canvas_size=None):
+        """
+        Cắt các vùng chữ nhật của khung hình và đặt lên canvas vuông kích thước đầu vào mô hình
+        
+        Vùng nhỏ hơn canvas (ví dụ vùng đèn giao thông) được giữ nguyên độ phân giải gốc,
+        vùng lớn hơn được thu nhỏ giữ tỉ lệ.
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            regions: Danh sách vùng (x1, y1, x2, y2) theo tọa độ khung hình
+            canvas_size: Cạnh canvas (mặc định bằng kích thước đầu vào của mô hình)
+            
+        Trả về:
+            (canvases, transforms): Danh sách canvas và (x1, y1, x2, y2, scale) của từng vùng
+        """
+        canvas_size = canvas_size or self.input_size
+        frame_height, frame_width = frame.shape[:2]
+        canvases = []
+        transforms = []
+        
+        for x1, y1, x2, y2 in regions:
+            x1, y1 = max(0, int(x1)), max(0, int(y1))
+            x2, y2 = min(frame_width, int(x2)), min(frame_height, int(y2))
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            
+            crop = frame[y1:y2, x1:x2]
+            scale = min(1.0, canvas_size / (x2 - x1), canvas_size / (y2 - y1))
+            if scale < 1.0:
+                crop = cv2.resize(crop, (max(1, int((x2 - x1) * scale)), max(1, int((y2 - y1) * scale))),
+                                  interpolation=cv2.INTER_AREA)
+            
+            canvas = np.full((canvas_size, canvas_size, 3), 114, dtype=np.uint8)
+            canvas[:crop.shape[0], :crop.shape[1]] = crop
+            canvases.append(canvas)
+            transforms.append((x1, y1, x2, y2, scale))
+        
+        return canvases, transforms
+    
+    def merge_regions(self, detections_list, transforms, iou_threshold=0.45):
+        """
+        Đưa kết quả phát hiện trên từng canvas về tọa độ khung hình và gộp lại
+        
+        Tham số:
+            detections_list: Danh sách Detections của từng canvas
+            transforms: Danh sách (x1, y1, x2, y2, scale) tương ứng từ pack_regions
+            iou_threshold: Ngưỡng IoU để loại hộp trùng ở phần các vùng chồng lên nhau
+            
+        Trả về:
+            Detections: Kết quả theo tọa độ khung hình
+        """
+        all_boxes, all_scores, all_class_ids = [], [], []
+        for detections, (x1, y1, x2, y2, scale) in zip(detections_list, transforms):
+            if len(detections) == 0:
+                continue
+            boxes = detections.boxes / scale
+            boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]] + x1, x1, x2)
+            boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]] + y1, y1, y2)
+            all_boxes.append(boxes)
+            all_scores.append(detections.scores)
+            all_class_ids.append(detections.class_ids)
+        
+        if not all_boxes:
+            return Detections.empty()
+        
+        boxes = np.concatenate(all_boxes)
+        scores = np.concatenate(all_scores)
+        class_ids = np.concatenate(all_class_ids)
+        if len(all_boxes) > 1:
+            keep = non_max_suppression(boxes, scores, iou_threshold, class_ids)
+            boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+        return Detections(boxes, scores, class_ids)
+    
+    def detect_regions(self, frame, regions, fast=False):
+        """
+        Chỉ chạy mô hình trên các vùng chữ nhật của khung hình, trong một lần gọi theo lô
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            regions: Danh sách vùng (x1, y1, x2, y2) theo tọa độ khung hình
+            fast: Dùng mô hình nhỏ của chế độ hai tầng
+            
+        Trả về:
+            Detections: Kết quả theo tọa độ khung hình
+        """
+        canvases, transforms = self.pack_regions(frame, regions)
+        if not canvases:
+            return Detections.empty()
+        return self.merge_regions(self.detect_batch(canvases, fast=fast), transforms)
+    
+    def is_ambiguous(self, detections):
+        """
+        Kết quả của mô hình nhỏ có quá nhiều đối tượng với độ tin cậy thấp không
+        
+        Tham số:
+            detections: Kết quả phát hiện của mô hình nhỏ
+            
+        Trả về:
+            bool: True nếu tỉ lệ đối tượng dưới CASCADE_CONFIDENT_SCORE đạt CASCADE_AMBIGUOUS_RATIO
+        """
+        if len(detections) == 0:
+            return False
+        uncertain = np.count_nonzero(detections.scores < CASCADE_CONFIDENT_SCORE)
+        return uncertain / len(detections) >= CASCADE_AMBIGUOUS_RATIO
+    
+    def detect_cascade(self, frame, needs_full_model=None, regions=None):
+        """
+        Suy luận hai tầng: chạy mô hình nhỏ, chỉ chạy mô hình đầy đủ khi cần
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            needs_full_model: Hàm nhận Detections của mô hình nhỏ, trả về True khi cảnh cần
+                mô hình đầy đủ (ví dụ đèn đỏ và có xe gần vạch dừng)
+            regions: Danh sách vùng chỉ cần suy luận (tùy chọn, mặc định toàn khung hình)
+            
+        Trả về:
+            Detections: Kết quả của mô hình đầy đủ nếu đã chạy, nếu không là của mô hình nhỏ
+        """
+        if self.fast_backend is None:
+            return self.detect_regions(frame, regions) if regions is not None else self.detect(frame)
+        
+        stats = self.cascade_stats
+        start_time = time.perf_counter()
+        if regions is not None:
+            detections = self.detect_regions(frame, regions, fast=True)
+        else:
+            detections = self.detect_batch([frame], fast=True)[0]
+        stats['fast_ms'] += (time.perf_counter() - start_time) * 1000
+        stats['frames'] += 1
+        
+        if needs_full_model is not None and needs_full_model(detections):
+            stats['near_line'] += 1
+        elif self.is_ambiguous(detections):
+            stats['ambiguous'] += 1
+        else:
+            return detections
+        
+        stats['escalated'] += 1
+        start_time = time.perf_counter()
+        detections = self.detect_regions(frame, regions) if regions is not None else self.detect(frame)
+        stats['full_ms'] += (time.perf_counter() - start_time) * 1000
+        return detections
+    
+    def get_cascade_stats(self):
+        """
+        Lấy tỉ lệ sử dụng từng tầng của chế độ suy luận hai tầng
+        
+        Trả về:
+            dict: Số frame, tỉ lệ frame chỉ dùng mô hình nhỏ và tỉ lệ chạy thêm mô hình đầy đủ
+                (theo lý do), thời gian trung bình của từng tầng; None nếu không bật chế độ hai tầng
+        """
+        if self.fast_backend is None:
+            return None
+        stats = self.cascade_stats
+        frames = stats['frames']
+        escalated = stats['escalated']
+        return {
+            'frames': frames,
+            'fast_only_rate': round((frames - escalated) / frames, 4) if frames else 0.0,
+            'full_model_rate': round(escalated / frames, 4) if frames else 0.0,
+            'near_line_rate': round(stats['near_line'] / frames, 4) if frames else 0.0,
+            'ambiguous_rate': round(stats['ambiguous'] / frames, 4) if frames else 0.0,
+            'avg_fast_ms': round(stats['fast_ms'] / frames, 2) if frames else 0.0,
+            'avg_full_ms': round(stats['full_ms'] / escalated, 2) if escalated else 0.0
+        }
+    
+    def detect_crops(self, frame, regions):
+        """
+        Chạy mô hình trên vùng cắt độ phân giải gốc của từng vùng (ví dụ từng phương tiện),
+        tất cả trong một lần gọi theo lô, và giữ kết quả riêng cho từng vùng
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            regions: Danh sách vùng (x1, y1, x2, y2) theo tọa độ khung hình
+            
+        Trả về:
+            list: Detections theo tọa độ khung hình của từng vùng (rỗng nếu vùng không hợp lệ)
+        """
+        packed = [self.pack_regions(frame, [region]) for region in regions]
+        canvases = [canvases[0] for canvases, _ in packed if canvases]
+        if not canvases:
+            return [Detections.empty() for _ in regions]
+        
+        batch_results = iter(self.detect_batch(canvases))
+        return [self.merge_regions([next(batch_results)], transforms) if canvases else Detections.empty()
+                for canvases, transforms in packed]
+    
+    def tile_regions(self, bounds, tile_size=None, overlap=0.2):
+        """
+        Chia một vùng chữ nhật thành các ô vuông chồng lên nhau có kích thước bằng đầu vào mô hình
+        
+        Tham số:
+            bounds: Vùng (x1, y1, x2, y2) cần chia
+            tile_size: Cạnh ô (mặc định bằng kích thước đầu vào của mô hình, tức độ phân giải gốc)
+            overlap: Tỉ lệ chồng lấn giữa hai ô liền kề
+            
+        Trả về:
+            list: Danh sách ô (x1, y1, x2, y2)
+        """
+        tile_size = int(tile_size or self.input_size)
+        stride = max(1, int(tile_size * (1 - overlap)))
+        x1, y1, x2, y2 = (int(v) for v in bounds)
+        
+        def starts(low, high):
+            if high - low <= tile_size:
+                return [low]
+            positions = list(range(low, high - tile_size, stride))
+            # Ô cuối cùng được căn sát mép vùng
+            positions.append(high - tile_size)
+            return positions
+        
+        return [(tx, ty, min(tx + tile_size, x2), min(ty + tile_size, y2))
+                for ty in starts(y1, y2) for tx in starts(x1, x2)]
+    
+    def detect_tiled(self, frame, bounds, tile_size=None, overlap=0.2, iou_threshold=0.45):
+        """
+        Phát hiện trên các ô chồng lấn ở độ phân giải gốc (cho đối tượng nhỏ như biển số),
+        chạy tất cả các ô trong một lô và gộp bằng NMS giữa các ô
+        
+        Hộp chạm mép bên trong của một ô (bị cắt ngang) được bỏ qua vì ô bên cạnh
+        chứa trọn đối tượng nhờ phần chồng lấn.
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            bounds: Vùng (x1, y1, x2, y2) cần phát hiện
+            tile_size: Cạnh ô (mặc định bằng kích thước đầu vào của mô hình)
+            overlap: Tỉ lệ chồng lấn giữa hai ô liền kề
+            iou_threshold: Ngưỡng IoU của NMS giữa các ô
+            
+        Trả về:
+            (Detections, số ô đã chạy)
+        """
+        frame_height, frame_width = frame.shape[:2]
+        bx1, by1 = max(0, int(bounds[0])), max(0, int(bounds[1]))
+        bx2, by2 = min(frame_width, int(bounds[2])), min(frame_height, int(bounds[3]))
+        
+        canvases, transforms = self.pack_regions(frame, self.tile_regions((bx1, by1, bx2, by2), tile_size, overlap))
+        if not canvases:
+            return Detections.empty(), 0
+        
+        edge_margin = 2
+        kept = []
+        for detections, (x1, y1, x2, y2, scale) in zip(self.detect_batch(canvases), transforms):
+            if len(detections) == 0:
+                kept.append(detections)
+                continue
+            boxes = detections.boxes / scale + np.array([x1, y1, x1, y1], dtype=np.float32)
+            # Chỉ mép ô nằm bên trong vùng mới cắt ngang đối tượng
+            cut = np.zeros(len(boxes), dtype=bool)
+            if x1 > bx1:
+                cut |= boxes[:, 0] <= x1 + edge_margin
+            if y1 > by1:
+                cut |= boxes[:, 1] <= y1 + edge_margin
+            if x2 < bx2:
+                cut |= boxes[:, 2] >= x2 - edge_margin
+            if y2 < by2:
+                cut |= boxes[:, 3] >= y2 - edge_margin
+            kept.append(Detections(detections.boxes[~cut], detections.scores[~cut], detections.class_ids[~cut]))
+        
+        return self.merge_regions(kept, transforms, iou_threshold), len(canvases)
+    
     def detect_objects(self, frame, vehicle_polygon=None):
         """
         Phát hiện đối tượng trong khung hình và phân loại chúng
@@ -168,48 +605,29 @@ class TrafficDetector:
             traffic_lights: Danh sách các đèn giao thông đã phát hiện (x1, y1, x2, y2, class_id, score)
             license_plates: Danh sách các biển số đã phát hiện (x1, y1, x2, y2, score)
         """
-        # Thực hiện phát hiện đối tượng
-        results = self.model(frame, conf=0.25)
+        return self.split_detections(self.detect(frame), vehicle_polygon)
+    
+    def split_detections(self, detections, vehicle_polygon=None):
+        """
+        Phân loại kết quả phát hiện đã có, tùy chọn lọc theo vùng phát hiện
         
-        # Trích xuất kết quả phát hiện
-        boxes = results[0].boxes.xyxy.cpu().numpy()
-        scores = results[0].boxes.conf.cpu().numpy()
-        class_ids = results[0].boxes.cls.cpu().numpy().astype(int)
+        Tham số:
+            detections: Kết quả phát hiện (Detections) của khung hình
+            vehicle_polygon: Đa giác giới hạn vùng phát hiện (tùy chọn)
+            
+        Trả về:
+            (vehicles, traffic_lights, license_plates) như detect_objects
+        """
+        # Bỏ qua kiểm tra vùng nhận diện nếu không cần thiết
+        if vehicle_polygon is None or not isinstance(vehicle_polygon, Polygon):
+            return detections.as_tuple()
         
-        # Phân loại đối tượng
-        vehicles = []
-        traffic_lights = []
-        license_plates = []
+        # Phương tiện ngoài vùng vẫn được giữ lại để đếm tất cả các phương tiện,
+        # đèn giao thông và biển số chỉ được giữ nếu tâm nằm trong đa giác
+        def in_zone(x1, y1, x2, y2):
+            return vehicle_polygon.contains(Point((x1 + x2) / 2, (y1 + y2) / 2))
         
-        for box, score, class_id in zip(boxes, scores, class_ids):
-            x1, y1, x2, y2 = box.astype(int)
-            
-            # Bỏ qua kiểm tra vùng nhận diện nếu không cần thiết
-            # Nếu vehicle_polygon được cung cấp và đang trong chế độ kiểm tra vi phạm,
-            # thì mới kiểm tra xem đối tượng có nằm trong vùng không
-            if vehicle_polygon is not None and isinstance(vehicle_polygon, Polygon):
-                # Tính toán tâm của đối tượng
-                center_x = (x1 + x2) / 2
-                center_y = (y1 + y2) / 2
-                
-                # Bỏ qua đối tượng nếu tâm không nằm trong đa giác
-                if not vehicle_polygon.contains(Point(center_x, center_y)):
-                    # Nếu đây là phương tiện và chúng ta đang đếm tất cả các phương tiện,
-                    # vẫn thêm vào danh sách vehicles để đếm
-                    if class_id in [0, 1, 4, 6]:
-                        vehicles.append((x1, y1, x2, y2, class_id, score))
-                    continue
-            
-            # Vehicles: bus(0), car(1), motorbike(4), truck(6)
-            if class_id in [0, 1, 4, 6]:
-                vehicles.append((x1, y1, x2, y2, class_id, score))
-            
-            # Traffic lights: green-light(2), red-light(5), yellow-light(7)
-            elif class_id in [2, 5, 7]:
-                traffic_lights.append((x1, y1, x2, y2, class_id, score))
-            
-            # License plates: license-plate(3)
-            elif class_id == 3:
-                license_plates.append((x1, y1, x2, y2, score))
+        traffic_lights = [light for light in detections.traffic_lights if in_zone(*light[:4])]
+        license_plates = [plate for plate in detections.license_plates if in_zone(*plate[:4])]
         
-        return vehicles, traffic_lights, license_plates 
\ No newline at end of file
+        return list(detections.vehicles), traffic_lights, license_plates
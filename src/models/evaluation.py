@@ -0,0 +1,80 @@
+"""
+Đo mức độ đồng thuận giữa hai bộ kết quả phát hiện (proxy cho mAP khi không có nhãn) và độ trễ suy luận
+"""
+import time
+
+import numpy as np
+
+from src.models.backends import box_iou
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Ghép tham lam các hộp của candidate với hộp của reference theo IoU (bỏ qua lớp)
+
+    Tham số:
+        reference: Detections tham chiếu (ví dụ mô hình FP32)
+        candidate: Detections cần so sánh
+        iou_threshold: Ngưỡng IoU để coi là cùng một đối tượng
+
+    Trả về:
+        list: [(chỉ số reference, chỉ số candidate, IoU), ...]
+    """
+    if len(reference) == 0 or len(candidate) == 0:
+        return []
+
+    iou = box_iou(reference.boxes, candidate.boxes)
+    matches = []
+    # Ghép theo thứ tự IoU giảm dần, mỗi hộp chỉ được ghép một lần
+    for flat_idx in np.argsort(iou, axis=None)[::-1]:
+        ref_idx, cand_idx = np.unravel_index(flat_idx, iou.shape)
+        if iou[ref_idx, cand_idx] < iou_threshold:
+            break
+        if any(m[0] == ref_idx or m[1] == cand_idx for m in matches):
+            continue
+        matches.append((int(ref_idx), int(cand_idx), float(iou[ref_idx, cand_idx])))
+    return matches
+
+def agreement_summary(reference_list, candidate_list, iou_threshold=0.5):
+    """
+    Tổng hợp mức đồng thuận trên nhiều khung hình
+
+    Trả về:
+        dict: recall/precision so với tham chiếu, tỉ lệ trùng lớp và IoU trung bình của các cặp ghép
+    """
+    ref_total = cand_total = matched = class_matched = 0
+    ious = []
+
+    for reference, candidate in zip(reference_list, candidate_list):
+        matches = match_detections(reference, candidate, iou_threshold)
+        ref_total += len(reference)
+        cand_total += len(candidate)
+        matched += len(matches)
+        for ref_idx, cand_idx, iou in matches:
+            ious.append(iou)
+            if reference.class_ids[ref_idx] == candidate.class_ids[cand_idx]:
+                class_matched += 1
+
+    return {
+        'reference_boxes': ref_total,
+        'candidate_boxes': cand_total,
+        'matched_boxes': matched,
+        'recall_vs_reference': round(matched / ref_total, 4) if ref_total else 1.0,
+        'precision_vs_reference': round(matched / cand_total, 4) if cand_total else 1.0,
+        'class_match_rate': round(class_matched / matched, 4) if matched else 1.0,
+        'mean_iou': round(float(np.mean(ious)), 4) if ious else 0.0
+    }
+
+def measure_latency(detector, frames):
+    """
+    Đo độ trễ từng frame và giữ lại kết quả phát hiện
+
+    Trả về:
+        (list Detections, np.ndarray độ trễ ms)
+    """
+    detector.detect(frames[0])  # Khởi động
+    detections, latencies = [], []
+    for frame in frames:
+        start_time = time.perf_counter()
+        detections.append(detector.detect(frame))
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return detections, np.array(latencies)
@@ -0,0 +1,157 @@
+"""
+Bộ xác định trạng thái đèn giao thông giá rẻ dựa trên histogram màu HSV
+"""
+import cv2
+import numpy as np
+
+from src.core.config import logger
+
+# Khoảng hue (thang 0-179 của OpenCV) của từng màu đèn
+HUE_RANGES = {
+    'red': ((0, 10), (160, 180)),
+    'yellow': ((15, 35),),
+    'green': ((40, 95),)
+}
+
+class TrafficLightStateEngine:
+    def __init__(self, min_score=0.5, lock_after=3, refresh_interval=30, retry_interval=10,
+                 min_confidence=0.6, min_lit_pixels=12):
+        """
+        Khóa vị trí đèn sau vài lần YOLO phát hiện chắc chắn, sau đó phân loại màu
+        trên vùng cắt nhỏ đó ở mỗi frame bằng histogram HSV.
+
+        Tham số:
+            min_score: Độ tin cậy YOLO tối thiểu để dùng phát hiện khóa vị trí đèn
+            lock_after: Số lần phát hiện chắc chắn liên tiếp trước khi khóa
+            refresh_interval: Số frame tối đa giữa hai lần dùng lại YOLO
+            retry_interval: Số frame tối thiểu giữa hai lần chạy YOLO khi chưa khóa hoặc độ tin cậy thấp
+            min_confidence: Độ tin cậy tối thiểu của phân loại màu để chấp nhận kết quả
+            min_lit_pixels: Số pixel sáng tối thiểu trong vùng cắt để phân loại
+        """
+        self.min_score = min_score
+        self.lock_after = lock_after
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.min_confidence = min_confidence
+        self.min_lit_pixels = min_lit_pixels
+
+        self.reset()
+
+    def reset(self):
+        """
+        Xóa vị trí đã khóa (ví dụ khi vùng đèn thay đổi)
+        """
+        self.locked_bbox = None
+        self.candidate_bbox = None
+        self.confident_hits = 0
+        self.frames_since_detector = 0
+        self.color_confidence = 0.0
+
+        # Thống kê
+        self.color_classifications = 0
+        self.detector_updates = 0
+
+    @property
+    def is_locked(self):
+        return self.locked_bbox is not None
+
+    def observe_detections(self, traffic_lights):
+        """
+        Cập nhật vị trí đèn từ kết quả YOLO của frame hiện tại
+
+        Tham số:
+            traffic_lights: Danh sách đèn (x1, y1, x2, y2, class_id, score) trong vùng đèn
+        """
+        self.detector_updates += 1
+        self.frames_since_detector = 0
+
+        confident = [light for light in traffic_lights if light[5] >= self.min_score]
+        if not confident:
+            self.confident_hits = 0
+            return
+
+        # Dùng đèn có độ tin cậy cao nhất, làm mượt vị trí để tránh rung
+        x1, y1, x2, y2, _, score = max(confident, key=lambda light: light[5])
+        bbox = np.array([x1, y1, x2, y2], dtype=np.float32)
+        if self.candidate_bbox is None:
+            self.candidate_bbox = bbox
+        else:
+            self.candidate_bbox = 0.5 * self.candidate_bbox + 0.5 * bbox
+
+        self.confident_hits += 1
+        # YOLO vừa xác nhận đèn nên coi phân loại màu là đáng tin cho tới lần phân loại tiếp theo
+        self.color_confidence = 1.0
+        if self.confident_hits >= self.lock_after:
+            if self.locked_bbox is None:
+                logger.info(f"Đã khóa vị trí đèn giao thông tại {self.candidate_bbox.astype(int).tolist()}")
+            self.locked_bbox = self.candidate_bbox.copy()
+
+    def classify(self, frame):
+        """
+        Phân loại màu đèn trên vùng đã khóa bằng histogram hue của các pixel sáng
+
+        Tham số:
+            frame: Khung hình hiện tại
+
+        Trả về:
+            (state, confidence): Trạng thái 'red' / 'yellow' / 'green' / 'unknown' và độ tin cậy [0, 1]
+        """
+        self.frames_since_detector += 1
+        if self.locked_bbox is None:
+            return 'unknown', 0.0
+
+        frame_height, frame_width = frame.shape[:2]
+        x1, y1, x2, y2 = self.locked_bbox.astype(int)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(frame_width, x2), min(frame_height, y2)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            self.color_confidence = 0.0
+            return 'unknown', 0.0
+
+        self.color_classifications += 1
+        hsv = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2HSV)
+
+        # Chỉ xét các pixel bão hòa và sáng (bóng đèn đang bật)
+        lit = (hsv[:, :, 1] >= 80) & (hsv[:, :, 2] >= 120)
+        lit_count = int(lit.sum())
+        if lit_count < self.min_lit_pixels:
+            self.color_confidence = 0.0
+            return 'unknown', 0.0
+
+        hist = np.bincount(hsv[:, :, 0][lit], minlength=180)
+        votes = {state: sum(int(hist[low:high].sum()) for low, high in ranges)
+                 for state, ranges in HUE_RANGES.items()}
+        state = max(votes, key=votes.get)
+        confidence = votes[state] / lit_count
+
+        self.color_confidence = confidence
+        if confidence < self.min_confidence:
+            return 'unknown', confidence
+        return state, confidence
+
+    def skip_frame(self):
+        """
+        Ghi nhận một frame không phân loại được màu (chưa khóa) và không chạy YOLO
+        """
+        self.frames_since_detector += 1
+
+    def needs_detector(self):
+        """
+        Kiểm tra có cần chạy lại YOLO cho vùng đèn không: quá hạn làm mới, hoặc chưa khóa / độ tin cậy
+        giảm và đã qua retry_interval frame kể từ lần chạy YOLO trước (mỗi lần chạy tốn một lượt suy luận)
+        """
+        if self.frames_since_detector >= self.refresh_interval:
+            return True
+        uncertain = self.locked_bbox is None or self.color_confidence < self.min_confidence
+        return uncertain and (self.detector_updates == 0 or self.frames_since_detector >= self.retry_interval)
+
+    def get_stats(self):
+        """
+        Lấy thống kê của bộ xác định trạng thái đèn
+        """
+        return {
+            'locked': self.is_locked,
+            'color_classifications': self.color_classifications,
+            'detector_updates': self.detector_updates,
+            'color_confidence': round(float(self.color_confidence), 3)
+        }
@@ -0,0 +1,163 @@
+"""
+Mô hình chuyển động vận tốc không đổi (bộ lọc Kalman) cho các phương tiện đang theo dõi
+
+Trạng thái của mỗi phương tiện là (cx, cy, vx, vy): tâm hộp và vận tốc theo pixel/frame.
+Trạng thái được lưu theo ô (slot) của bảng phương tiện (TrackStore) trong các mảng
+(C, 4) và (C, 4, 4); mọi phương tiện được dự đoán và cập nhật cùng lúc bằng NumPy.
+Khoảng cách thời gian là số frame video giữa hai lần cập nhật nên dự đoán vẫn đúng khi bỏ qua frame.
+"""
+import numpy as np
+
+class KalmanTrackBank:
+    def __init__(self, capacity=64, process_noise=1.0, measurement_noise=4.0, initial_velocity_std=10.0):
+        """
+        Tham số:
+            capacity: Số ô ban đầu (tăng cùng bảng phương tiện)
+            process_noise: Phương sai gia tốc ngẫu nhiên (pixel^2/frame^4)
+            measurement_noise: Độ lệch chuẩn của tâm hộp phát hiện (pixel)
+            initial_velocity_std: Độ lệch chuẩn vận tốc của phương tiện mới (pixel/frame)
+        """
+        self.base_process_noise = process_noise
+        self.base_measurement_variance = measurement_noise ** 2
+        self.base_initial_velocity_variance = initial_velocity_std ** 2
+        self.set_pixel_scale(1.0)
+
+        self.state = np.zeros((capacity, 4))
+        self.covariance = np.zeros((capacity, 4, 4))
+        self.last_frame = np.zeros(capacity, dtype=np.int64)
+
+    def set_pixel_scale(self, pixel_scale):
+        """
+        Quy đổi các tham số nhiễu (tính theo pixel ở độ phân giải tham chiếu) sang độ phân giải luồng
+        """
+        variance_scale = pixel_scale ** 2
+        self.process_noise = self.base_process_noise * variance_scale
+        self.measurement_variance = self.base_measurement_variance * variance_scale
+        self.initial_velocity_variance = self.base_initial_velocity_variance * variance_scale
+
+    def resize(self, capacity):
+        """
+        Tăng số ô (giữ nguyên trạng thái các ô hiện có)
+        """
+        count = len(self.state)
+        state = np.zeros((capacity, 4))
+        covariance = np.zeros((capacity, 4, 4))
+        last_frame = np.zeros(capacity, dtype=np.int64)
+        state[:count] = self.state
+        covariance[:count] = self.covariance
+        last_frame[:count] = self.last_frame
+        self.state, self.covariance, self.last_frame = state, covariance, last_frame
+
+    def init(self, slot, center, frame_idx):
+        """
+        Khởi tạo ô của một phương tiện mới tại tâm hộp đầu tiên, vận tốc ban đầu bằng 0
+        """
+        self.state[slot] = (center[0], center[1], 0.0, 0.0)
+        self.covariance[slot] = 0.0
+        self.covariance[slot, 0, 0] = self.covariance[slot, 1, 1] = self.measurement_variance
+        self.covariance[slot, 2, 2] = self.covariance[slot, 3, 3] = self.initial_velocity_variance
+        self.last_frame[slot] = frame_idx
+
+    def _predict_slots(self, slots, frame_idx):
+        """
+        Dự đoán trạng thái và hiệp phương sai của các ô tại frame_idx (không thay đổi bộ lọc)
+        """
+        dt = np.maximum(frame_idx - self.last_frame[slots], 0).astype(np.float64)
+        count = len(slots)
+
+        transition = np.tile(np.eye(4), (count, 1, 1))
+        transition[:, 0, 2] = dt
+        transition[:, 1, 3] = dt
+
+        # Nhiễu quá trình của mô hình gia tốc trắng rời rạc trong dt frame
+        noise = np.zeros((count, 4, 4))
+        position = self.process_noise * dt ** 3 / 3
+        cross = self.process_noise * dt ** 2 / 2
+        velocity = self.process_noise * dt
+        for axis in (0, 1):
+            noise[:, axis, axis] = position
+            noise[:, axis, axis + 2] = cross
+            noise[:, axis + 2, axis] = cross
+            noise[:, axis + 2, axis + 2] = velocity
+
+        state = np.einsum('kij,kj->ki', transition, self.state[slots])
+        covariance = transition @ self.covariance[slots] @ transition.transpose(0, 2, 1) + noise
+        return state, covariance
+
+    def predict(self, slots, frame_idx):
+        """
+        Dự đoán vị trí của các phương tiện tại frame_idx
+
+        Tham số:
+            slots: Mảng chỉ số ô của các phương tiện
+            frame_idx: Chỉ số frame video cần dự đoán
+
+        Trả về:
+            (centers, position_std): Mảng (K, 2) tâm dự đoán và mảng (K,) độ lệch chuẩn
+            vị trí dự đoán (trục lớn hơn), dùng để nới ngưỡng ghép cặp
+        """
+        if not len(slots):
+            return np.zeros((0, 2)), np.zeros(0)
+        state, covariance = self._predict_slots(slots, frame_idx)
+        position_variance = np.maximum(covariance[:, 0, 0], covariance[:, 1, 1])
+        return state[:, :2], np.sqrt(position_variance)
+
+    def update(self, slots, centers, frame_idx):
+        """
+        Dự đoán tới frame_idx rồi hiệu chỉnh bằng tâm hộp đo được của các phương tiện đã ghép cặp
+
+        Tham số:
+            slots: Mảng chỉ số ô của các phương tiện được ghép cặp trong frame này
+            centers: Mảng (K, 2) tâm hộp đo được
+            frame_idx: Chỉ số frame video của phép đo
+        """
+        if not len(slots):
+            return
+        state, covariance = self._predict_slots(slots, frame_idx)
+
+        # Quan sát vị trí: H = [I 0]
+        innovation = np.asarray(centers, dtype=np.float64).reshape(-1, 2) - state[:, :2]
+        innovation_covariance = covariance[:, :2, :2] + np.eye(2) * self.measurement_variance
+        gain = covariance[:, :, :2] @ np.linalg.inv(innovation_covariance)
+
+        self.state[slots] = state + np.einsum('kij,kj->ki', gain, innovation)
+        self.covariance[slots] = covariance - gain @ covariance[:, :2, :]
+        self.last_frame[slots] = frame_idx
+
+    def velocities(self, slots):
+        """
+        Vận tốc ước lượng (pixel/frame) của các phương tiện
+
+        Trả về:
+            np.ndarray: Mảng (K, 2) vx, vy
+        """
+        return self.state[slots, 2:].copy()
+
+    def frames_to_line(self, slots, bottoms, line_pos, frame_idx):
+        """
+        Dự đoán số frame (tính từ frame_idx) tới khi đuôi xe (y2) chạm vạch ngang line_pos
+
+        Phương tiện di chuyển lên trên ảnh (vy < 0) vượt vạch khi y2 <= line_pos.
+
+        Tham số:
+            slots: Mảng chỉ số ô của các phương tiện
+            bottoms: Mảng (K,) y2 của hộp cuối cùng của mỗi phương tiện
+            line_pos: Tọa độ y của vạch dừng
+            frame_idx: Frame hiện tại
+
+        Trả về:
+            np.ndarray: Mảng (K,) số frame, inf nếu phương tiện không tiến về phía vạch
+        """
+        if not len(slots):
+            return np.zeros(0)
+        state, _ = self._predict_slots(slots, frame_idx)
+
+        # Khoảng cách từ tâm tới đuôi xe giữ nguyên như ở lần cập nhật cuối
+        bottoms = np.asarray(bottoms, dtype=np.float64) + (state[:, 1] - self.state[slots, 1])
+        velocity = state[:, 3]
+        remaining = bottoms - line_pos
+        frames = np.full(len(slots), np.inf)
+        approaching = (velocity < 0) & (remaining > 0)
+        frames[approaching] = remaining[approaching] / -velocity[approaching]
+        frames[remaining <= 0] = 0.0
+        return frames
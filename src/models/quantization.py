@@ -0,0 +1,195 @@
+"""
+Lượng tử hóa INT8 (post-training static) cho mô hình phát hiện bằng ONNX Runtime
+
+Cách dùng:
+    python -m src.models.quantization --num-frames 64
+
+Lệnh trên lấy frame hiệu chỉnh từ các video trong data/uploads, tạo file
+QUANTIZED_MODEL_PATH và sinh báo cáo so sánh độ đồng thuận/độ trễ với mô hình FP32
+trong thư mục REPORTS_FOLDER. Đặt DETECTOR_PRECISION=int8 để VideoProcessor dùng mô hình INT8.
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.config import (
+    logger, MODEL_PATH, UPLOAD_FOLDER, ALLOWED_EXTENSIONS,
+    QUANTIZED_MODEL_PATH, REPORTS_FOLDER, INFERENCE_IMGSZ
+)
+from src.models.backends import OnnxRuntimeBackend, export_onnx
+from src.models.detector import TrafficDetector
+from src.models.evaluation import agreement_summary, measure_latency
+from src.utils.video_utils import sample_video_frames
+
+def sample_calibration_frames(upload_folder=UPLOAD_FOLDER, num_frames=64):
+    """
+    Lấy mẫu frame hiệu chỉnh trải đều trên các video đã tải lên
+
+    Tham số:
+        upload_folder: Thư mục chứa video
+        num_frames: Tổng số frame cần lấy
+
+    Trả về:
+        list: Danh sách frame BGR
+    """
+    videos = sorted(
+        os.path.join(upload_folder, f) for f in os.listdir(upload_folder)
+        if f.rsplit('.', 1)[-1].lower() in ALLOWED_EXTENSIONS
+    ) if os.path.isdir(upload_folder) else []
+
+    if not videos:
+        raise RuntimeError(f"Không có video nào trong {upload_folder} để lấy frame hiệu chỉnh")
+
+    per_video = max(1, num_frames // len(videos))
+    frames = []
+    for video_path in videos:
+        frames.extend(sample_video_frames(video_path, per_video))
+        if len(frames) >= num_frames:
+            break
+
+    logger.info(f"Đã lấy {len(frames[:num_frames])} frame hiệu chỉnh từ {len(videos)} video")
+    return frames[:num_frames]
+
+class FrameCalibrationReader:
+    """
+    Nguồn dữ liệu hiệu chỉnh cho onnxruntime.quantization.quantize_static
+    """
+    def __init__(self, backend, frames):
+        self.input_name = backend.input_name
+        self.blobs = [backend.preprocess([frame])[0] for frame in frames]
+        self.index = 0
+
+    def get_next(self):
+        if self.index >= len(self.blobs):
+            return None
+        blob = self.blobs[self.index]
+        self.index += 1
+        return {self.input_name: blob}
+
+    def rewind(self):
+        self.index = 0
+
+def quantize_model(model_path, frames, output_path=QUANTIZED_MODEL_PATH):
+    """
+    Lượng tử hóa tĩnh mô hình sang INT8 (QDQ, trọng số per-channel)
+
+    Tham số:
+        model_path: Mô hình .pt hoặc .onnx FP32
+        frames: Frame hiệu chỉnh
+        output_path: Đường dẫn file ONNX INT8
+
+    Trả về:
+        str: Đường dẫn file ONNX INT8
+    """
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType, CalibrationMethod
+
+    fp32_path = export_onnx(model_path) if model_path.endswith('.pt') else model_path
+    reader = FrameCalibrationReader(OnnxRuntimeBackend(fp32_path, imgsz=INFERENCE_IMGSZ), frames)
+
+    logger.info(f"Đang lượng tử hóa {fp32_path} -> {output_path} với {len(frames)} frame hiệu chỉnh")
+    quantize_static(fp32_path, output_path, reader,
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True,
+                    calibrate_method=CalibrationMethod.MinMax)
+    return output_path
+
+def build_report(fp32_detector, int8_detector, frames, iou_threshold=0.5):
+    """
+    So sánh mô hình INT8 với FP32 trên cùng các frame
+
+    Trả về:
+        dict: Độ đồng thuận (IoU/lớp) và độ trễ của hai mô hình
+    """
+    fp32_detections, fp32_latency = measure_latency(fp32_detector, frames)
+    int8_detections, int8_latency = measure_latency(int8_detector, frames)
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'frames': len(frames),
+        'iou_threshold': iou_threshold,
+        'fp32_model': fp32_detector.model_path,
+        'int8_model': int8_detector.model_path,
+        'agreement': agreement_summary(fp32_detections, int8_detections, iou_threshold),
+        'latency_ms': {
+            'fp32_p50': round(float(np.percentile(fp32_latency, 50)), 2),
+            'fp32_p95': round(float(np.percentile(fp32_latency, 95)), 2),
+            'int8_p50': round(float(np.percentile(int8_latency, 50)), 2),
+            'int8_p95': round(float(np.percentile(int8_latency, 95)), 2)
+        },
+        'speedup': round(float(fp32_latency.mean() / max(int8_latency.mean(), 1e-9)), 2)
+    }
+
+def write_report(report, folder=REPORTS_FOLDER):
+    """
+    Ghi báo cáo ra JSON và Markdown
+
+    Trả về:
+        str: Đường dẫn file Markdown
+    """
+    os.makedirs(folder, exist_ok=True)
+    name = f"quantization_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    with open(os.path.join(folder, f"{name}.json"), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    agreement = report['agreement']
+    latency = report['latency_ms']
+    lines = [
+        "# Báo cáo lượng tử hóa INT8",
+        "",
+        f"- Thời gian: {report['created_at']}",
+        f"- Số frame: {report['frames']} (IoU >= {report['iou_threshold']})",
+        f"- FP32: `{report['fp32_model']}`",
+        f"- INT8: `{report['int8_model']}`",
+        "",
+        "| Chỉ số | Giá trị |",
+        "| --- | --- |",
+        f"| Recall so với FP32 | {agreement['recall_vs_reference']:.2%} |",
+        f"| Precision so với FP32 | {agreement['precision_vs_reference']:.2%} |",
+        f"| Tỉ lệ trùng lớp | {agreement['class_match_rate']:.2%} |",
+        f"| IoU trung bình | {agreement['mean_iou']:.3f} |",
+        f"| Độ trễ FP32 p50 / p95 (ms) | {latency['fp32_p50']} / {latency['fp32_p95']} |",
+        f"| Độ trễ INT8 p50 / p95 (ms) | {latency['int8_p50']} / {latency['int8_p95']} |",
+        f"| Tăng tốc | {report['speedup']}x |",
+    ]
+    path = os.path.join(folder, f"{name}.md")
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Lượng tử hóa INT8 mô hình phát hiện và sinh báo cáo so sánh")
+    parser.add_argument('--model', default=MODEL_PATH, help="Mô hình FP32 (.pt hoặc .onnx)")
+    parser.add_argument('--output', default=QUANTIZED_MODEL_PATH, help="Đường dẫn mô hình INT8")
+    parser.add_argument('--num-frames', type=int, default=64, help="Số frame hiệu chỉnh")
+    parser.add_argument('--eval-frames', type=int, default=64, help="Số frame dùng để so sánh")
+    parser.add_argument('--report-only', action='store_true', help="Chỉ sinh báo cáo với mô hình INT8 đã có")
+    args = parser.parse_args()
+
+    frames = sample_calibration_frames(num_frames=args.num_frames + args.eval_frames)
+    # Tách frame hiệu chỉnh và frame đánh giá để báo cáo không bị lạc quan
+    calibration_frames = frames[::2] if len(frames) > args.num_frames else frames
+    eval_frames = frames[1::2] if len(frames) > args.num_frames else frames
+
+    if not args.report_only:
+        quantize_model(args.model, calibration_frames, args.output)
+
+    fp32_path = export_onnx(args.model) if args.model.endswith('.pt') else args.model
+    report = build_report(TrafficDetector(fp32_path, backend='onnx'),
+                          TrafficDetector(args.output, backend='onnx'),
+                          eval_frames)
+    path = write_report(report)
+    print(f"Đã ghi báo cáo: {path}")
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
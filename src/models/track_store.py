@@ -0,0 +1,217 @@
+"""
+Bảng phương tiện đang theo dõi dạng cột (structure of arrays)
+
+Mỗi phương tiện chiếm một ô (slot) trong các mảng NumPy có kích thước cố định; ô của
+phương tiện đã xóa được đưa vào danh sách ô trống và dùng lại cho phương tiện mới, nên
+thêm/xóa là O(1) và bộ nhớ chỉ tăng theo số phương tiện đồng thời lớn nhất, không theo
+thời lượng luồng. Lịch sử vị trí là bộ đệm vòng có độ dài cố định cho mỗi ô.
+"""
+import numpy as np
+
+from src.models.motion_model import KalmanTrackBank
+
+class TrackStore:
+    def __init__(self, capacity=64, history_size=32, motion_model=None):
+        """
+        Tham số:
+            capacity: Số ô ban đầu (gấp đôi khi hết ô trống)
+            history_size: Số vị trí gần nhất được giữ cho mỗi phương tiện
+            motion_model: KalmanTrackBank lưu trạng thái chuyển động theo cùng chỉ số ô
+        """
+        self.history_size = history_size
+        self.motion_model = motion_model or KalmanTrackBank(capacity)
+        self.capacity = 0
+        self._allocate(capacity)
+        self.clear()
+
+    def _allocate(self, capacity):
+        """
+        Cấp phát (hoặc mở rộng) các mảng tới capacity ô, giữ nguyên dữ liệu các ô hiện có
+        """
+        count = self.capacity
+
+        def grow(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:count] = array[:count]
+            return grown
+
+        if count == 0:
+            self.active = np.zeros(capacity, dtype=bool)
+            self.ids = np.full(capacity, -1, dtype=np.int64)
+            self.boxes = np.zeros((capacity, 4))
+            self.class_ids = np.zeros(capacity, dtype=np.int32)
+            self.scores = np.zeros(capacity, dtype=np.float32)
+            self.crossed = np.zeros(capacity, dtype=bool)
+            self.old_y2 = np.full(capacity, np.nan)
+            self.crossing_frame = np.full(capacity, -1, dtype=np.int64)
+            self.misses = np.zeros(capacity, dtype=np.int32)
+            self.first_frame = np.zeros(capacity, dtype=np.int64)
+            self.last_frame = np.zeros(capacity, dtype=np.int64)
+            self.position_frame = np.zeros(capacity, dtype=np.int64)
+            self.first_time = np.zeros(capacity)
+            self.history = np.zeros((capacity, self.history_size, 2))
+            self.history_head = np.zeros(capacity, dtype=np.int32)
+            self.history_count = np.zeros(capacity, dtype=np.int32)
+        else:
+            self.active = grow(self.active, False)
+            self.ids = grow(self.ids, -1)
+            self.boxes = grow(self.boxes, 0.0)
+            self.class_ids = grow(self.class_ids, 0)
+            self.scores = grow(self.scores, 0.0)
+            self.crossed = grow(self.crossed, False)
+            self.old_y2 = grow(self.old_y2, np.nan)
+            self.crossing_frame = grow(self.crossing_frame, -1)
+            self.misses = grow(self.misses, 0)
+            self.first_frame = grow(self.first_frame, 0)
+            self.last_frame = grow(self.last_frame, 0)
+            self.position_frame = grow(self.position_frame, 0)
+            self.first_time = grow(self.first_time, 0.0)
+            self.history = grow(self.history, 0.0)
+            self.history_head = grow(self.history_head, 0)
+            self.history_count = grow(self.history_count, 0)
+            # Ô mới được dùng sau các ô trống hiện có (danh sách ô trống là ngăn xếp)
+            self.free_slots[:0] = range(capacity - 1, count - 1, -1)
+
+        if len(self.motion_model.state) < capacity:
+            self.motion_model.resize(capacity)
+        self.capacity = capacity
+
+    def clear(self):
+        """
+        Xóa mọi phương tiện (giữ lại bộ nhớ đã cấp phát)
+        """
+        self.active[:] = False
+        self.ids[:] = -1
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def active_slots(self):
+        """
+        Chỉ số ô của các phương tiện đang theo dõi, theo thứ tự ID (thứ tự xuất hiện)
+
+        Trả về:
+            np.ndarray: Mảng chỉ số ô
+        """
+        slots = np.flatnonzero(self.active)
+        return slots[np.argsort(self.ids[slots], kind='stable')]
+
+    def add(self, track_id, box, class_id, score, frame_idx, video_time_ms):
+        """
+        Thêm một phương tiện mới vào một ô trống (O(1), gấp đôi số ô khi hết ô trống)
+
+        Tham số:
+            track_id: ID phương tiện
+            box: Hộp (x1, y1, x2, y2)
+            class_id: Chỉ số lớp
+            score: Độ tin cậy
+            frame_idx: Chỉ số frame video xuất hiện lần đầu
+            video_time_ms: Thời điểm xuất hiện lần đầu trong video (ms)
+
+        Trả về:
+            int: Chỉ số ô
+        """
+        if not self.free_slots:
+            self._allocate(max(1, self.capacity * 2))
+        slot = self.free_slots.pop()
+
+        x1, y1, x2, y2 = box
+        self.active[slot] = True
+        self.ids[slot] = track_id
+        self.boxes[slot] = box
+        self.class_ids[slot] = class_id
+        self.scores[slot] = score
+        self.crossed[slot] = False
+        self.old_y2[slot] = np.nan
+        self.crossing_frame[slot] = -1
+        self.misses[slot] = 0
+        self.first_frame[slot] = frame_idx
+        self.last_frame[slot] = frame_idx
+        self.position_frame[slot] = frame_idx
+        self.first_time[slot] = video_time_ms
+        self.history_head[slot] = 0
+        self.history_count[slot] = 0
+        self.push_position(slot, ((x1 + x2) / 2, (y1 + y2) / 2))
+        self.motion_model.init(slot, ((x1 + x2) / 2, (y1 + y2) / 2), frame_idx)
+        self.count += 1
+        return slot
+
+    def update(self, slot, box, class_id, score, frame_idx):
+        """
+        Cập nhật hộp của một phương tiện được ghép cặp trong frame hiện tại
+        """
+        x1, y1, x2, y2 = box
+        self.boxes[slot] = box
+        self.class_ids[slot] = class_id
+        self.scores[slot] = score
+        self.misses[slot] = 0
+        self.last_frame[slot] = frame_idx
+        self.position_frame[slot] = frame_idx
+        self.push_position(slot, ((x1 + x2) / 2, (y1 + y2) / 2))
+
+    def move(self, slot, box, frame_idx):
+        """
+        Di chuyển hộp của một phương tiện tới frame không chạy mô hình (optical flow)
+
+        Đây không phải phép đo: số frame bị bỏ sót và frame phát hiện cuối cùng giữ nguyên.
+        """
+        x1, y1, x2, y2 = box
+        self.boxes[slot] = box
+        self.position_frame[slot] = frame_idx
+        self.push_position(slot, ((x1 + x2) / 2, (y1 + y2) / 2))
+
+    def push_position(self, slot, center):
+        """
+        Ghi một vị trí vào bộ đệm vòng lịch sử của ô (ghi đè vị trí cũ nhất khi đầy)
+        """
+        head = self.history_head[slot]
+        self.history[slot, head] = center
+        self.history_head[slot] = (head + 1) % self.history_size
+        self.history_count[slot] = min(self.history_count[slot] + 1, self.history_size)
+
+    def last_position(self, slot):
+        """
+        Vị trí gần nhất trong lịch sử của ô
+
+        Trả về:
+            (x, y), hoặc None nếu lịch sử trống
+        """
+        if not self.history_count[slot]:
+            return None
+        x, y = self.history[slot, (self.history_head[slot] - 1) % self.history_size]
+        return float(x), float(y)
+
+    def position_history(self, slot):
+        """
+        Lịch sử vị trí của ô, cũ nhất trước
+
+        Trả về:
+            np.ndarray: Mảng (n, 2) với n <= history_size
+        """
+        count = self.history_count[slot]
+        order = (self.history_head[slot] - count + np.arange(count)) % self.history_size
+        return self.history[slot, order]
+
+    def remove(self, slots):
+        """
+        Xóa các phương tiện và trả ô của chúng về danh sách ô trống (O(1) mỗi ô)
+        """
+        for slot in slots:
+            slot = int(slot)
+            if self.active[slot]:
+                self.active[slot] = False
+                self.ids[slot] = -1
+                self.free_slots.append(slot)
+                self.count -= 1
+
+    def get_stats(self):
+        """
+        Lấy số phương tiện đang theo dõi và kích thước bảng
+        """
+        return {
+            'active': self.count,
+            'capacity': self.capacity,
+            'history_size': self.history_size
+        }
@@ -3,14 +3,30 @@ Traffic violation detection module
 """
 import cv2
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
 from shapely.geometry import Point, Polygon, LineString
 import uuid
 import os
 import traceback
 import math
+import time
 
-from src.core.config import logger, FRAME_WIDTH, FRAME_HEIGHT, VIOLATIONS_FOLDER
+from src.core.config import (
+    logger, FRAME_WIDTH, FRAME_HEIGHT, VIOLATIONS_FOLDER, INFERENCE_MODE, ZONE_CROP_MARGIN,
+    ENABLE_LIGHT_STATE_ENGINE, LIGHT_REFRESH_INTERVAL, LIGHT_RETRY_INTERVAL,
+    ENABLE_TILED_PLATES, PLATE_TILE_SIZE, PLATE_TILE_OVERLAP,
+    ENABLE_CROP_PLATES, PLATE_CROP_MARGIN, CASCADE_NEAR_LINE_DISTANCE,
+    ENABLE_BOX_PROPAGATION, PROPAGATION_MAX_WIDTH, PROPAGATION_POINTS_PER_BOX, PROPAGATION_MAX_FB_ERROR,
+    ROI_REFRESH_INTERVAL, ROI_TRACK_MARGIN, ROI_ENTRY_STRIP, ROI_MAX_AREA_RATIO,
+    KALMAN_PROCESS_NOISE, KALMAN_MEASUREMENT_NOISE, KALMAN_GATE_SIGMA, TRACK_MAX_MISSES,
+    TRACK_MAX_AGE_SECONDS, TRACK_STORE_CAPACITY, TRACK_HISTORY_SIZE
+)
+from src.models.association import associate, iou_matrix, center_distance_matrix
+from src.models.backends import non_max_suppression
+from src.models.box_propagation import BoxPropagator
+from src.models.light_state import TrafficLightStateEngine
+from src.models.motion_model import KalmanTrackBank
+from src.models.track_store import TrackStore
 
 class ViolationDetector:
     def __init__(self, traffic_detector, boundaries):
@@ -18,23 +34,150 @@ class ViolationDetector:
         Initialize violation detector based on drawn boundaries
         
         Args:
-            traffic_detector: Initialized TrafficDetector object
+            traffic_detector: Initialized TrafficDetector object (None when only replaying a track log)
             boundaries: Boundary data (line, vehiclePolygon, trafficLightPolygon)
         """
         self.detector = traffic_detector
         self.boundaries = boundaries
         
-        # Standard dimensions for processing
-        self.frame_width = FRAME_WIDTH
-        self.frame_height = FRAME_HEIGHT
+        # Boundaries are stored normalized and compiled to the resolution of the frames
+        # actually processed (native stream resolution, no resizing). Until the first
+        # frame arrives they are compiled against the configured resolution.
+        self.frame_width = None
+        self.frame_height = None
+        self.pixel_scale = 1.0
+        self.line = None
+        self.vehicle_polygon = None
+        self.traffic_light_polygon = None
+        
+        # Live tracks in a structure-of-arrays table; the constant-velocity Kalman state
+        # of every track lives in the same slots
+        self.motion_model = KalmanTrackBank(capacity=TRACK_STORE_CAPACITY, process_noise=KALMAN_PROCESS_NOISE,
+                                            measurement_noise=KALMAN_MEASUREMENT_NOISE)
+        self.tracks = TrackStore(capacity=TRACK_STORE_CAPACITY, history_size=TRACK_HISTORY_SIZE,
+                                 motion_model=self.motion_model)
+        # Video clock: index and presentation time of the frame being tracked. Track ages,
+        # expiry and violation timestamps use it instead of the wall clock, so results do
+        # not depend on processing speed
+        self.frame_index = -1
+        self.video_time_ms = 0.0
+        self.fps = 30.0
+        self.video_start_time = datetime(1970, 1, 1)
+        
+        self.compile_boundaries(FRAME_WIDTH, FRAME_HEIGHT)
+        
+        # Store state
+        self.current_light_status = 'unknown'  # unknown, red, yellow, green
+        
+        # Cheap per-frame light state classifier, decoupled from vehicle inference
+        self.light_engine = None
+        if ENABLE_LIGHT_STATE_ENGINE:
+            self.light_engine = TrafficLightStateEngine(refresh_interval=LIGHT_REFRESH_INTERVAL,
+                                                        retry_interval=LIGHT_RETRY_INTERVAL)
+        
+        # Moves tracked boxes with optical flow on frames where the model does not run
+        # (the boxes moved on the last propagated frame are kept for the track log)
+        self.box_propagator = None
+        self.last_propagated_vehicles = []
+        if ENABLE_BOX_PROPAGATION:
+            self.box_propagator = BoxPropagator(max_width=PROPAGATION_MAX_WIDTH,
+                                                points_per_box=PROPAGATION_POINTS_PER_BOX,
+                                                max_fb_error=PROPAGATION_MAX_FB_ERROR)
+        self.next_vehicle_id = 1
+        self.violations = []  # List of violations
+        
+        # Detections of the last analysed frame (reused when the motion gate skips inference)
+        self.last_detections = None
+        
+        # Violations collected during the current frame, recorded once plates are found
+        self.pending_violations = []
+        
+        # Detections of the current frame came from the on-disk cache: no plate inference either
+        self.skip_plate_inference = False
+        
+        # Cost and yield of plate detection on violating-vehicle crops
+        self.plate_crop_stats = {
+            'batches': 0,
+            'crops': 0,
+            'crops_with_plate': 0,
+            'total_ms': 0.0
+        }
+        
+        # Sparse inference around live tracks ('tracks' mode)
+        self.frames_since_refresh = 0
+        self.roi_stats = {
+            'full_frames': 0,
+            'sparse_frames': 0,
+            'regions': 0,
+            'area_ratio': 0.0
+        }
+        
+        # Cost and yield of tiled plate detection on red frames
+        self.plate_tiling_stats = {
+            'frames': 0,
+            'tiles': 0,
+            'total_ms': 0.0,
+            'full_frame_plates': 0,
+            'merged_plates': 0
+        }
+        
+        # Vehicle counts
+        self.vehicle_counts = {
+            'car': 0,
+            'motorbike': 0,
+            'truck': 0,
+            'bus': 0
+        }
+        
+        logger.info("ViolationDetector initialized successfully")
+    
+    def set_detector(self, traffic_detector):
+        """
+        Replace the TrafficDetector used by this stream (hot swap between two frames)
+        
+        Args:
+            traffic_detector: Initialized TrafficDetector object
+        """
+        self.detector = traffic_detector
+        # Detections of the previous model are not reused by the motion gate
+        self.last_detections = None
+    
+    def compile_boundaries(self, frame_width, frame_height, force=False):
+        """
+        Compile the normalized boundaries to Shapely objects at a given frame resolution
+        
+        Args:
+            frame_width: Width of the frames that will be processed
+            frame_height: Height of the frames that will be processed
+            force: Recompile even if the resolution did not change
+        """
+        if not force and (frame_width, frame_height) == (self.frame_width, self.frame_height):
+            return
         
-        # Convert boundary data to Shapely objects
+        # Tracked positions and the locked light box are in the previous resolution
+        if self.frame_width is not None and (frame_width, frame_height) != (self.frame_width, self.frame_height):
+            logger.info(f"Biên dịch lại biên theo độ phân giải luồng {frame_width}x{frame_height} "
+                        f"(trước đó {self.frame_width}x{self.frame_height})")
+            self.tracks.clear()
+            self.last_detections = None
+            if self.light_engine:
+                self.light_engine.reset()
+            if self.box_propagator:
+                self.box_propagator.reset()
+        
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        # Pixel thresholds below are tuned for FRAME_HEIGHT and scaled to the stream resolution
+        self.pixel_scale = frame_height / FRAME_HEIGHT
+        self.motion_model.set_pixel_scale(self.pixel_scale)
+        
+        boundaries = self.boundaries
         self.line = None
         self.vehicle_polygon = None
         self.traffic_light_polygon = None
         
         if 'line' in boundaries and len(boundaries['line']) >= 2:
-            points = [(p['x'] * self.frame_width, p['y'] * self.frame_height) for p in boundaries['line']]
+            points = [(p['x'] * frame_width, p['y'] * frame_height) for p in boundaries['line']]
             # Log tọa độ vạch dừng để kiểm tra
             logger.info(f"KHỞI TẠO: Tọa độ vạch dừng gốc: {points}")
             
@@ -46,37 +189,67 @@ class ViolationDetector:
             self.line = LineString(points)
         
         if 'vehiclePolygon' in boundaries and len(boundaries['vehiclePolygon']) >= 3:
-            points = [(p['x'] * self.frame_width, p['y'] * self.frame_height) for p in boundaries['vehiclePolygon']]
+            points = [(p['x'] * frame_width, p['y'] * frame_height) for p in boundaries['vehiclePolygon']]
             self.vehicle_polygon = Polygon(points)
             logger.info(f"KHỞI TẠO: Tọa độ đa giác phương tiện: {points}")
         
         if 'trafficLightPolygon' in boundaries and len(boundaries['trafficLightPolygon']) >= 3:
-            points = [(p['x'] * self.frame_width, p['y'] * self.frame_height) for p in boundaries['trafficLightPolygon']]
+            points = [(p['x'] * frame_width, p['y'] * frame_height) for p in boundaries['trafficLightPolygon']]
             self.traffic_light_polygon = Polygon(points)
             logger.info(f"KHỞI TẠO: Tọa độ đa giác đèn giao thông: {points}")
+    
+    def set_video_clock(self, fps, start_time=None):
+        """
+        Set the frame rate and the start time of the video the frames come from
         
-        # Store state
-        self.current_light_status = 'unknown'  # unknown, red, yellow, green
-        self.tracked_vehicles = {}  # {id: {position_history, crossed_line, vehicle_type}}
-        self.next_vehicle_id = 1
-        self.violations = []  # List of violations
-        
-        # Vehicle counts
-        self.vehicle_counts = {
-            'car': 0,
-            'motorbike': 0,
-            'truck': 0,
-            'bus': 0
-        }
+        Args:
+            fps: Frames per second (converts frame indices to video time when no PTS is given)
+            start_time: Date and time of the first frame; violation timestamps are this
+                plus the video time of the frame (default: the epoch, i.e. pure video time)
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.video_start_time = start_time if start_time is not None else datetime(1970, 1, 1)
+    
+    def advance_frame(self, frame_idx=None, video_time_ms=None):
+        """
+        Move the video clock to a frame
         
-        logger.info("ViolationDetector initialized successfully")
+        Args:
+            frame_idx: Index of the frame in the video (default: the frame after the last one)
+            video_time_ms: Presentation time of the frame in the video (ms, e.g. CAP_PROP_POS_MSEC);
+                derived from frame_idx and fps when omitted
+        """
+        self.frame_index = self.frame_index + 1 if frame_idx is None else frame_idx
+        if video_time_ms is None:
+            video_time_ms = self.frame_index * 1000.0 / self.fps
+        self.video_time_ms = float(video_time_ms)
     
-    def process_frame(self, frame):
+    def video_datetime(self, video_time_ms=None):
+        """
+        Date and time of a point in the video (default: the current frame)
+        """
+        if video_time_ms is None:
+            video_time_ms = self.video_time_ms
+        return self.video_start_time + timedelta(milliseconds=video_time_ms)
+    
+    def process_frame(self, frame, detections=None, reuse_detections=False, frame_idx=None, video_time_ms=None,
+                      from_cache=False):
         """
         Process frame and detect violations
         
         Args:
             frame: Input frame
+            detections: Detections already computed for this frame (optional).
+                When omitted the model is run exactly once here, and the result
+                is shared by filtering, tracking, evidence capture and drawing.
+            reuse_detections: Reuse the detections and light state of the previous
+                frame instead of running the model (e.g. when nothing moved)
+            frame_idx: Index of the frame in the video (default: the next frame), so that
+                track motion is predicted over the frames skipped in between
+            video_time_ms: Presentation time of the frame in the video (ms, default: from frame_idx and fps)
+            from_cache: The detections were read from the detection cache. The frame is then
+                only tracked and drawn: the tiled and crop plate passes are skipped, and
+                violations carry the plates of the cached full-frame pass
             
         Returns:
             annotated_frame: Annotated frame
@@ -84,21 +257,32 @@ class ViolationDetector:
             current_light_status: Current traffic light status
             new_violations: New violations detected in this frame
         """
-        # Ensure frame has the correct dimensions to match boundary coordinates
+        # Work at the native frame resolution: boundaries follow the frame, not the other way round
         current_height, current_width = frame.shape[:2]
-        if current_width != self.frame_width or current_height != self.frame_height:
-            frame = cv2.resize(frame, (self.frame_width, self.frame_height))
+        self.compile_boundaries(current_width, current_height)
+        self.advance_frame(frame_idx, video_time_ms)
         
         # Create a copy of the frame
         annotated_frame = frame.copy()
         
-        # Perform object detection on the entire frame
-        results = self.detector.model(frame, conf=0.25)
-        
-        # Extract detection results
-        boxes = results[0].boxes.xyxy.cpu().numpy()
-        scores = results[0].boxes.conf.cpu().numpy()
-        class_ids = results[0].boxes.cls.cpu().numpy().astype(int)
+        # Nothing moved since the previous frame: keep its detections and light state
+        reuse_detections = reuse_detections and self.last_detections is not None
+        self.skip_plate_inference = from_cache
+        if reuse_detections:
+            detections = self.last_detections
+        
+        # Perform object detection once per frame: on the zone crops in 'zones' mode,
+        # otherwise on the entire frame. In cascade mode the small model runs first and
+        # the full model only when the scene needs it.
+        if detections is None:
+            regions = self.get_inference_regions(self.frame_width, self.frame_height)
+            if getattr(self.detector, 'fast_backend', None) is not None:
+                detections = self.detector.detect_cascade(frame, self.needs_full_model, regions)
+            elif regions is not None:
+                detections = self.detector.detect_regions(frame, regions)
+            else:
+                detections = self.detector.detect(frame)
+        self.last_detections = detections
         
         # Create lists of filtered objects
         filtered_vehicles = []
@@ -106,58 +290,403 @@ class ViolationDetector:
         filtered_license_plates = []
         
         # Đếm tất cả các phương tiện trong frame, không chỉ trong vùng được vẽ
-        all_vehicles = []
+        all_vehicles = detections.vehicles
+        
+        # Filter objects based on position in detection zones
+        for objects, filtered in ((detections.vehicles, filtered_vehicles),
+                                  (detections.traffic_lights, filtered_traffic_lights),
+                                  (detections.license_plates, filtered_license_plates)):
+            for obj in objects:
+                x1, y1, x2, y2 = obj[:4]
+                center_point = Point((x1 + x2) / 2, (y1 + y2) / 2)
+                
+                # Kiểm tra nếu đối tượng nằm trong vùng phát hiện
+                # Check vehicle_polygon (blue), then traffic_light_polygon (green)
+                in_detection_zone = bool(self.vehicle_polygon and self.vehicle_polygon.contains(center_point))
+                if not in_detection_zone and self.traffic_light_polygon and self.traffic_light_polygon.contains(center_point):
+                    in_detection_zone = True
+                
+                # Skip object if not in detection zone
+                if in_detection_zone:
+                    filtered.append(obj)
+        
+        # Update traffic light status (kept as is when the previous detections are reused)
+        if not reuse_detections:
+            self.update_traffic_light_status(filtered_traffic_lights)
+            if self.light_engine:
+                self.light_engine.observe_detections(filtered_traffic_lights)
+                # Fall back to the color classifier when the model missed the light on this frame
+                if not filtered_traffic_lights and self.light_engine.is_locked:
+                    self.apply_light_state(*self.light_engine.classify(frame))
+        
+        # Plates are tiny in a full-frame pass: on red frames look for them again on
+        # native-resolution tiles of the vehicle zone
+        license_plates = detections.license_plates
+        if (ENABLE_TILED_PLATES and not reuse_detections and not from_cache
+                and self.current_light_status == 'red' and self.vehicle_polygon is not None):
+            license_plates = self.detect_plates_tiled(frame, license_plates)
+            filtered_license_plates = [plate for plate in license_plates
+                                       if self.vehicle_polygon.contains(Point((plate[0] + plate[2]) / 2,
+                                                                              (plate[1] + plate[3]) / 2))]
         
-        # Filter objects based on position in detection zones and count all vehicles
-        for box, score, class_id in zip(boxes, scores, class_ids):
-            x1, y1, x2, y2 = box.astype(int)
-            center_x = (x1 + x2) / 2
-            center_y = (y1 + y2) / 2
-            center_point = Point(center_x, center_y)
+        # Draw defined boundaries
+        self.draw_boundaries(annotated_frame)
+        
+        # Track vehicles and detect violations - only use filtered vehicles.
+        # Plates come from the same detection pass, not from a second inference.
+        new_violations = self.track_vehicles_and_detect_violations(filtered_vehicles, annotated_frame,
+                                                                   license_plates, source_frame=frame)
+        
+        # Draw detection results
+        annotated_frame = self.draw_results(annotated_frame, filtered_vehicles, filtered_traffic_lights, filtered_license_plates)
+        
+        # Cập nhật số lượng phương tiện dựa trên tất cả phương tiện phát hiện được
+        self.update_vehicle_counts(all_vehicles)
+        
+        # Tracked boxes now belong to this frame: optical flow starts from here
+        if self.box_propagator:
+            self.box_propagator.set_reference(frame)
+        
+        return annotated_frame, self.vehicle_counts, self.current_light_status, new_violations
+    
+    def propagate_frame(self, frame, frame_idx=None, video_time_ms=None):
+        """
+        Move the tracked vehicle boxes to a frame where the model does not run and check
+        them for stop line crossings, so a crossing is caught on the frame it happens
+        
+        Args:
+            frame: Input frame (following the last processed or propagated frame)
+            frame_idx: Index of the frame in the video (default: the next frame)
+            video_time_ms: Presentation time of the frame in the video (ms, default: from frame_idx and fps)
             
-            # Đếm tất cả phương tiện trong frame
-            if class_id in [0, 1, 4, 6]:  # bus, car, motorbike, truck
-                all_vehicles.append((x1, y1, x2, y2, class_id, score))
+        Returns:
+            new_violations: New violations detected in this frame
+        """
+        if not self.box_propagator:
+            return []
+        
+        current_height, current_width = frame.shape[:2]
+        self.compile_boundaries(current_width, current_height)
+        self.advance_frame(frame_idx, video_time_ms)
+        
+        slots = self.tracks.active_slots()
+        moved_boxes = self.box_propagator.propagate(frame, self.tracks.boxes[slots])
+        self.last_propagated_vehicles = []
+        if not len(slots):
+            return []
+        
+        vehicles = [(x1, y1, x2, y2, int(self.tracks.class_ids[slot]), float(self.tracks.scores[slot]))
+                    for (x1, y1, x2, y2), slot in zip(moved_boxes, slots)]
+        self.last_propagated_vehicles = vehicles
+        
+        # Plates are searched on the violating vehicle crops only, no full-frame pass. The moved
+        # boxes belong to known tracks: they are not measurements for the motion model
+        return self.track_vehicles_and_detect_violations(vehicles, frame, [], source_frame=frame, track_slots=slots)
+    
+    def detect_plates_tiled(self, frame, license_plates):
+        """
+        Detect license plates on overlapping native-resolution tiles of the vehicle zone
+        and merge them with the plates of the full-frame pass
+        
+        Args:
+            frame: Input frame
+            license_plates: Plates from the full-frame pass (x1, y1, x2, y2, score)
             
-            # Kiểm tra nếu đối tượng nằm trong vùng phát hiện
-            in_detection_zone = False
+        Returns:
+            list: Merged plates (x1, y1, x2, y2, score)
+        """
+        start_time = time.perf_counter()
+        tiled, tile_count = self.detector.detect_tiled(frame, self.vehicle_polygon.bounds,
+                                                       tile_size=PLATE_TILE_SIZE or None,
+                                                       overlap=PLATE_TILE_OVERLAP)
+        
+        plates = list(license_plates) + tiled.license_plates
+        if len(plates) > 1:
+            keep = non_max_suppression([plate[:4] for plate in plates], [plate[4] for plate in plates])
+            plates = [plates[i] for i in keep]
+        
+        stats = self.plate_tiling_stats
+        stats['frames'] += 1
+        stats['tiles'] += tile_count
+        stats['total_ms'] += (time.perf_counter() - start_time) * 1000
+        stats['full_frame_plates'] += len(license_plates)
+        stats['merged_plates'] += len(plates)
+        return plates
+    
+    def get_plate_tiling_stats(self):
+        """
+        Get the added cost per red frame and the plates gained by tiled plate detection
+        
+        Returns:
+            dict: Tiling statistics, single_pass_plate_recall is the share of the merged
+                plates that the full-frame pass alone found
+        """
+        stats = self.plate_tiling_stats
+        frames = stats['frames']
+        return {
+            'frames': frames,
+            'avg_tiles': round(stats['tiles'] / frames, 2) if frames else 0.0,
+            'avg_ms_per_frame': round(stats['total_ms'] / frames, 2) if frames else 0.0,
+            'full_frame_plates': stats['full_frame_plates'],
+            'merged_plates': stats['merged_plates'],
+            'single_pass_plate_recall': (round(min(1.0, stats['full_frame_plates'] / stats['merged_plates']), 4)
+                                         if stats['merged_plates'] else 1.0)
+        }
+    
+    def get_plate_crop_stats(self):
+        """
+        Get the cost and yield of plate detection on violating-vehicle crops
+        
+        Returns:
+            dict: Crop statistics
+        """
+        stats = self.plate_crop_stats
+        return {
+            'batches': stats['batches'],
+            'crops': stats['crops'],
+            'crops_with_plate': stats['crops_with_plate'],
+            'avg_ms_per_batch': round(stats['total_ms'] / stats['batches'], 2) if stats['batches'] else 0.0
+        }
+    
+    def needs_full_model(self, detections):
+        """
+        Decide whether the small model's result of a frame must be confirmed by the full model
+        
+        The full model runs during red (current state, or a red light seen by the small model)
+        when a vehicle inside the vehicle zone has its rear edge near the stop line.
+        
+        Args:
+            detections: Detections of the small model
             
-            # Check vehicle_polygon (blue)
-            if self.vehicle_polygon and self.vehicle_polygon.contains(center_point):
-                in_detection_zone = True
+        Returns:
+            bool: True if the full model should run on this frame
+        """
+        if not self.line or not self.vehicle_polygon:
+            return False
+        
+        red_seen = any(light[4] == 5 for light in detections.traffic_lights)
+        if self.current_light_status != 'red' and not red_seen:
+            return False
+        
+        line_coords = list(self.line.coords)
+        if abs(line_coords[0][1] - line_coords[1][1]) >= abs(line_coords[0][0] - line_coords[1][0]):
+            return False
+        line_pos = min(line_coords[0][1], line_coords[1][1])
+        
+        max_distance = CASCADE_NEAR_LINE_DISTANCE * self.pixel_scale
+        for x1, y1, x2, y2, _, _ in detections.vehicles:
+            if abs(y2 - line_pos) <= max_distance and self.vehicle_polygon.contains(Point((x1 + x2) / 2, (y1 + y2) / 2)):
+                return True
+        return False
+    
+    def get_inference_regions(self, frame_width, frame_height):
+        """
+        Get the rectangles to run inference on in 'zones' and 'tracks' mode
+        
+        The bounding rectangles of vehiclePolygon and trafficLightPolygon are
+        computed from the normalized boundaries, so they are valid for any frame size.
+        
+        Args:
+            frame_width: Width of the frame that will be passed to the model
+            frame_height: Height of the frame that will be passed to the model
             
-            # Check traffic_light_polygon (green)
-            if not in_detection_zone and self.traffic_light_polygon and self.traffic_light_polygon.contains(center_point):
-                in_detection_zone = True
+        Returns:
+            list: [(x1, y1, x2, y2), ...], or None to run on the entire frame
+        """
+        if INFERENCE_MODE == 'tracks':
+            return self.get_track_regions(frame_width, frame_height)
+        if INFERENCE_MODE != 'zones':
+            return None
+        
+        regions = [rect for rect in (self.get_zone_rect('vehiclePolygon', frame_width, frame_height),
+                                     self.get_zone_rect('trafficLightPolygon', frame_width, frame_height))
+                   if rect is not None]
+        
+        # Without any zone there is nothing to restrict inference to
+        return regions or None
+    
+    def get_zone_rect(self, key, frame_width, frame_height):
+        """
+        Get the bounding rectangle of a drawn polygon, expanded by ZONE_CROP_MARGIN
+        
+        Args:
+            key: 'vehiclePolygon' or 'trafficLightPolygon'
+            frame_width: Frame width
+            frame_height: Frame height
             
-            # Skip object if not in detection zone
-            if not in_detection_zone:
-                continue
+        Returns:
+            tuple: (x1, y1, x2, y2), or None if the polygon is not drawn
+        """
+        points = self.boundaries.get(key) or []
+        if len(points) < 3:
+            return None
+        xs = [p['x'] * frame_width for p in points]
+        ys = [p['y'] * frame_height for p in points]
+        return (max(0, int(min(xs)) - ZONE_CROP_MARGIN),
+                max(0, int(min(ys)) - ZONE_CROP_MARGIN),
+                min(frame_width, int(max(xs)) + ZONE_CROP_MARGIN),
+                min(frame_height, int(max(ys)) + ZONE_CROP_MARGIN))
+    
+    def get_track_regions(self, frame_width, frame_height):
+        """
+        Get the rectangles around live tracks for a sparse inference frame ('tracks' mode)
+        
+        Every ROI_REFRESH_INTERVAL analysed frames, or when there is nothing to follow,
+        the entire frame is used. In between the model only sees expanded crops around
+        the tracked vehicles, a strip at the entry edge of the vehicle zone (the edge away
+        from the stop line) for new arrivals, and the traffic light zone.
+        
+        Args:
+            frame_width: Width of the frame that will be passed to the model
+            frame_height: Height of the frame that will be passed to the model
             
-            # Classify object into appropriate list
-            if class_id in [0, 1, 4, 6]:  # bus, car, motorbike, truck
-                filtered_vehicles.append((x1, y1, x2, y2, class_id, score))
-            elif class_id in [2, 5, 7]:  # green-light, red-light, yellow-light
-                filtered_traffic_lights.append((x1, y1, x2, y2, class_id, score))
-            elif class_id == 3:  # license-plate
-                filtered_license_plates.append((x1, y1, x2, y2, score))
+        Returns:
+            list: [(x1, y1, x2, y2), ...], or None to run on the entire frame
+        """
+        stats = self.roi_stats
+        tracks = self.tracks.boxes[self.tracks.active_slots()].tolist()
+        vehicle_rect = self.get_zone_rect('vehiclePolygon', frame_width, frame_height)
+        
+        # Track boxes are in the coordinates of the last analysed frame
+        if (self.frames_since_refresh >= ROI_REFRESH_INTERVAL or not tracks or vehicle_rect is None
+                or (frame_width, frame_height) != (self.frame_width, self.frame_height)):
+            self.frames_since_refresh = 0
+            stats['full_frames'] += 1
+            return None
         
-        # Update traffic light status
-        self.update_traffic_light_status(filtered_traffic_lights)
+        regions = []
+        for x1, y1, x2, y2 in tracks:
+            margin_x = (x2 - x1) * ROI_TRACK_MARGIN
+            margin_y = (y2 - y1) * ROI_TRACK_MARGIN
+            regions.append((max(0, x1 - margin_x), max(0, y1 - margin_y),
+                            min(frame_width, x2 + margin_x), min(frame_height, y2 + margin_y)))
+        
+        # New vehicles enter the zone on the side away from the stop line
+        zone_x1, zone_y1, zone_x2, zone_y2 = vehicle_rect
+        strip_height = max(1, int((zone_y2 - zone_y1) * ROI_ENTRY_STRIP))
+        line_y = (self.line.bounds[1] + self.line.bounds[3]) / 2 if self.line else zone_y1
+        if line_y <= (zone_y1 + zone_y2) / 2:
+            regions.append((zone_x1, zone_y2 - strip_height, zone_x2, zone_y2))
+        else:
+            regions.append((zone_x1, zone_y1, zone_x2, zone_y1 + strip_height))
+        
+        light_rect = self.get_zone_rect('trafficLightPolygon', frame_width, frame_height)
+        if light_rect is not None:
+            regions.append(light_rect)
+        
+        regions = self.merge_rectangles(regions)
+        area_ratio = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) / float(frame_width * frame_height)
+        if area_ratio > ROI_MAX_AREA_RATIO:
+            # Busy scene: the crops would cost about as much as the entire frame
+            self.frames_since_refresh = 0
+            stats['full_frames'] += 1
+            return None
         
-        # Draw defined boundaries
-        self.draw_boundaries(annotated_frame)
+        self.frames_since_refresh += 1
+        stats['sparse_frames'] += 1
+        stats['regions'] += len(regions)
+        stats['area_ratio'] += area_ratio
+        return regions
+    
+    @staticmethod
+    def merge_rectangles(rects):
+        """
+        Merge overlapping rectangles into their union until none overlap
         
-        # Track vehicles and detect violations - only use filtered vehicles
-        new_violations = self.track_vehicles_and_detect_violations(filtered_vehicles, annotated_frame)
+        Args:
+            rects: List of (x1, y1, x2, y2)
+            
+        Returns:
+            list: Non-overlapping rectangles (x1, y1, x2, y2) as ints
+        """
+        merged = [list(rect) for rect in rects]
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(merged)):
+                for j in range(len(merged) - 1, i, -1):
+                    a, b = merged[i], merged[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        merged[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del merged[j]
+                        changed = True
+        return [(int(x1), int(y1), int(x2), int(y2)) for x1, y1, x2, y2 in merged]
+    
+    def get_roi_stats(self):
+        """
+        Get the share of full-frame and sparse frames in 'tracks' mode
         
-        # Draw detection results
-        annotated_frame = self.draw_results(annotated_frame, filtered_vehicles, filtered_traffic_lights, filtered_license_plates)
+        Returns:
+            dict: ROI statistics, or None in another inference mode
+        """
+        if INFERENCE_MODE != 'tracks':
+            return None
+        stats = self.roi_stats
+        sparse = stats['sparse_frames']
+        total = stats['full_frames'] + sparse
+        return {
+            'full_frames': stats['full_frames'],
+            'sparse_frames': sparse,
+            'sparse_ratio': round(sparse / total, 3) if total else 0.0,
+            'avg_regions': round(stats['regions'] / sparse, 2) if sparse else 0.0,
+            'avg_area_ratio': round(stats['area_ratio'] / sparse, 3) if sparse else 0.0
+        }
+    
+    def update_light_state(self, frame):
+        """
+        Update the traffic light status on a frame without running vehicle inference
         
-        # Cập nhật số lượng phương tiện dựa trên tất cả phương tiện phát hiện được
-        self.update_vehicle_counts(all_vehicles)
+        Uses the HSV color classifier on the locked light box. The model is only run
+        on the trafficLightPolygon crop when the refresh interval has elapsed, or when the
+        light is not locked yet or the color confidence dropped and LIGHT_RETRY_INTERVAL
+        frames passed since the last model run (each run costs a full inference).
         
-        return annotated_frame, self.vehicle_counts, self.current_light_status, new_violations
+        Args:
+            frame: Input frame
+            
+        Returns:
+            str: Current traffic light status
+        """
+        if not self.light_engine:
+            return self.current_light_status
+        
+        # Keep the boundaries in the coordinate system of the frame
+        current_height, current_width = frame.shape[:2]
+        self.compile_boundaries(current_width, current_height)
+        
+        if not self.light_engine.needs_detector():
+            if self.light_engine.is_locked:
+                self.apply_light_state(*self.light_engine.classify(frame))
+            else:
+                self.light_engine.skip_frame()
+            return self.current_light_status
+        
+        # Fallback: run the model on the light region only
+        if self.traffic_light_polygon is not None:
+            min_x, min_y, max_x, max_y = self.traffic_light_polygon.bounds
+            region = (min_x - ZONE_CROP_MARGIN, min_y - ZONE_CROP_MARGIN,
+                      max_x + ZONE_CROP_MARGIN, max_y + ZONE_CROP_MARGIN)
+            detections = self.detector.detect_regions(frame, [region])
+            traffic_lights = [light for light in detections.traffic_lights
+                              if self.traffic_light_polygon.contains(Point((light[0] + light[2]) / 2,
+                                                                           (light[1] + light[3]) / 2))]
+            self.update_traffic_light_status(traffic_lights)
+            self.light_engine.observe_detections(traffic_lights)
+        
+        return self.current_light_status
+    
+    def apply_light_state(self, state, confidence):
+        """
+        Apply a light state coming from the color classifier
+        
+        Args:
+            state: 'red', 'yellow', 'green' or 'unknown'
+            confidence: Classifier confidence
+        """
+        if state == 'unknown' or state == self.current_light_status:
+            return
+        logger.info(f"Trạng thái đèn giao thông (màu HSV, tin cậy {confidence:.2f}) thay đổi từ {self.current_light_status} thành {state}")
+        self.current_light_status = state
     
     def update_traffic_light_status(self, traffic_lights):
         """
@@ -212,19 +741,27 @@ class ViolationDetector:
                 logger.info(f"Trạng thái đèn giao thông thay đổi từ {self.current_light_status} thành {max_light}")
                 self.current_light_status = max_light
     
-    def track_vehicles_and_detect_violations(self, vehicles, frame):
+    def track_vehicles_and_detect_violations(self, vehicles, frame, license_plates=None, source_frame=None,
+                                             track_slots=None):
         """
         Theo dõi phương tiện và phát hiện vi phạm
         
         Args:
             vehicles: Danh sách các phương tiện được phát hiện
             frame: Khung hình hiện tại
+            license_plates: Biển số đã phát hiện trong cùng lượt suy luận của frame
+                (nếu không có sẽ chạy phát hiện trên frame)
+            source_frame: Khung hình gốc chưa vẽ, dùng để cắt vùng tìm biển số (mặc định là frame)
+            track_slots: Ô phương tiện của từng hộp khi hộp được di chuyển bằng optical flow
+                (frame không chạy mô hình); khi đó không lưu ảnh debug
             
         Returns:
             new_violations: Danh sách vi phạm mới phát hiện trong khung hình này
         """
         try:
             new_violations = []
+            # Vi phạm được thu thập trong frame rồi mới ghi nhận để tìm biển số theo lô
+            self.pending_violations = []
             
             # Nếu không có đường thẳng hoặc không có vùng phát hiện phương tiện, không thể phát hiện vi phạm
             if not self.line or not self.vehicle_polygon:
@@ -233,14 +770,16 @@ class ViolationDetector:
             # Đảm bảo trạng thái đèn là đỏ trước khi phát hiện vi phạm
             if self.current_light_status != 'red':
                 # Chỉ theo dõi, không phát hiện vi phạm khi đèn không phải màu đỏ
-                self.update_vehicle_tracking(vehicles, frame)
+                self.update_vehicle_tracking(vehicles, frame, license_plates, track_slots)
                 return new_violations
             
             # Lấy kích thước khung hình để tỉ lệ
             frame_height, frame_width = frame.shape[:2]
             
             # Lấy danh sách biển số xe được phát hiện trong frame hiện tại
-            _, _, license_plates = self.detector.detect_objects(frame)
+            # (khi tìm biển số trên vùng cắt xe vi phạm thì không cần chạy lại toàn khung hình)
+            if license_plates is None:
+                license_plates = [] if ENABLE_CROP_PLATES else self.detector.detect(frame).license_plates
             
             # Tạo một bản sao của frame để vẽ thông tin vi phạm
             violation_frame = frame.copy()
@@ -301,7 +840,7 @@ class ViolationDetector:
             
             # PHẦN 1: PHÁT HIỆN VI PHẠM TRỰC TIẾP - kiểm tra tất cả phương tiện trong frame hiện tại
             # Kiểm tra từng phương tiện xem có vượt qua vạch không
-            for vehicle in vehicles:
+            for vehicle_index, vehicle in enumerate(vehicles):
                 try:
                     x1, y1, x2, y2, class_id, score = vehicle
                     
@@ -333,9 +872,12 @@ class ViolationDetector:
                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
                     
                     
-                    # Lưu ảnh debug để kiểm tra trực quan
-                    debug_img_path = os.path.join(VIOLATIONS_FOLDER, f"debug_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg")
-                    cv2.imwrite(debug_img_path, violation_frame)
+                    # Lưu ảnh debug để kiểm tra trực quan (mỗi phương tiện của frame một ảnh); bỏ qua
+                    # trên frame chỉ di chuyển hộp bằng optical flow để giữ frame đó rẻ
+                    if track_slots is None:
+                        debug_img_path = os.path.join(VIOLATIONS_FOLDER,
+                                                      f"debug_frame{self.frame_index:07d}_vehicle{vehicle_index:03d}.jpg")
+                        cv2.imwrite(debug_img_path, violation_frame)
                     
                     # Debug log để kiểm tra tọa độ chi tiết
                     logger.info(f"KIỂM TRA VI PHẠM: Xe tại ({center_x}, {center_y}), y1={y1}, y2={y2}, line_pos={line_pos}, distance_to_line={distance_to_line}")
@@ -344,38 +886,19 @@ class ViolationDetector:
                     # Nếu thỏa mãn tất cả điều kiện, ghi nhận vi phạm
                     if vehicle_in_monitoring_area and violation_detected:
                         logger.info(f"⚠️ VI PHẠM RÕ RÀNG: Xe tại ({center_x}, {center_y}), phần đuôi y2={y2} nằm phía trên vạch tại {line_pos}, khoảng cách={distance_to_line}px")
-                        # Kiểm tra xem phương tiện này đã được kiểm tra trong tracked_vehicles chưa
-                        already_checked = False
-                        for vehicle_id, vehicle_data in self.tracked_vehicles.items():
-                            if vehicle_id in checked_violation_ids:
-                                continue
-                                
-                            if vehicle_data.get('current_bbox'):
-                                v_x1, v_y1, v_x2, v_y2 = vehicle_data['current_bbox']
-                                # Kiểm tra xem có phải cùng một phương tiện không
-                                if self.is_same_vehicle((x1, y1, x2, y2), (v_x1, v_y1, v_x2, v_y2)):
-                                    already_checked = True
-                                    checked_violation_ids.add(vehicle_id)
-                                    
-                                    # Nếu phương tiện chưa được đánh dấu vi phạm, đánh dấu vi phạm
-                                    if not vehicle_data.get('crossed_line', False):
-                                        vehicle_data['crossed_line'] = True
-                                        self.record_violation(vehicle, license_plates, center_x, center_y, 
-                                                            "", violation_frame, line_start, 
-                                                            line_end, new_violations)
-                                    break
-                        
-                        # Nếu không tìm thấy trong tracked_vehicles hoặc không được đánh dấu vi phạm
-                        if not already_checked:
-                            # Tạo vi phạm mới
-                            self.record_violation(vehicle, license_plates, center_x, center_y, 
-                                                "", violation_frame, line_start, 
-                                                line_end, new_violations)
+                        # Kiểm tra xem phương tiện này đã được kiểm tra trong các phương tiện đang theo dõi chưa
+                        if self.claim_violation((x1, y1, x2, y2), checked_violation_ids):
+                            self.pending_violations.append((vehicle, license_plates, center_x, center_y,
+                                                            "", violation_frame.copy(), line_start,
+                                                            line_end, new_violations))
                 except Exception as e:
                     logger.error(f"Lỗi khi xử lý phương tiện: {str(e)}")
             
             # PHẦN 2: THEO DÕI PHƯƠNG TIỆN QUA CÁC FRAME
-            self.update_vehicle_tracking(vehicles, frame)
+            self.update_vehicle_tracking(vehicles, frame, license_plates, track_slots)
+            
+            # PHẦN 3: GHI NHẬN CÁC VI PHẠM ĐÃ THU THẬP, TÌM BIỂN SỐ TRÊN VÙNG CẮT CỦA TỪNG XE
+            self.record_pending_violations(source_frame if source_frame is not None else frame)
             
             return new_violations
         except Exception as e:
@@ -383,134 +906,278 @@ class ViolationDetector:
             logger.error(traceback.format_exc())
             return []
     
-    def update_vehicle_tracking(self, vehicles, frame=None):
+    def claim_violation(self, bbox, checked_violation_ids):
+        """
+        Đối chiếu một phương tiện đã vượt vạch với các phương tiện đang theo dõi
+        
+        Args:
+            bbox: Hộp của phương tiện (x1, y1, x2, y2)
+            checked_violation_ids: Tập ô phương tiện đã được đối chiếu trong frame này (được cập nhật)
+            
+        Returns:
+            bool: True nếu cần ghi nhận vi phạm (phương tiện chưa được theo dõi,
+                hoặc đang theo dõi nhưng chưa bị đánh dấu vượt vạch)
+        """
+        tracks = self.tracks
+        slots = np.array([slot for slot in tracks.active_slots() if slot not in checked_violation_ids], dtype=np.int64)
+        if not len(slots):
+            # Không tìm thấy trong các phương tiện đang theo dõi: tạo vi phạm mới
+            return True
+        
+        # So với vị trí dự đoán tại frame này: hộp cuối cùng có thể đã cũ vài frame khi bỏ qua frame.
+        # Cùng một phương tiện khi tâm đủ gần và IoU đủ lớn (giống is_same_vehicle), phương tiện
+        # xuất hiện sớm nhất được chọn
+        predicted_boxes, _ = self.predict_track_boxes(slots)
+        iou = iou_matrix([bbox], predicted_boxes)[0]
+        distance = center_distance_matrix([bbox], predicted_boxes)[0]
+        same = (distance <= 300 * self.pixel_scale) & ((iou >= 0.5) | (distance < 50 * self.pixel_scale))
+        if not same.any():
+            return True
+        
+        slot = int(slots[np.argmax(same)])
+        checked_violation_ids.add(slot)
+        
+        # Nếu phương tiện chưa được đánh dấu vi phạm, đánh dấu vi phạm
+        if tracks.crossed[slot]:
+            return False
+        tracks.crossed[slot] = True
+        if self.line:
+            tracks.crossing_frame[slot] = self.interpolate_crossing_frame(
+                tracks.boxes[slot, 3], tracks.position_frame[slot], bbox[3], self.line.bounds[1])
+        return True
+    
+    def interpolate_crossing_frame(self, previous_y2, previous_frame, y2, line_pos):
+        """
+        Frame mà đuôi xe chạm vạch dừng, nội suy tuyến tính giữa frame phân tích trước đó
+        (đuôi xe chưa qua vạch) và frame hiện tại khi các frame ở giữa bị bỏ qua
+        
+        Args:
+            previous_y2: y2 của phương tiện ở frame phân tích trước đó (None nếu không có)
+            previous_frame: Chỉ số frame phân tích trước đó (None nếu không có)
+            y2: y2 hiện tại (đã qua vạch)
+            line_pos: Tọa độ y của vạch dừng
+            
+        Returns:
+            int: Chỉ số frame vượt vạch
+        """
+        frame_idx = self.frame_index
+        if (previous_y2 is None or previous_frame is None or previous_y2 <= line_pos
+                or previous_y2 <= y2 or frame_idx <= previous_frame):
+            return frame_idx
+        return previous_frame + int(math.ceil((previous_y2 - line_pos) / (previous_y2 - y2)
+                                              * (frame_idx - previous_frame)))
+    
+    def predict_track_boxes(self, slots):
+        """
+        Dự đoán hộp của các phương tiện đang theo dõi tại frame hiện tại: hộp cuối cùng được dời
+        tới tâm dự đoán của mô hình chuyển động
+        
+        Args:
+            slots: Mảng chỉ số ô của các phương tiện trong bảng phương tiện
+            
+        Returns:
+            (boxes, position_std): Mảng (K, 4) hộp dự đoán và mảng (K,) độ lệch chuẩn vị trí dự đoán
+        """
+        boxes = self.tracks.boxes[slots]
+        centers, position_std = self.motion_model.predict(slots, self.frame_index)
+        shift = centers - (boxes[:, :2] + boxes[:, 2:]) / 2
+        return boxes + np.concatenate([shift, shift], axis=1), position_std
+    
+    def replay_frame(self, vehicles, frame_idx=None, propagated=False):
+        """
+        Chạy logic vượt vạch của track_vehicles_and_detect_violations trên một frame đã ghi
+        nhật ký, không cần ảnh: không vẽ, không lưu ảnh bằng chứng, không tìm biển số
+        
+        Args:
+            vehicles: Phương tiện đã lọc theo vùng phát hiện (x1, y1, x2, y2, class_id, score),
+                hoặc hộp đã di chuyển bằng optical flow khi propagated
+            frame_idx: Chỉ số frame trong video (mặc định là frame tiếp theo)
+            propagated: Frame không chạy mô hình (giống propagate_frame): các hộp được ghép với
+                phương tiện đang theo dõi của lần chạy lại và chỉ di chuyển các phương tiện đó
+            
+        Returns:
+            list: Các phương tiện vi phạm trong frame này
+        """
+        self.advance_frame(frame_idx)
+        self.pending_violations = []
+        if not self.line or not self.vehicle_polygon:
+            return []
+        
+        track_slots = None
+        if propagated:
+            if self.current_light_status != 'red':
+                return []
+            vehicles, track_slots = self.match_propagated_boxes(vehicles)
+            if not vehicles:
+                return []
+        elif self.current_light_status != 'red':
+            self.update_vehicle_tracking(vehicles)
+            return []
+        
+        line_coords = list(self.line.coords)
+        is_horizontal = abs(line_coords[0][1] - line_coords[1][1]) < abs(line_coords[0][0] - line_coords[1][0])
+        if not is_horizontal:
+            return []
+        line_pos = min(line_coords[0][1], line_coords[1][1])
+        
+        checked_violation_ids = set()
+        violating = []
+        for vehicle in vehicles:
+            x1, y1, x2, y2 = vehicle[:4]
+            if (self.vehicle_polygon.contains(Point((x1 + x2) / 2, (y1 + y2) / 2)) and y2 <= line_pos
+                    and self.claim_violation((x1, y1, x2, y2), checked_violation_ids)):
+                violating.append(vehicle)
+        
+        # Phương tiện vừa vượt vạch được phát hiện khi theo dõi qua các frame
+        self.update_vehicle_tracking(vehicles, track_slots=track_slots)
+        violating.extend(args[0] for args in self.pending_violations)
+        self.pending_violations = []
+        return violating
+    
+    def match_propagated_boxes(self, vehicles):
+        """
+        Ghép các hộp đã di chuyển bằng optical flow (ghi trong nhật ký) với hộp hiện tại của các
+        phương tiện đang theo dõi; hai hộp chỉ cách nhau một frame
+        
+        Args:
+            vehicles: Hộp đã di chuyển (x1, y1, x2, y2, class_id, score)
+            
+        Returns:
+            (vehicles, slots): Các hộp được ghép và ô phương tiện tương ứng
+        """
+        slots = self.tracks.active_slots()
+        matches, _, _ = associate([vehicle[:4] for vehicle in vehicles], self.tracks.boxes[slots],
+                                  max_distance=100 * self.pixel_scale)
+        return ([vehicles[detection_index] for detection_index, _ in matches],
+                slots[[track_index for _, track_index in matches]])
+    
+    def update_vehicle_tracking(self, vehicles, frame=None, license_plates=None, track_slots=None):
         """
         Cập nhật thông tin theo dõi phương tiện
         
         Args:
             vehicles: Danh sách các phương tiện được phát hiện
             frame: Khung hình hiện tại (nếu cần chụp ảnh vi phạm)
+            license_plates: Biển số đã phát hiện trong cùng lượt suy luận của frame
+            track_slots: Ô phương tiện của từng hộp khi hộp được di chuyển bằng optical flow. Khi đó
+                chỉ hộp và lịch sử vị trí được cập nhật rồi kiểm tra vượt vạch: hộp không phải phép đo
+                của mô hình chuyển động và không tính là phương tiện được phát hiện lại
         """
-        current_vehicles = {}
+        tracks = self.tracks
+        frame_idx = self.frame_index
         
-        for vehicle in vehicles:
+        if track_slots is not None:
+            slots = np.asarray(track_slots, dtype=np.int64)
+            assigned_slots = {index: int(slot) for index, slot in enumerate(slots)}
+        else:
+            # Ghép một-một phát hiện với vị trí dự đoán (Kalman) của phương tiện đang theo dõi tại frame này
+            # (IoU/khoảng cách tâm, thuật toán Hungary); ngưỡng khoảng cách được nới theo độ bất định dự đoán
+            slots = tracks.active_slots()
+            predicted_boxes, position_std = self.predict_track_boxes(slots)
+            gates = 100 * self.pixel_scale + KALMAN_GATE_SIGMA * position_std  # Ngưỡng khoảng cách
+            matches, _, unmatched_tracks = associate([vehicle[:4] for vehicle in vehicles], predicted_boxes,
+                                                     max_distance=gates)
+            assigned_slots = {detection_index: int(slots[track_index]) for detection_index, track_index in matches}
+        matched_slots, matched_centers = [], []
+        
+        # Hướng và vị trí vạch dừng (chỉ kiểm tra vi phạm trên vạch ngang)
+        line_coords = list(self.line.coords) if self.line else None
+        is_horizontal = bool(line_coords) and (abs(line_coords[0][1] - line_coords[1][1])
+                                               < abs(line_coords[0][0] - line_coords[1][0]))
+        
+        for detection_index, vehicle in enumerate(vehicles):
             x1, y1, x2, y2, class_id, score = vehicle
             
             # Tính toán tâm của phương tiện
             center_x = (x1 + x2) / 2
             center_y = (y1 + y2) / 2
             
-            # Tìm phương tiện gần nhất trong danh sách đang theo dõi
-            min_distance = float('inf')
-            closest_id = None
-            
-            for vehicle_id, vehicle_data in self.tracked_vehicles.items():
-                if len(vehicle_data['position_history']) == 0:
-                    continue
-                    
-                last_pos = vehicle_data['position_history'][-1]
-                distance = ((center_x - last_pos[0]) ** 2 + (center_y - last_pos[1]) ** 2) ** 0.5
-                
-                if distance < min_distance and distance < 100:  # Ngưỡng khoảng cách
-                    min_distance = distance
-                    closest_id = vehicle_id
+            # Phương tiện đang theo dõi được ghép với phát hiện này (nếu có)
+            slot = assigned_slots.get(detection_index)
             
             # Nếu tìm thấy phương tiện gần nhất, cập nhật vị trí
-            if closest_id is not None:
-                vehicle_data = self.tracked_vehicles[closest_id]
-                
-                # Lưu vị trí cũ trước khi cập nhật
-                old_bbox = vehicle_data.get('current_bbox', None)
-                old_pos = vehicle_data['position_history'][-1] if vehicle_data['position_history'] else None
+            if slot is not None:
+                # Frame của vị trí trước đó của phương tiện (phát hiện hoặc optical flow)
+                last_frame = int(tracks.position_frame[slot])
                 
                 # Cập nhật lịch sử vị trí và bounding box hiện tại
-                vehicle_data['position_history'].append((center_x, center_y))
-                vehicle_data['current_bbox'] = (x1, y1, x2, y2)
+                if track_slots is not None:
+                    tracks.move(slot, (x1, y1, x2, y2), frame_idx)
+                else:
+                    tracks.update(slot, (x1, y1, x2, y2), class_id, score, frame_idx)
+                    matched_slots.append(slot)
+                    matched_centers.append((center_x, center_y))
                 
-                # Nếu đèn đỏ, kiểm tra vi phạm vượt đèn đỏ
-                if self.current_light_status == 'red' and not vehicle_data.get('crossed_line', False):
-                    # Kiểm tra xem vạch dừng có tồn tại và là vạch ngang không
-                    if self.line:
-                        line_coords = list(self.line.coords)
-                        # Xác định hướng của vạch (ngang hay dọc)
-                        is_horizontal = abs(line_coords[0][1] - line_coords[1][1]) < abs(line_coords[0][0] - line_coords[1][0])
+                # Nếu đèn đỏ, kiểm tra vi phạm vượt đèn đỏ trên vạch ngang
+                if self.current_light_status == 'red' and not tracks.crossed[slot] and is_horizontal:
+                    # Lấy vị trí của vạch ngang - lấy giá trị y nhỏ nhất trong trường hợp vạch không hoàn toàn ngang
+                    line_pos = min(line_coords[0][1], line_coords[1][1])
+                    
+                    # Lấy vị trí y2 trước đó của phương tiện (nếu có)
+                    old_y2 = None if np.isnan(tracks.old_y2[slot]) else float(tracks.old_y2[slot])
+                    
+                    # Đảm bảo tọa độ đáy của phương tiện (y2) <= tọa độ vạch dừng (line_pos)
+                    # là điều kiện đủ để xác định vi phạm
+                    violation_detected = y2 <= line_pos
+                    
+                    # Debug log để kiểm tra tọa độ chi tiết
+                    logger.debug(f"Tracking - Xe (ID: {tracks.ids[slot]}): y1={y1}, y2={y2}, old_y2={old_y2}, line_pos={line_pos}, violation={violation_detected}")
+                    
+                    # Phương tiện vi phạm khi:
+                    # 1. Phần đuôi xe hiện tại đã vượt qua vạch (y2 <= line_pos)
+                    # 2. Phần đuôi xe trước đó chưa vượt qua vạch (old_y2 > line_pos hoặc old_y2 là None)
+                    just_crossed = violation_detected and (old_y2 is None or old_y2 > line_pos)
+                    
+                    if just_crossed:
+                        tracks.crossed[slot] = True
+                        tracks.crossing_frame[slot] = self.interpolate_crossing_frame(old_y2, last_frame, y2, line_pos)
+                        logger.info(f"Phương tiện (ID: {tracks.ids[slot]}) vừa vượt qua vạch ngang khi đèn đỏ "
+                                    f"(frame {tracks.crossing_frame[slot]})")
+                        logger.info(f"📏 Chi tiết: đuôi xe y2={y2} nằm phía trên vạch tại {line_pos}, khoảng cách={line_pos-y2}px")
                         
-                        # Chỉ kiểm tra vi phạm trên vạch ngang
-                        if is_horizontal:
-                            # Lấy vị trí của vạch ngang - lấy giá trị y nhỏ nhất trong trường hợp vạch không hoàn toàn ngang
-                            line_pos = min(line_coords[0][1], line_coords[1][1])
-                            
-                            # Lấy vị trí y2 trước đó của phương tiện (nếu có)
-                            old_y2 = vehicle_data.get('old_y2', None)
-                            
-                            # Đảm bảo tọa độ đáy của phương tiện (y2) <= tọa độ vạch dừng (line_pos)
-                            # là điều kiện đủ để xác định vi phạm
-                            violation_detected = y2 <= line_pos
-                            
-                            # Debug log để kiểm tra tọa độ chi tiết
-                            logger.debug(f"Tracking - Xe (ID: {closest_id}): y1={y1}, y2={y2}, old_y2={old_y2}, line_pos={line_pos}, violation={violation_detected}")
-                            
-                            # Phương tiện vi phạm khi:
-                            # 1. Phần đuôi xe hiện tại đã vượt qua vạch (y2 <= line_pos)
-                            # 2. Phần đuôi xe trước đó chưa vượt qua vạch (old_y2 > line_pos hoặc old_y2 là None)
-                            just_crossed = violation_detected and (old_y2 is None or old_y2 > line_pos)
-                            
-                            if just_crossed:
-                                vehicle_data['crossed_line'] = True
-                                logger.info(f"Phương tiện (ID: {closest_id}) vừa vượt qua vạch ngang khi đèn đỏ")
-                                logger.info(f"📏 Chi tiết: đuôi xe y2={y2} nằm phía trên vạch tại {line_pos}, khoảng cách={line_pos-y2}px")
-                                
-                                # Xác định điểm đầu và cuối của vạch dừng
-                                line_start = (int(line_coords[0][0]), int(line_coords[0][1]))
-                                line_end = (int(line_coords[1][0]), int(line_coords[1][1]))
-                                
-                                # Chụp ảnh vi phạm ngay lập tức
-                                try:
-                                    vehicle_tuple = (x1, y1, x2, y2, class_id, score)
-                                    frame_height, frame_width = frame.shape[:2]
-                                    _, _, license_plates = self.detector.detect_objects(frame)
-                                    self.record_violation(vehicle_tuple, license_plates, center_x, center_y, 
-                                                       "", frame.copy(), line_start, line_end, 
-                                                       [])  # Không cần thêm vào new_violations ở đây
-                                except Exception as e:
-                                    logger.error(f"Lỗi khi ghi nhận vi phạm tự động: {str(e)}")
-                            elif violation_detected:
-                                # Đã qua vạch nhưng không phải vừa mới qua
-                                vehicle_data['crossed_line'] = True
-                            
-                            # Lưu vị trí y2 hiện tại cho lần kiểm tra tiếp theo
-                            vehicle_data['old_y2'] = y2
-                
-                current_vehicles[closest_id] = vehicle_data
+                        # Xác định điểm đầu và cuối của vạch dừng
+                        line_start = (int(line_coords[0][0]), int(line_coords[0][1]))
+                        line_end = (int(line_coords[1][0]), int(line_coords[1][1]))
+                        
+                        # Chụp ảnh vi phạm ngay lập tức, ghi nhận sau khi tìm biển số cho cả frame
+                        try:
+                            vehicle_tuple = (x1, y1, x2, y2, class_id, score)
+                            if license_plates is None:
+                                license_plates = ([] if ENABLE_CROP_PLATES or frame is None
+                                                  else self.detector.detect(frame).license_plates)
+                            self.pending_violations.append((vehicle_tuple, license_plates, center_x, center_y,
+                                                            "", frame.copy() if frame is not None else None,
+                                                            line_start, line_end,
+                                                            []))  # Không cần thêm vào new_violations ở đây
+                        except Exception as e:
+                            logger.error(f"Lỗi khi ghi nhận vi phạm tự động: {str(e)}")
+                    elif violation_detected:
+                        # Đã qua vạch nhưng không phải vừa mới qua
+                        tracks.crossed[slot] = True
+                    
+                    # Lưu vị trí y2 hiện tại cho lần kiểm tra tiếp theo
+                    tracks.old_y2[slot] = y2
             else:
                 # Tạo ID mới cho phương tiện chưa được theo dõi
-                vehicle_type = self.detector.vehicle_classes[class_id]
-                
-                new_vehicle = {
-                    'position_history': [(center_x, center_y)],
-                    'crossed_line': False,
-                    'vehicle_type': vehicle_type,
-                    'current_bbox': (x1, y1, x2, y2),
-                    'first_seen': datetime.now().timestamp()
-                }
-                
-                current_vehicles[self.next_vehicle_id] = new_vehicle
+                tracks.add(self.next_vehicle_id, (x1, y1, x2, y2), class_id, score, frame_idx,
+                           self.video_time_ms)
                 self.next_vehicle_id += 1
         
-        # Xóa các phương tiện đã theo dõi quá lâu (có thể đã rời khỏi khung hình)
-        current_time = datetime.now().timestamp()
-        vehicles_to_keep = {}
-        max_tracking_time = 30  # 30 giây
+        if track_slots is not None:
+            return
         
-        for vehicle_id, vehicle_data in current_vehicles.items():
-            if 'first_seen' not in vehicle_data:
-                vehicle_data['first_seen'] = current_time
-            
-            if current_time - vehicle_data['first_seen'] < max_tracking_time:
-                vehicles_to_keep[vehicle_id] = vehicle_data
+        self.motion_model.update(np.array(matched_slots, dtype=np.int64), matched_centers, frame_idx)
+        
+        # Phương tiện không được phát hiện trong frame này (bị che, mô hình bỏ sót) được giữ lại
+        # vài frame phân tích để không mất ID; vị trí của nó tiếp tục được dự đoán
+        unmatched_slots = slots[unmatched_tracks]
+        tracks.misses[unmatched_slots] += 1
+        tracks.remove(unmatched_slots[tracks.misses[unmatched_slots] > TRACK_MAX_MISSES])
         
-        # Cập nhật danh sách phương tiện đang theo dõi
-        self.tracked_vehicles = vehicles_to_keep
+        # Xóa các phương tiện đã theo dõi quá lâu theo thời gian video (có thể đã rời khỏi khung hình)
+        live_slots = np.flatnonzero(tracks.active)
+        age_ms = self.video_time_ms - tracks.first_time[live_slots]
+        tracks.remove(live_slots[age_ms >= TRACK_MAX_AGE_SECONDS * 1000])
     
     def is_same_vehicle(self, bbox1, bbox2, iou_threshold=0.5):
         """
@@ -534,7 +1201,7 @@ class ViolationDetector:
         center_distance = ((center1_x - center2_x) ** 2 + (center1_y - center2_y) ** 2) ** 0.5
         
         # Nếu khoảng cách quá lớn, không phải cùng một phương tiện
-        max_distance = 300  # Ngưỡng khoảng cách tối đa
+        max_distance = 300 * self.pixel_scale  # Ngưỡng khoảng cách tối đa
         if center_distance > max_distance:
             return False
         
@@ -557,7 +1224,66 @@ class ViolationDetector:
         # Tính IoU
         iou = intersection / float(area1 + area2 - intersection)
         
-        return iou >= iou_threshold or center_distance < 50  # Thỏa mãn một trong hai điều kiện
+        return iou >= iou_threshold or center_distance < 50 * self.pixel_scale  # Thỏa mãn một trong hai điều kiện
+    
+    def record_pending_violations(self, frame):
+        """
+        Ghi nhận các vi phạm đã thu thập trong frame
+        
+        Biển số của mỗi xe vi phạm được tìm trên vùng cắt độ phân giải gốc của chính xe đó
+        (mọi xe vi phạm trong frame chạy chung một lô); nếu không tìm thấy sẽ dùng biển số
+        của lượt phát hiện toàn khung hình. Khi kết quả phát hiện lấy từ cache
+        (skip_plate_inference) chỉ dùng biển số của lượt toàn khung hình.
+        
+        Args:
+            frame: Khung hình gốc chưa vẽ
+        """
+        pending, self.pending_violations = self.pending_violations, []
+        if not pending:
+            return
+        
+        crop_plates = [None] * len(pending)
+        if ENABLE_CROP_PLATES and not self.skip_plate_inference:
+            try:
+                crop_plates = self.detect_vehicle_plates(frame, [args[0][:4] for args in pending])
+            except Exception as e:
+                logger.error(f"Lỗi khi tìm biển số trên vùng cắt phương tiện: {str(e)}")
+        
+        for (vehicle, license_plates, *rest), plates in zip(pending, crop_plates):
+            self.record_violation(vehicle, plates or license_plates, *rest)
+    
+    def detect_vehicle_plates(self, frame, vehicle_boxes):
+        """
+        Tìm biển số trên vùng cắt của từng phương tiện trong một lần gọi mô hình theo lô
+        
+        Args:
+            frame: Khung hình gốc
+            vehicle_boxes: Danh sách hộp phương tiện (x1, y1, x2, y2)
+            
+        Returns:
+            list: Với mỗi phương tiện, danh sách biển số (x1, y1, x2, y2, score) nằm trong xe, score giảm dần
+        """
+        start_time = time.perf_counter()
+        regions = []
+        for x1, y1, x2, y2 in vehicle_boxes:
+            margin_x = (x2 - x1) * PLATE_CROP_MARGIN
+            margin_y = (y2 - y1) * PLATE_CROP_MARGIN
+            regions.append((x1 - margin_x, y1 - margin_y, x2 + margin_x, y2 + margin_y))
+        
+        results = []
+        for (x1, y1, x2, y2), region, detections in zip(vehicle_boxes, regions,
+                                                         self.detector.detect_crops(frame, regions)):
+            plates = [plate for plate in detections.license_plates
+                      if region[0] <= (plate[0] + plate[2]) / 2 <= region[2]
+                      and region[1] <= (plate[1] + plate[3]) / 2 <= region[3]]
+            results.append(sorted(plates, key=lambda plate: plate[4], reverse=True))
+        
+        stats = self.plate_crop_stats
+        stats['batches'] += 1
+        stats['crops'] += len(vehicle_boxes)
+        stats['crops_with_plate'] += sum(1 for plates in results if plates)
+        stats['total_ms'] += (time.perf_counter() - start_time) * 1000
+        return results
     
     def record_violation(self, vehicle, license_plates, center_x, center_y, vehicle_direction, 
                        violation_frame, line_start, line_end, new_violations):
@@ -603,8 +1329,8 @@ class ViolationDetector:
                 logger.error(f"Không thể tạo thư mục lưu vi phạm: {str(e)}")
                 # Tiếp tục xử lý mà không lưu ảnh
             
-            # Lấy thời gian hiện tại
-            current_time = datetime.now()
+            # Thời điểm vi phạm theo đồng hồ video của frame (không phụ thuộc tốc độ xử lý)
+            current_time = self.video_datetime()
             timestamp = current_time.strftime("%Y-%m-%d %H:%M:%S")
             time_for_display = current_time.strftime("%H:%M:%S %d/%m/%Y")  # Format thời gian hiển thị
             
@@ -769,6 +1495,8 @@ class ViolationDetector:
             violation = {
                 'id': violation_id,
                 'timestamp': timestamp,
+                'frame': int(self.frame_index),
+                'video_time': round(self.video_time_ms / 1000, 3),
                 'vehicleType': vehicle_type,
                 'licensePlate': license_plate_text,
                 'confidence': confidence,
@@ -838,7 +1566,53 @@ class ViolationDetector:
             return True
             
         return False
-    
+
+    def min_distance_to_line(self):
+        """
+        Khoảng cách nhỏ nhất từ đuôi xe (y2) của các phương tiện đang theo dõi
+        và chưa vượt vạch tới vạch dừng
+
+        Returns:
+            float: Khoảng cách nhỏ nhất quy đổi về pixel ở độ phân giải FRAME_HEIGHT
+                (không phụ thuộc độ phân giải luồng), hoặc None nếu không có vạch ngang hoặc không có phương tiện nào
+        """
+        if not self.line:
+            return None
+
+        line_coords = list(self.line.coords)
+        is_horizontal = abs(line_coords[0][1] - line_coords[1][1]) < abs(line_coords[0][0] - line_coords[1][0])
+        if not is_horizontal:
+            return None
+
+        line_pos = min(line_coords[0][1], line_coords[1][1])
+        waiting = self.tracks.active & ~self.tracks.crossed
+        distances = self.tracks.boxes[waiting, 3] - line_pos
+        distances = distances[distances > 0]
+        return float(distances.min()) / self.pixel_scale if len(distances) else None
+
+    def frames_to_crossing(self):
+        """
+        Số frame dự đoán (theo mô hình chuyển động) tới khi đuôi xe (y2) của một phương tiện
+        đang theo dõi và chưa vượt vạch chạm vạch dừng ngang
+
+        Returns:
+            float: Số frame nhỏ nhất tính từ frame vừa theo dõi, hoặc None nếu không có vạch ngang
+                hoặc không có phương tiện nào đang tiến về phía vạch
+        """
+        if not self.line:
+            return None
+
+        line_coords = list(self.line.coords)
+        is_horizontal = abs(line_coords[0][1] - line_coords[1][1]) < abs(line_coords[0][0] - line_coords[1][0])
+        if not is_horizontal:
+            return None
+
+        line_pos = min(line_coords[0][1], line_coords[1][1])
+        slots = np.flatnonzero(self.tracks.active & ~self.tracks.crossed)
+        frames = self.motion_model.frames_to_line(slots, self.tracks.boxes[slots, 3], line_pos, self.frame_index)
+        frames = frames[np.isfinite(frames)]
+        return float(frames.min()) if len(frames) else None
+
     def draw_boundaries(self, frame):
         """
         Vẽ các đường biên đã định nghĩa lên khung hình
@@ -1003,32 +1777,12 @@ class ViolationDetector:
         """
         self.boundaries = boundaries
         
-        # Cập nhật các đối tượng Shapely
-        self.line = None
-        self.vehicle_polygon = None
-        self.traffic_light_polygon = None
+        # Vùng đèn có thể đã thay đổi nên cần khóa lại vị trí đèn
+        if self.light_engine:
+            self.light_engine.reset()
         
-        if 'line' in boundaries and len(boundaries['line']) >= 2:
-            points = [(p['x'] * self.frame_width, p['y'] * self.frame_height) for p in boundaries['line']]
-            # Log tọa độ vạch dừng để kiểm tra
-            logger.info(f"KHỞI TẠO: Tọa độ vạch dừng gốc: {points}")
-            
-            # Đảm bảo vạch dừng được định nghĩa từ trái sang phải
-            if points[0][0] > points[1][0]:
-                points = [points[1], points[0]]
-                logger.info(f"KHỞI TẠO: Đã đổi chiều vạch dừng: {points}")
-            
-            self.line = LineString(points)
-        
-        if 'vehiclePolygon' in boundaries and len(boundaries['vehiclePolygon']) >= 3:
-            points = [(p['x'] * self.frame_width, p['y'] * self.frame_height) for p in boundaries['vehiclePolygon']]
-            self.vehicle_polygon = Polygon(points)
-            logger.info(f"KHỞI TẠO: Tọa độ đa giác phương tiện: {points}")
-        
-        if 'trafficLightPolygon' in boundaries and len(boundaries['trafficLightPolygon']) >= 3:
-            points = [(p['x'] * self.frame_width, p['y'] * self.frame_height) for p in boundaries['trafficLightPolygon']]
-            self.traffic_light_polygon = Polygon(points)
-            logger.info(f"KHỞI TẠO: Tọa độ đa giác đèn giao thông: {points}")
+        # Cập nhật các đối tượng Shapely theo độ phân giải hiện tại
+        self.compile_boundaries(self.frame_width, self.frame_height, force=True)
     
     def get_light_status_vietnamese(self):
         """
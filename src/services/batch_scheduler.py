@@ -0,0 +1,178 @@
+"""
+Bộ lập lịch suy luận theo lô (micro-batching) cho TrafficDetector
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from src.core.config import logger
+
+class BatchInferenceScheduler:
+    def __init__(self, detector, max_batch_size=4, max_wait_ms=10):
+        """
+        Gom khung hình từ một hoặc nhiều nguồn và chạy chúng theo lô
+        
+        Tham số:
+            detector: TrafficDetector đã khởi tạo (cần có detect_batch)
+            max_batch_size: Số khung hình tối đa trong một lô
+            max_wait_ms: Thời gian chờ tối đa (ms) để gom thêm khung hình sau khung hình đầu tiên
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        
+        self.request_queue = queue.Queue()
+        self.worker = None
+        self.running = False
+        
+        # Thống kê
+        self.stats_lock = threading.Lock()
+        self.total_batches = 0
+        self.total_frames = 0
+        self.total_inference_time = 0.0
+    
+    def start(self):
+        """
+        Khởi động thread suy luận
+        """
+        if self.running:
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self._run, name="batch-inference")
+        self.worker.daemon = True
+        self.worker.start()
+        logger.info(f"Đã khởi động bộ lập lịch suy luận theo lô (batch={self.max_batch_size}, wait={self.max_wait * 1000:.0f}ms)")
+    
+    def stop(self):
+        """
+        Dừng thread suy luận, các yêu cầu còn lại sẽ nhận lỗi
+        """
+        self.running = False
+        if self.worker:
+            self.worker.join(timeout=5)
+            self.worker = None
+        
+        # Hủy các yêu cầu chưa được xử lý để không có nguồn nào bị treo
+        while True:
+            try:
+                _, _, future = self.request_queue.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("Bộ lập lịch suy luận đã dừng"))
+    
+    def submit(self, frame, regions=None):
+        """
+        Gửi một khung hình để suy luận
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            regions: Danh sách vùng (x1, y1, x2, y2) chỉ cần suy luận (tùy chọn, mặc định toàn khung hình)
+            
+        Trả về:
+            Future: Future sẽ nhận Detections của khung hình
+        """
+        future = Future()
+        if not self.running:
+            self.start()
+        self.request_queue.put((frame, regions, future))
+        return future
+    
+    def infer(self, frame, regions=None, timeout=None):
+        """
+        Gửi một khung hình và chờ kết quả (blocking)
+        
+        Tham số:
+            frame: Khung hình đầu vào
+            regions: Danh sách vùng chỉ cần suy luận (tùy chọn)
+            timeout: Thời gian chờ tối đa (giây)
+            
+        Trả về:
+            Detections: Kết quả phát hiện của khung hình
+        """
+        return self.submit(frame, regions).result(timeout=timeout)
+    
+    def _collect_batch(self):
+        """
+        Lấy một lô yêu cầu: chờ yêu cầu đầu tiên, sau đó gom thêm cho đến khi đủ lô hoặc hết thời gian chờ
+        """
+        try:
+            batch = [self.request_queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining <= 0:
+                    batch.append(self.request_queue.get_nowait())
+                else:
+                    batch.append(self.request_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        """
+        Vòng lặp của thread suy luận
+        """
+        while self.running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            
+            try:
+                # Cả lô dùng cùng một detector dù mô hình được thay trong lúc đang chạy
+                detector = self.detector
+                
+                # Mỗi yêu cầu đóng góp một ảnh (toàn khung hình) hoặc nhiều canvas (các vùng cắt)
+                images = []
+                spans = []
+                for frame, regions, _ in batch:
+                    if regions is None:
+                        spans.append((len(images), 1, None))
+                        images.append(frame)
+                    else:
+                        canvases, transforms = detector.pack_regions(frame, regions)
+                        spans.append((len(images), len(canvases), transforms))
+                        images.extend(canvases)
+                
+                start_time = time.time()
+                results = detector.detect_batch(images)
+                elapsed = time.time() - start_time
+                
+                with self.stats_lock:
+                    self.total_batches += 1
+                    self.total_frames += len(batch)
+                    self.total_inference_time += elapsed
+                
+                for (_, _, future), (start, count, transforms) in zip(batch, spans):
+                    if transforms is None:
+                        future.set_result(results[start])
+                    else:
+                        future.set_result(detector.merge_regions(results[start:start + count], transforms))
+            except Exception as e:
+                logger.error(f"Lỗi khi suy luận theo lô: {str(e)}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    def get_stats(self):
+        """
+        Lấy thống kê của bộ lập lịch
+        
+        Trả về:
+            dict: Số lô, số khung hình, kích thước lô trung bình và thời gian suy luận trung bình mỗi khung hình
+        """
+        with self.stats_lock:
+            avg_batch = self.total_frames / self.total_batches if self.total_batches else 0.0
+            avg_ms = self.total_inference_time * 1000 / self.total_frames if self.total_frames else 0.0
+            return {
+                'batches': self.total_batches,
+                'frames': self.total_frames,
+                'avg_batch_size': round(avg_batch, 2),
+                'avg_ms_per_frame': round(avg_ms, 2),
+                'max_batch_size': self.max_batch_size,
+                'pending': self.request_queue.qsize()
+            }
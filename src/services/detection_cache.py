@@ -0,0 +1,224 @@
+"""
+Bộ nhớ đệm kết quả phát hiện theo video trên đĩa
+
+Mỗi mục cache là một thư mục chứa các mảng NumPy dạng cột, được đọc bằng memory-map:
+    frame_indices.npy  (F,)   chỉ số các frame đã suy luận, tăng dần
+    offsets.npy        (F+1,) vị trí bắt đầu đối tượng của từng frame trong các mảng bên dưới
+    boxes.npy          (N, 4) hộp x1, y1, x2, y2 theo tọa độ khung hình gốc
+    scores.npy         (N,)   độ tin cậy
+    class_ids.npy      (N,)   chỉ số lớp
+
+Khóa cache gồm hash nội dung video, hash mô hình và các thiết lập suy luận nên việc
+chỉnh lại vùng/vạch dừng rồi xử lý lại cùng video sẽ không phải chạy lại mô hình.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+
+from src.core.config import logger, DETECTION_CACHE_FOLDER, DETECTION_CACHE_MAX_ENTRIES
+from src.models.detector import Detections
+
+# Hash file theo (đường dẫn, kích thước, thời điểm sửa) để không đọc lại toàn bộ file mỗi lần xử lý
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Tính hash nội dung file (đọc theo khối)
+
+    Trả về:
+        str: Chuỗi hex SHA-1
+    """
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if signature in _file_hashes:
+            return _file_hashes[signature]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    with _file_hashes_lock:
+        _file_hashes[signature] = digest.hexdigest()
+    return digest.hexdigest()
+
+def detection_cache_key(video_path, model_path, settings):
+    """
+    Tạo khóa cache từ nội dung video, nội dung mô hình và thiết lập suy luận
+
+    Tham số:
+        video_path: Đường dẫn video
+        model_path: Đường dẫn file mô hình thực sự được backend sử dụng
+        settings: Dict thiết lập ảnh hưởng tới kết quả (backend, kích thước đầu vào, ngưỡng, ...)
+
+    Trả về:
+        str: Khóa cache
+    """
+    payload = json.dumps({
+        'video': file_hash(video_path),
+        'model': file_hash(model_path),
+        'settings': settings
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+class DetectionCache:
+    """
+    Kết quả phát hiện đã lưu của một video (chỉ đọc, memory-map)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.frame_indices = np.load(os.path.join(path, 'frame_indices.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.boxes = np.load(os.path.join(path, 'boxes.npy'), mmap_mode='r')
+        self.scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+        self.class_ids = np.load(os.path.join(path, 'class_ids.npy'), mmap_mode='r')
+
+        # Thống kê
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, key, folder=DETECTION_CACHE_FOLDER):
+        """
+        Mở mục cache theo khóa
+
+        Trả về:
+            DetectionCache, hoặc None nếu chưa có hoặc mục cache bị hỏng
+        """
+        path = os.path.join(folder, key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            cache = cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Bỏ qua cache phát hiện bị hỏng {path}: {str(e)}")
+            return None
+        # Đánh dấu vừa dùng để không bị xóa trước các mục cũ hơn
+        os.utime(path)
+        return cache
+
+    def _position(self, frame_idx):
+        """
+        Vị trí của frame trong các mảng, hoặc None nếu frame không có trong cache
+        """
+        position = int(np.searchsorted(self.frame_indices, frame_idx))
+        if position >= len(self.frame_indices) or self.frame_indices[position] != frame_idx:
+            return None
+        return position
+
+    def __contains__(self, frame_idx):
+        return self._position(frame_idx) is not None
+
+    def __len__(self):
+        return len(self.frame_indices)
+
+    def columns(self, position):
+        """
+        Lấy (boxes, scores, class_ids) của frame tại vị trí position
+        """
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.boxes[start:end], self.scores[start:end], self.class_ids[start:end]
+
+    def get(self, frame_idx):
+        """
+        Lấy kết quả phát hiện của một frame
+
+        Trả về:
+            Detections, hoặc None nếu frame này không được suy luận ở lần xử lý trước
+        """
+        position = self._position(frame_idx)
+        if position is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return Detections(*self.columns(position))
+
+class DetectionCacheWriter:
+    """
+    Ghi lại kết quả phát hiện trong một lần xử lý video, lưu xuống đĩa khi video được xử lý hết
+
+    Khi đã có cache (base), chỉ các frame chưa có trong cache được ghi lại rồi gộp vào khi lưu:
+    lần xử lý sau có thể chọn frame khác (ví dụ vạch dừng đã được chỉnh lại).
+    """
+    def __init__(self, key, base=None, folder=DETECTION_CACHE_FOLDER, max_entries=DETECTION_CACHE_MAX_ENTRIES):
+        self.key = key
+        self.base = base
+        self.folder = folder
+        self.max_entries = max_entries
+        self.frames = {}
+
+    def add(self, frame_idx, detections):
+        """
+        Ghi lại kết quả phát hiện của một frame đã suy luận
+        """
+        if self.base is not None and frame_idx in self.base:
+            return
+        self.frames[frame_idx] = (np.array(detections.boxes, dtype=np.float32),
+                                  np.array(detections.scores, dtype=np.float32),
+                                  np.array(detections.class_ids, dtype=np.int16))
+
+    def save(self):
+        """
+        Ghi các mảng dạng cột vào thư mục tạm rồi đổi tên để mục cache luôn đầy đủ
+
+        Trả về:
+            str: Đường dẫn mục cache, hoặc None nếu không có frame nào
+        """
+        if not self.frames:
+            return None
+
+        frames = dict(self.frames)
+        if self.base is not None:
+            for position, frame_idx in enumerate(self.base.frame_indices):
+                frames[int(frame_idx)] = tuple(np.array(column) for column in self.base.columns(position))
+
+        frame_indices = np.array(sorted(frames), dtype=np.int64)
+        columns = [frames[idx] for idx in frame_indices]
+        offsets = np.zeros(len(columns) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(scores) for _, scores, _ in columns])
+
+        path = os.path.join(self.folder, self.key)
+        temp_path = f"{path}.tmp{os.getpid()}"
+        os.makedirs(temp_path, exist_ok=True)
+        np.save(os.path.join(temp_path, 'frame_indices.npy'), frame_indices)
+        np.save(os.path.join(temp_path, 'offsets.npy'), offsets)
+        np.save(os.path.join(temp_path, 'boxes.npy'),
+                np.concatenate([boxes for boxes, _, _ in columns]).reshape(-1, 4))
+        np.save(os.path.join(temp_path, 'scores.npy'), np.concatenate([scores for _, scores, _ in columns]))
+        np.save(os.path.join(temp_path, 'class_ids.npy'), np.concatenate([ids for _, _, ids in columns]))
+
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_path, path)
+
+        self.evict()
+        logger.info(f"Đã lưu cache phát hiện {len(frame_indices)} frame ({offsets[-1]} đối tượng) vào {path}")
+        return path
+
+    def evict(self):
+        """
+        Xóa các mục cache ít được dùng gần đây nhất khi vượt quá số mục tối đa
+        """
+        entries = [os.path.join(self.folder, name) for name in os.listdir(self.folder)
+                   if os.path.isdir(os.path.join(self.folder, name)) and '.tmp' not in name]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def get_stats(self):
+        """
+        Lấy thống kê số frame lấy từ cache và số frame mới được ghi lại
+        """
+        return {
+            'cached_frames': len(self.base) if self.base is not None else 0,
+            'hits': self.base.hits if self.base is not None else 0,
+            'misses': self.base.misses if self.base is not None else 0,
+            'new_frames': len(self.frames)
+        }
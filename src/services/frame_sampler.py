@@ -0,0 +1,63 @@
+"""
+Bộ chọn frame thích ứng theo trạng thái cảnh cho xử lý video
+"""
+import math
+
+class AdaptiveFrameSampler:
+    def __init__(self, sparse_stride=8, dense_stride=3, near_line_stride=1, near_line_distance=80):
+        """
+        Chọn bước nhảy frame (stride) theo trạng thái đèn và khoảng cách phương tiện tới vạch dừng
+
+        Tham số:
+            sparse_stride: Bước nhảy khi đèn xanh hoặc chưa xác định
+            dense_stride: Bước nhảy khi đèn đỏ (hoặc vàng, sắp chuyển đỏ)
+            near_line_stride: Bước nhảy khi đèn đỏ và có phương tiện sát vạch dừng
+            near_line_distance: Khoảng cách (pixel) từ đáy phương tiện tới vạch được coi là sát vạch
+        """
+        self.sparse_stride = max(1, int(sparse_stride))
+        self.dense_stride = max(1, int(dense_stride))
+        self.near_line_stride = max(1, int(near_line_stride))
+        self.near_line_distance = near_line_distance
+
+        self.current_stride = self.sparse_stride
+        self.last_processed_idx = None
+
+    def update(self, light_status, distance_to_line=None, frames_to_crossing=None):
+        """
+        Cập nhật bước nhảy theo trạng thái cảnh sau mỗi frame đã phân tích
+
+        Tham số:
+            light_status: Trạng thái đèn hiện tại ('red', 'yellow', 'green', 'unknown')
+            distance_to_line: Khoảng cách nhỏ nhất từ đáy phương tiện đang theo dõi tới vạch (None nếu không có)
+            frames_to_crossing: Số frame dự đoán tới khi phương tiện gần nhất chạm vạch (None nếu không có);
+                khi đèn đỏ, frame phân tích tiếp theo không vượt quá frame dự đoán này
+
+        Trả về:
+            int: Bước nhảy mới
+        """
+        if light_status in ('red', 'yellow'):
+            if light_status == 'red' and distance_to_line is not None and distance_to_line <= self.near_line_distance:
+                self.current_stride = self.near_line_stride
+            else:
+                self.current_stride = self.dense_stride
+        else:
+            self.current_stride = self.sparse_stride
+
+        if light_status == 'red' and frames_to_crossing is not None:
+            self.current_stride = max(1, min(self.current_stride, int(math.ceil(frames_to_crossing))))
+        return self.current_stride
+
+    def should_process(self, frame_idx):
+        """
+        Kiểm tra frame có cần được phân tích không theo bước nhảy hiện tại
+
+        Tham số:
+            frame_idx: Chỉ số frame trong video
+
+        Trả về:
+            bool: True nếu frame cần phân tích
+        """
+        if self.last_processed_idx is None or frame_idx - self.last_processed_idx >= self.current_stride:
+            self.last_processed_idx = frame_idx
+            return True
+        return False
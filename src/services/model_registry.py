@@ -0,0 +1,147 @@
+"""
+Sổ đăng ký mô hình: tải nhiều mô hình khi cần, giữ các mô hình dùng gần đây nhất trong
+giới hạn bộ nhớ và giải phóng các mô hình còn lại (LRU)
+"""
+import os
+import gc
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from src.core.config import logger
+
+class ModelRegistry:
+    def __init__(self, loader, memory_budget_mb=2048, memory_factor=4.0):
+        """
+        Tham số:
+            loader: Hàm nhận đường dẫn mô hình và trả về detector đã tải (và đã khởi động)
+            memory_budget_mb: Tổng bộ nhớ ước tính tối đa của các mô hình được giữ lại
+            memory_factor: Hệ số quy đổi kích thước file mô hình ra bộ nhớ khi chạy
+                (trọng số, bộ đệm của backend, bộ nhớ trung gian khi suy luận)
+        """
+        self.loader = loader
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.memory_factor = memory_factor
+
+        # {đường dẫn: {'detector', 'memory', 'refs'}}, mục cuối là mục dùng gần đây nhất
+        self.entries = OrderedDict()
+        # {đường dẫn: Future} của các mô hình đang tải; việc tải chạy ngoài khóa
+        self.loading = {}
+        self.lock = threading.RLock()
+
+        # Thống kê
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def estimate_memory(self, model_path):
+        """
+        Ước tính bộ nhớ của một mô hình khi đã tải (byte)
+        """
+        try:
+            return int(os.path.getsize(model_path) * self.memory_factor)
+        except OSError:
+            return 0
+
+    def acquire(self, model_path):
+        """
+        Lấy detector của một mô hình (tải nếu chưa có) và giữ nó không bị giải phóng cho tới release()
+
+        Tham số:
+            model_path: Đường dẫn file mô hình
+
+        Trả về:
+            Detector của mô hình
+        """
+        model_path = os.path.abspath(model_path)
+        while True:
+            with self.lock:
+                entry = self.entries.get(model_path)
+                if entry is not None:
+                    self.hits += 1
+                    self.entries.move_to_end(model_path)
+                    entry['refs'] += 1
+                    self._evict()
+                    return entry['detector']
+
+                # Hai luồng cùng yêu cầu một mô hình không tải hai lần: luồng sau chờ luồng đang tải
+                future = self.loading.get(model_path)
+                if future is None:
+                    future = Future()
+                    self.loading[model_path] = future
+                    break
+
+            # Mô hình có thể đã bị giải phóng lại trước khi luồng này kịp giữ nó, khi đó thử lại
+            future.result()
+
+        # Tải (và khởi động) mô hình ngoài khóa để get_stats và các mô hình khác không bị chặn
+        logger.info(f"Sổ đăng ký mô hình: đang tải {model_path}")
+        try:
+            detector = self.loader(model_path)
+        except Exception as e:
+            with self.lock:
+                del self.loading[model_path]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            self.entries[model_path] = {'detector': detector, 'memory': self.estimate_memory(model_path), 'refs': 1}
+            self.loads += 1
+            del self.loading[model_path]
+            self._evict()
+        future.set_result(detector)
+        return detector
+
+    def release(self, model_path):
+        """
+        Trả lại một mô hình đã acquire(); mô hình có thể bị giải phóng khi vượt giới hạn bộ nhớ
+        """
+        if model_path is None:
+            return
+        model_path = os.path.abspath(model_path)
+        with self.lock:
+            entry = self.entries.get(model_path)
+            if entry is not None and entry['refs'] > 0:
+                entry['refs'] -= 1
+            self._evict()
+
+    def _evict(self):
+        """
+        Giải phóng các mô hình không còn được dùng, ít được dùng gần đây nhất trước,
+        cho tới khi tổng bộ nhớ ước tính nằm trong giới hạn
+        """
+        evicted = False
+        for model_path in list(self.entries):
+            if self.memory_used() <= self.memory_budget:
+                break
+            if self.entries[model_path]['refs'] > 0:
+                continue
+            del self.entries[model_path]
+            self.evictions += 1
+            evicted = True
+            logger.info(f"Sổ đăng ký mô hình: đã giải phóng {model_path}")
+        if evicted:
+            gc.collect()
+
+    def memory_used(self):
+        """
+        Tổng bộ nhớ ước tính của các mô hình đang được giữ (byte)
+        """
+        return sum(entry['memory'] for entry in self.entries.values())
+
+    def get_stats(self):
+        """
+        Lấy danh sách mô hình đang được giữ (cũ nhất trước), các mô hình đang tải và thống kê tải/giải phóng
+        """
+        with self.lock:
+            return {
+                'resident': [{'model': os.path.basename(model_path), 'refs': entry['refs'],
+                              'memory_mb': round(entry['memory'] / (1024 * 1024), 1)}
+                             for model_path, entry in self.entries.items()],
+                'loading': [os.path.basename(model_path) for model_path in self.loading],
+                'memory_mb': round(self.memory_used() / (1024 * 1024), 1),
+                'budget_mb': round(self.memory_budget / (1024 * 1024), 1),
+                'hits': self.hits,
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
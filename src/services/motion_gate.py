@@ -0,0 +1,113 @@
+"""
+Bộ lọc chuyển động: bỏ qua suy luận khi vùng phương tiện không có hoạt động
+"""
+import cv2
+import numpy as np
+
+class MotionGate:
+    def __init__(self, polygon_points=None, downscale_width=160, pixel_threshold=25,
+                 activity_threshold=0.002, max_skipped_frames=15):
+        """
+        So sánh frame hiện tại (thu nhỏ, xám) với frame kiểm tra trước đó trong vùng phương tiện
+
+        Tham số:
+            polygon_points: Danh sách điểm chuẩn hóa [{'x', 'y'}, ...] của vùng phương tiện (None = toàn frame)
+            downscale_width: Chiều rộng ảnh thu nhỏ dùng để so sánh
+            pixel_threshold: Chênh lệch độ sáng tối thiểu để một pixel được coi là thay đổi
+            activity_threshold: Tỉ lệ pixel thay đổi tối thiểu trong vùng để coi là có chuyển động
+            max_skipped_frames: Số frame bỏ qua liên tiếp tối đa trước khi bắt buộc suy luận lại
+        """
+        self.polygon_points = polygon_points
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.activity_threshold = activity_threshold
+        self.max_skipped_frames = max_skipped_frames
+
+        self.mask = None
+        self.mask_area = 0
+        self.previous = None
+        self.consecutive_skips = 0
+        self.last_activity = 0.0
+
+        # Thống kê
+        self.inferred_frames = 0
+        self.skipped_frames = 0
+
+    def _prepare(self, frame):
+        """
+        Thu nhỏ, chuyển xám và làm mờ frame; tạo mặt nạ vùng theo kích thước ảnh thu nhỏ
+        """
+        frame_height, frame_width = frame.shape[:2]
+        small_width = min(self.downscale_width, frame_width)
+        small_height = max(1, int(round(frame_height * small_width / frame_width)))
+
+        small = cv2.resize(frame, (small_width, small_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.mask is None or self.mask.shape != gray.shape:
+            if self.polygon_points and len(self.polygon_points) >= 3:
+                points = np.array([[p['x'] * small_width, p['y'] * small_height] for p in self.polygon_points],
+                                  dtype=np.int32)
+                self.mask = np.zeros(gray.shape, dtype=np.uint8)
+                cv2.fillPoly(self.mask, [points], 255)
+            else:
+                self.mask = np.full(gray.shape, 255, dtype=np.uint8)
+            self.mask_area = max(1, int(np.count_nonzero(self.mask)))
+            self.previous = None
+
+        return gray
+
+    def set_polygon(self, polygon_points):
+        """
+        Đổi vùng phương tiện cần kiểm tra; mặt nạ được tạo lại ở frame kế tiếp và frame đó
+        luôn được suy luận vì chưa có frame trước để so sánh trong vùng mới
+
+        Tham số:
+            polygon_points: Danh sách điểm chuẩn hóa [{'x', 'y'}, ...] của vùng phương tiện mới (None = toàn frame)
+        """
+        self.polygon_points = polygon_points
+        self.mask = None
+        self.mask_area = 0
+        self.previous = None
+
+    def has_motion(self, frame):
+        """
+        Kiểm tra vùng phương tiện có hoạt động so với lần kiểm tra trước không
+
+        Tham số:
+            frame: Frame BGR cần kiểm tra
+
+        Trả về:
+            bool: True nếu cần chạy suy luận cho frame này
+        """
+        gray = self._prepare(frame)
+        previous, self.previous = self.previous, gray
+
+        if previous is None:
+            self.last_activity = 1.0
+        else:
+            diff = cv2.absdiff(gray, previous)
+            changed = (diff >= self.pixel_threshold) & (self.mask > 0)
+            self.last_activity = np.count_nonzero(changed) / self.mask_area
+
+        # Luôn suy luận định kỳ để không bỏ lỡ phương tiện di chuyển rất chậm
+        if self.last_activity >= self.activity_threshold or self.consecutive_skips >= self.max_skipped_frames:
+            self.consecutive_skips = 0
+            self.inferred_frames += 1
+            return True
+
+        self.consecutive_skips += 1
+        self.skipped_frames += 1
+        return False
+
+    def get_stats(self):
+        """
+        Lấy thống kê số frame đã suy luận và đã bỏ qua
+        """
+        total = self.inferred_frames + self.skipped_frames
+        return {
+            'inferred_frames': self.inferred_frames,
+            'skipped_frames': self.skipped_frames,
+            'skip_ratio': round(self.skipped_frames / total, 3) if total else 0.0,
+            'last_activity': round(float(self.last_activity), 4)
+        }
@@ -0,0 +1,216 @@
+"""
+Nhật ký theo dõi theo video: hộp phương tiện và trạng thái đèn của từng frame đã phân tích,
+và trạng thái đèn cùng hộp di chuyển bằng optical flow của các frame không chạy mô hình
+
+Nhật ký được lưu dạng cột trong một file .npz để chạy lại logic vượt vạch của
+ViolationDetector với biên mới (what-if) trong vài giây, không cần giải mã video
+hay chạy mô hình:
+    frame_indices  (F,)    chỉ số các frame đã phân tích, tăng dần
+    frame_sizes    (F, 2)  chiều rộng, chiều cao của frame
+    light_states   (F,)    mã trạng thái đèn dùng khi theo dõi frame đó
+    propagated     (F,)    frame không chạy mô hình: hộp là hộp phương tiện đang theo dõi đã
+                           di chuyển bằng optical flow (không có trong nhật ký cũ, coi là False)
+    offsets        (F+1,)  vị trí bắt đầu phương tiện của từng frame trong các mảng bên dưới
+    boxes          (N, 4)  hộp x1, y1, x2, y2 của mọi phương tiện phát hiện (chưa lọc theo vùng),
+                           hoặc hộp đã di chuyển bằng optical flow
+    scores         (N,)    độ tin cậy
+    class_ids      (N,)    chỉ số lớp
+"""
+import os
+
+import numpy as np
+from shapely.geometry import Point
+
+from src.core.config import logger, TRACK_LOG_FOLDER
+
+LIGHT_STATES = ('unknown', 'red', 'yellow', 'green')
+
+class TrackLog:
+    def __init__(self, video_path=None, fps=30.0):
+        """
+        Tham số:
+            video_path: Đường dẫn video được ghi nhật ký
+            fps: Số frame mỗi giây của video (để quy đổi chỉ số frame ra thời gian video)
+        """
+        self.video_path = video_path
+        self.fps = fps
+        self.frames = []
+        self.arrays = None
+
+    @staticmethod
+    def path_for(video_path, folder=TRACK_LOG_FOLDER):
+        """
+        Đường dẫn file nhật ký của một video
+        """
+        return os.path.join(folder, f"{os.path.splitext(os.path.basename(video_path))[0]}.npz")
+
+    @classmethod
+    def find(cls, video_id, folder=TRACK_LOG_FOLDER):
+        """
+        Tìm và mở nhật ký của video đã tải lên theo video_id
+
+        Trả về:
+            TrackLog, hoặc None nếu video chưa được xử lý
+        """
+        if not os.path.isdir(folder):
+            return None
+        for name in os.listdir(folder):
+            if name.startswith(f"{video_id}_") and name.endswith('.npz'):
+                return cls.load(os.path.join(folder, name))
+        return None
+
+    @classmethod
+    def load(cls, path):
+        """
+        Đọc nhật ký đã lưu
+
+        Trả về:
+            TrackLog, hoặc None nếu file không đọc được
+        """
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Không đọc được nhật ký theo dõi {path}: {str(e)}")
+            return None
+
+        track_log = cls(fps=float(arrays.pop('fps')))
+        if 'propagated' not in arrays:
+            arrays['propagated'] = np.zeros(len(arrays['frame_indices']), dtype=bool)
+        track_log.arrays = arrays
+        return track_log
+
+    def add(self, frame_idx, vehicles, light_status, frame_size, propagated=False):
+        """
+        Ghi lại một frame đã phân tích
+
+        Tham số:
+            frame_idx: Chỉ số frame trong video
+            vehicles: Mọi phương tiện phát hiện trong frame (x1, y1, x2, y2, class_id, score)
+            light_status: Trạng thái đèn dùng khi theo dõi frame này
+            frame_size: (chiều rộng, chiều cao) của frame
+            propagated: Frame không chạy mô hình; vehicles là hộp đã di chuyển bằng optical flow
+        """
+        self.frames.append((frame_idx, frame_size, light_status, list(vehicles), propagated))
+
+    def __len__(self):
+        if self.arrays is not None:
+            return len(self.arrays['frame_indices'])
+        return len(self.frames)
+
+    def to_arrays(self):
+        """
+        Chuyển các frame đã ghi sang các mảng dạng cột
+
+        Trả về:
+            dict: Các mảng như mô tả ở đầu module
+        """
+        if self.arrays is not None and not self.frames:
+            return self.arrays
+
+        # Ảnh chụp danh sách: luồng xử lý video có thể vẫn đang ghi thêm frame
+        frames = list(self.frames)
+        vehicles = [vehicle for _, _, _, frame_vehicles, _ in frames for vehicle in frame_vehicles]
+        offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(frame_vehicles) for _, _, _, frame_vehicles, _ in frames])
+        return {
+            'frame_indices': np.array([frame_idx for frame_idx, _, _, _, _ in frames], dtype=np.int64),
+            'frame_sizes': np.array([size for _, size, _, _, _ in frames], dtype=np.int32).reshape(-1, 2),
+            'light_states': np.array([LIGHT_STATES.index(status) if status in LIGHT_STATES else 0
+                                      for _, _, status, _, _ in frames], dtype=np.int8),
+            'propagated': np.array([propagated for _, _, _, _, propagated in frames], dtype=bool),
+            'offsets': offsets,
+            'boxes': np.array([vehicle[:4] for vehicle in vehicles], dtype=np.float32).reshape(-1, 4),
+            'scores': np.array([vehicle[5] for vehicle in vehicles], dtype=np.float32),
+            'class_ids': np.array([vehicle[4] for vehicle in vehicles], dtype=np.int16)
+        }
+
+    def save(self, path=None):
+        """
+        Lưu nhật ký (ghi vào file tạm rồi đổi tên)
+
+        Trả về:
+            str: Đường dẫn file, hoặc None nếu chưa có frame nào
+        """
+        if not len(self):
+            return None
+        path = path or self.path_for(self.video_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp{os.getpid()}.npz"
+        np.savez_compressed(temp_path, fps=np.float64(self.fps), **self.to_arrays())
+        os.replace(temp_path, path)
+        logger.info(f"Đã lưu nhật ký theo dõi {len(self)} frame vào {path}")
+        return path
+
+    def iter_frames(self):
+        """
+        Duyệt lại các frame theo thứ tự
+
+        Trả về:
+            Iterator (frame_idx, (chiều rộng, chiều cao), light_status, vehicles, propagated)
+        """
+        arrays = self.to_arrays()
+        offsets = arrays['offsets']
+        for position, frame_idx in enumerate(arrays['frame_indices']):
+            start, end = int(offsets[position]), int(offsets[position + 1])
+            vehicles = [(x1, y1, x2, y2, int(class_id), score)
+                        for (x1, y1, x2, y2), class_id, score in zip(arrays['boxes'][start:end],
+                                                                      arrays['class_ids'][start:end],
+                                                                      arrays['scores'][start:end])]
+            width, height = arrays['frame_sizes'][position]
+            yield (int(frame_idx), (int(width), int(height)),
+                   LIGHT_STATES[int(arrays['light_states'][position])], vehicles,
+                   bool(arrays['propagated'][position]))
+
+def replay_violations(track_log, boundaries, vehicle_classes=None):
+    """
+    Chạy lại logic vượt vạch của ViolationDetector trên nhật ký theo dõi với biên mới
+
+    Chỉ dùng dữ liệu đã ghi và hình học của biên: không giải mã video, không cần mô hình đã tải.
+
+    Tham số:
+        track_log: TrackLog của video
+        boundaries: Dữ liệu biên cần đánh giá (line, vehiclePolygon, trafficLightPolygon)
+        vehicle_classes: Ánh xạ chỉ số lớp sang loại phương tiện (mặc định TrafficDetector.VEHICLE_CLASSES)
+
+    Trả về:
+        list: Các vi phạm {frame, video_time, vehicleType, confidence, bbox} theo thứ tự frame
+    """
+    from src.models.detector import TrafficDetector
+    from src.models.violation_detector import ViolationDetector
+
+    vehicle_classes = vehicle_classes or TrafficDetector.VEHICLE_CLASSES
+    violation_detector = ViolationDetector(None, boundaries)
+    fps = track_log.fps or 30.0
+    violation_detector.set_video_clock(fps)
+    violations = []
+
+    for frame_idx, (width, height), light_status, vehicles, propagated in track_log.iter_frames():
+        violation_detector.compile_boundaries(width, height)
+        violation_detector.current_light_status = light_status
+
+        if propagated:
+            # Hộp di chuyển bằng optical flow thuộc các phương tiện đang theo dõi (giống propagate_frame)
+            filtered_vehicles = vehicles
+        else:
+            # Lọc theo vùng phát hiện giống process_frame
+            filtered_vehicles = []
+            for vehicle in vehicles:
+                center_point = Point((vehicle[0] + vehicle[2]) / 2, (vehicle[1] + vehicle[3]) / 2)
+                if ((violation_detector.vehicle_polygon
+                     and violation_detector.vehicle_polygon.contains(center_point))
+                        or (violation_detector.traffic_light_polygon
+                            and violation_detector.traffic_light_polygon.contains(center_point))):
+                    filtered_vehicles.append(vehicle)
+
+        for x1, y1, x2, y2, class_id, score in violation_detector.replay_frame(filtered_vehicles, frame_idx,
+                                                                               propagated):
+            violations.append({
+                'frame': frame_idx,
+                'video_time': round(frame_idx / fps, 3),
+                'vehicleType': vehicle_classes.get(class_id, 'Unknown'),
+                'confidence': round(float(score), 4),
+                'bbox': [float(x1), float(y1), float(x2), float(y2)]
+            })
+
+    return violations
@@ -7,11 +7,25 @@ import time
 import threading
 import uuid
 import queue
+from concurrent.futures import Future
+from collections import deque
 from datetime import datetime
 
-from src.core.config import logger, PROCESSED_FOLDER, VIOLATIONS_FOLDER, FRAME_WIDTH, FRAME_HEIGHT
-from src.models.detector import TrafficDetector
-from src.models.violation_detector import ViolationDetector
+from src.core.config import (
+    logger, PROCESSED_FOLDER, VIOLATIONS_FOLDER, MODEL_WARMUP_RUNS, MODEL_DIR, MODEL_EXTENSIONS,
+    MODEL_REGISTRY_BUDGET_MB, MODEL_MEMORY_FACTOR,
+    DETECTOR_PRECISION, QUANTIZED_MODEL_PATH, ENABLE_BATCH_INFERENCE, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+    BATCH_PIPELINE_DEPTH, PLAYBACK_SPEED,
+    SAMPLER_SPARSE_STRIDE, SAMPLER_DENSE_STRIDE, SAMPLER_NEAR_LINE_STRIDE, SAMPLER_NEAR_LINE_DISTANCE,
+    ENABLE_MOTION_GATE, MOTION_GATE_WIDTH, MOTION_PIXEL_THRESHOLD, MOTION_ACTIVITY_THRESHOLD, MOTION_MAX_SKIPPED_FRAMES,
+    ENABLE_THREAD_BUDGET, ENABLE_DETECTION_CACHE, INFERENCE_MODE, ZONE_CROP_MARGIN, ENABLE_TRACK_LOG,
+    ENABLE_CASCADE, CASCADE_FAST_MODEL_PATH, CASCADE_NEAR_LINE_DISTANCE, CASCADE_CONFIDENT_SCORE, CASCADE_AMBIGUOUS_RATIO
+)
+from src.core.thread_budget import thread_budget
+from src.services.batch_scheduler import BatchInferenceScheduler
+from src.services.frame_sampler import AdaptiveFrameSampler
+from src.services.model_registry import ModelRegistry
+from src.services.motion_gate import MotionGate
 from src.utils.video_utils import create_empty_frame, save_frame, clear_processed_frames
 
 class VideoProcessor:
@@ -37,12 +51,37 @@ class VideoProcessor:
         self.model_loaded = False
         self.model_loading = False
         self.loading_thread = None
+        # Trạng thái sẵn sàng: not_loaded, loading, warming_up, ready, error
+        self.model_state = 'not_loaded'
+        
+        # Các mô hình đã tải được giữ theo LRU; luồng video đang chạy có thể đổi mô hình giữa hai frame
+        self.model_registry = ModelRegistry(self._load_detector, memory_budget_mb=MODEL_REGISTRY_BUDGET_MB,
+                                            memory_factor=MODEL_MEMORY_FACTOR)
+        self.active_model_path = None
+        self.pending_swap = None
+        self.swap_lock = threading.Lock()
         
         # Khởi tạo hàng đợi xử lý frame
         self.frame_queue = queue.Queue(maxsize=30)  # Giới hạn kích thước hàng đợi
         self.processing_workers = []
         self.max_workers = 2  # Số lượng worker xử lý tối đa
         
+        # Bộ lập lịch suy luận theo lô (tạo sau khi mô hình được tải)
+        self.inference_scheduler = None
+        
+        # Bộ chọn frame thích ứng của video đang xử lý
+        self.frame_sampler = None
+        
+        # Bộ lọc chuyển động trong vùng phương tiện của video đang xử lý
+        self.motion_gate = None
+        
+        # Cache kết quả phát hiện của video đang xử lý: đọc khi đã có, ghi lại khi chưa có
+        self.detection_cache = None
+        self.detection_cache_writer = None
+        
+        # Nhật ký hộp phương tiện và trạng thái đèn của video đang xử lý (cho đánh giá what-if)
+        self.track_log = None
+        
         logger.info(f"VideoProcessor đã được khởi tạo mà không tải mô hình. Mô hình sẽ được tải khi cần.")
     
     def load_model_async(self):
@@ -53,6 +92,7 @@ class VideoProcessor:
             return
             
         self.model_loading = True
+        self.model_state = 'loading'
         self.loading_thread = threading.Thread(target=self._load_model)
         self.loading_thread.daemon = True
         self.loading_thread.start()
@@ -64,20 +104,193 @@ class VideoProcessor:
         try:
             logger.info(f"Đang tải mô hình từ {self.model_path}")
             if os.path.exists(self.model_path):
-                start_time = time.time()
-                self.global_detector = TrafficDetector(self.model_path)
-                load_time = time.time() - start_time
-                logger.info(f"Đã tải mô hình trong {load_time:.2f} giây")
-                self.model_loaded = True
+                self._load_and_warmup()
             else:
+                self.model_state = 'error'
                 logger.error(f"Không tìm thấy file mô hình: {self.model_path}")
                 logger.info("Vui lòng đặt mô hình YOLO trong thư mục 'model' với tên 'v5.pt'")
         except Exception as e:
+            self.model_state = 'error'
             logger.error(f"Lỗi khi tải mô hình YOLO: {str(e)}")
             logger.error("Ứng dụng sẽ chạy ở chế độ giới hạn không có phát hiện đối tượng")
         finally:
             self.model_loading = False
     
+    def _load_and_warmup(self):
+        """
+        Tải mô hình, chạy khởi động rồi mới đánh dấu sẵn sàng để frame đầu tiên của video
+        đạt độ trễ ổn định
+        """
+        self.model_state = 'loading'
+        detector = self.model_registry.acquire(self.model_path)
+        if self.active_model_path is None:
+            self.global_detector = detector
+            self.active_model_path = self.model_path
+        else:
+            # Một mô hình khác đã được chọn (swap_model) trong lúc mô hình mặc định đang tải
+            self.model_registry.release(self.model_path)
+        self._init_inference_scheduler()
+        self.model_loaded = True
+        self.model_state = 'ready'
+    
+    def _load_detector(self, model_path):
+        """
+        Tải và khởi động một mô hình (hàm tải của sổ đăng ký mô hình)
+        
+        Tham số:
+            model_path: Đường dẫn file mô hình
+            
+        Trả về:
+            TrafficDetector: Detector đã khởi động
+        """
+        start_time = time.time()
+        detector = self._create_detector(model_path)
+        load_time = time.time() - start_time
+        logger.info(f"Đã tải mô hình trong {load_time:.2f} giây")
+        
+        # Khởi động với kích thước lô sẽ dùng khi suy luận theo lô
+        if not self.model_loaded:
+            self.model_state = 'warming_up'
+        if MODEL_WARMUP_RUNS > 0:
+            detector.warmup(runs=MODEL_WARMUP_RUNS,
+                            batch_size=BATCH_MAX_SIZE if ENABLE_BATCH_INFERENCE else 1)
+        return detector
+    
+    def _create_detector(self, model_path=None):
+        """
+        Tạo TrafficDetector theo cấu hình độ chính xác (FP32 hoặc INT8)
+        
+        Tham số:
+            model_path: Đường dẫn file mô hình (mặc định là mô hình chính); mô hình INT8 chỉ
+                thay cho mô hình chính
+        
+        Trả về:
+            TrafficDetector: Detector đã tải mô hình
+        """
+        # Nạp module mô hình (shapely, backend suy luận) khi tải mô hình, không phải khi khởi động máy chủ
+        from src.models.detector import TrafficDetector
+        
+        # Mô hình nhỏ của chế độ suy luận hai tầng
+        fast_model_path = None
+        if ENABLE_CASCADE:
+            if os.path.exists(CASCADE_FAST_MODEL_PATH):
+                fast_model_path = CASCADE_FAST_MODEL_PATH
+            else:
+                logger.warning(f"Không tìm thấy mô hình nhỏ tại {CASCADE_FAST_MODEL_PATH}, tắt suy luận hai tầng")
+        
+        if model_path and os.path.abspath(model_path) != os.path.abspath(self.model_path):
+            return TrafficDetector(model_path, fast_model_path=fast_model_path)
+        
+        if DETECTOR_PRECISION == 'int8':
+            if os.path.exists(QUANTIZED_MODEL_PATH):
+                logger.info(f"Sử dụng mô hình INT8: {QUANTIZED_MODEL_PATH}")
+                return TrafficDetector(QUANTIZED_MODEL_PATH, backend='onnx', fast_model_path=fast_model_path)
+            logger.warning(f"Không tìm thấy mô hình INT8 tại {QUANTIZED_MODEL_PATH}, sử dụng mô hình FP32")
+        return TrafficDetector(self.model_path, fast_model_path=fast_model_path)
+    
+    def _init_inference_scheduler(self):
+        """
+        Tạo bộ lập lịch suy luận theo lô cho detector toàn cục (nếu được bật trong cấu hình)
+        """
+        if not ENABLE_BATCH_INFERENCE or self.global_detector is None:
+            return
+        # Suy luận hai tầng quyết định theo trạng thái cảnh của từng frame nên chạy tuần tự
+        if self.global_detector.fast_backend is not None:
+            logger.info("Suy luận hai tầng đang bật, không dùng bộ lập lịch suy luận theo lô")
+            return
+        if self.inference_scheduler is not None:
+            self.inference_scheduler.stop()
+        self.inference_scheduler = BatchInferenceScheduler(self.global_detector,
+                                                           max_batch_size=BATCH_MAX_SIZE,
+                                                           max_wait_ms=BATCH_MAX_WAIT_MS)
+        self.inference_scheduler.start()
+    
+    def resolve_model_path(self, model_name):
+        """
+        Chuyển tên file mô hình (trong thư mục mô hình) thành đường dẫn
+        
+        Trả về:
+            str: Đường dẫn mô hình, hoặc None nếu tên không hợp lệ hoặc file không tồn tại
+        """
+        if not model_name:
+            return None
+        model_name = os.path.basename(model_name)
+        model_path = os.path.join(MODEL_DIR, model_name)
+        if not model_name.endswith(MODEL_EXTENSIONS) or not os.path.isfile(model_path):
+            return None
+        return model_path
+    
+    def list_models(self):
+        """
+        Liệt kê các file mô hình có thể chọn, mô hình đang dùng và trạng thái sổ đăng ký
+        """
+        models = sorted(name for name in os.listdir(MODEL_DIR) if name.endswith(MODEL_EXTENSIONS)) \
+            if os.path.isdir(MODEL_DIR) else []
+        return {
+            'models': models,
+            'active_model': os.path.basename(self.active_model_path) if self.active_model_path else None,
+            'registry': self.model_registry.get_stats()
+        }
+    
+    def swap_model(self, model_path):
+        """
+        Đổi mô hình của luồng video mà không dừng process_video
+        
+        Mô hình được tải (hoặc lấy từ sổ đăng ký) trong luồng gọi hàm này trong khi video vẫn
+        được xử lý bằng mô hình cũ; vòng lặp xử lý chuyển sang mô hình mới giữa hai frame.
+        
+        Tham số:
+            model_path: Đường dẫn file mô hình
+            
+        Trả về:
+            bool: True nếu mô hình đã sẵn sàng để thay
+        """
+        if not os.path.isfile(model_path):
+            logger.error(f"Không tìm thấy file mô hình: {model_path}")
+            return False
+        
+        detector = self.model_registry.acquire(model_path)
+        with self.swap_lock:
+            # Yêu cầu đổi trước đó chưa được áp dụng thì bị thay bằng yêu cầu mới
+            if self.pending_swap is not None:
+                self.model_registry.release(self.pending_swap[0])
+            self.pending_swap = (model_path, detector)
+        
+        if not self.is_processing:
+            self._apply_model_swap()
+        logger.info(f"Đã chuẩn bị đổi sang mô hình {model_path}")
+        return True
+    
+    def _apply_model_swap(self):
+        """
+        Áp dụng mô hình đang chờ đổi (gọi giữa hai frame trong vòng lặp xử lý)
+        """
+        with self.swap_lock:
+            pending, self.pending_swap = self.pending_swap, None
+        if pending is None:
+            return
+        
+        model_path, detector = pending
+        old_model_path = self.active_model_path
+        self.global_detector = detector
+        self.active_model_path = model_path
+        self.model_loaded = True
+        self.model_state = 'ready'
+        
+        if self.inference_scheduler is not None:
+            self.inference_scheduler.detector = detector
+        elif not self.is_processing:
+            self._init_inference_scheduler()
+        if hasattr(self.current_detector, 'set_detector'):
+            self.current_detector.set_detector(detector)
+        
+        # Kết quả trong cache phát hiện thuộc về mô hình cũ
+        self.detection_cache = None
+        self.detection_cache_writer = None
+        
+        self.model_registry.release(old_model_path)
+        logger.info(f"Đã đổi mô hình của luồng video sang {model_path}")
+    
     def ensure_model_loaded(self):
         """
         Đảm bảo mô hình đã được tải trước khi sử dụng
@@ -91,14 +304,11 @@ class VideoProcessor:
         if not self.model_loading:
             # Tải mô hình đồng bộ
             try:
-                start_time = time.time()
                 logger.info(f"Đang tải mô hình đồng bộ từ: {self.model_path}")
-                self.global_detector = TrafficDetector(self.model_path)
-                load_time = time.time() - start_time
-                logger.info(f"Đã tải mô hình YOLO thành công trong {load_time:.2f} giây")
-                self.model_loaded = True
+                self._load_and_warmup()
                 return True
             except Exception as e:
+                self.model_state = 'error'
                 logger.error(f"Không thể tải mô hình YOLO: {str(e)}")
                 return False
         else:
@@ -117,6 +327,12 @@ class VideoProcessor:
             video_path: Đường dẫn đến file video
             boundaries: Dữ liệu biên giới cho phát hiện vi phạm (tùy chọn)
         """
+        from src.models.violation_detector import ViolationDetector
+        
+        # Chia lại lõi CPU khi có thêm một luồng video
+        if ENABLE_THREAD_BUDGET:
+            thread_budget.acquire_stream()
+        
         try:
             # Đặt cờ đang xử lý
             self.is_processing = True
@@ -135,6 +351,10 @@ class VideoProcessor:
                 self.is_processing = False
                 return
             
+            # Dùng kết quả phát hiện đã lưu nếu video này đã được xử lý với cùng mô hình và thiết lập
+            self.detection_cache, self.detection_cache_writer = self._open_detection_cache(video_path, boundaries)
+            reached_end = False
+            
             # Lấy thông tin video
             fps = cap.get(cv2.CAP_PROP_FPS)
             frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -149,179 +369,168 @@ class VideoProcessor:
             # Tính toán khoảng thời gian giữa các frame (ms)
             frame_interval = 1000.0 / fps
             
-            # Thiết lập tốc độ phát lại (1.0 = tốc độ thực)
-            playback_speed = 1.0
+            # Thời gian theo dõi và thời điểm vi phạm tính theo đồng hồ video (chỉ số frame và PTS),
+            # nên không phụ thuộc tốc độ xử lý. Mốc của thời điểm vi phạm lấy từ chính file video
+            # (thời điểm sửa đổi), nên mọi lần xử lý cùng một file cho cùng kết quả; nguồn không phải
+            # file (luồng camera) dùng thời gian video thuần
+            if isinstance(self.current_detector, ViolationDetector):
+                try:
+                    video_start_time = datetime.fromtimestamp(os.path.getmtime(video_path))
+                except OSError:
+                    video_start_time = None
+                self.current_detector.set_video_clock(fps, video_start_time)
+            video_time_ms = -frame_interval
+            
+            # Ghi nhật ký theo dõi để đánh giá lại biên mới mà không phải phát lại video
+            self.track_log = None
+            if ENABLE_TRACK_LOG and isinstance(self.current_detector, ViolationDetector):
+                from src.services.track_log import TrackLog
+                self.track_log = TrackLog(video_path, fps)
+            
+            # Thiết lập tốc độ phát lại (1.0 = tốc độ thực, 0 = không chờ)
+            playback_speed = PLAYBACK_SPEED
             
             # Biến đếm frame và thời gian
             frame_count = 0
             processed_frames = 0
-            previous_frame_time = time.time() * 1000  # ms
             
-            # Tối ưu: Chỉ xử lý 1 frame trong mỗi N frame để giảm tải
-            process_every_n_frames = 5  # Giảm xuống 5 để xử lý nhiều frame hơn (trước đây là 3)
+            # Mốc thời gian bắt đầu phát: frame thứ i được hiển thị tại playback_start + i * frame_interval
+            playback_start = time.time() * 1000  # ms
             
-            # Tối ưu: Giữ nguyên kích thước frame để chất lượng cao hơn
-            scale_factor = 1.0  # Không giảm kích thước nữa (trước đây là 0.75)
+            # Chọn frame thích ứng: thưa khi đèn xanh, dày khi đèn đỏ, mọi frame khi xe sát vạch dừng
+            self.frame_sampler = AdaptiveFrameSampler(
+                sparse_stride=SAMPLER_SPARSE_STRIDE,
+                dense_stride=SAMPLER_DENSE_STRIDE,
+                near_line_stride=SAMPLER_NEAR_LINE_STRIDE,
+                near_line_distance=SAMPLER_NEAR_LINE_DISTANCE
+            )
+            
+            # Bỏ qua suy luận khi vùng phương tiện không có chuyển động (dùng lại kết quả frame trước)
+            self.motion_gate = None
+            if ENABLE_MOTION_GATE and isinstance(self.current_detector, ViolationDetector):
+                self.motion_gate = MotionGate(
+                    polygon_points=boundaries.get('vehiclePolygon'),
+                    downscale_width=MOTION_GATE_WIDTH,
+                    pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                    activity_threshold=MOTION_ACTIVITY_THRESHOLD,
+                    max_skipped_frames=MOTION_MAX_SKIPPED_FRAMES
+                )
+            
+            # Các frame đã gửi đi suy luận theo lô nhưng chưa được phân tích (theo thứ tự);
+            # frame không cần suy luận được xếp hàng với future=None để giữ đúng thứ tự
+            pending_frames = deque()
+            # Khi phát theo thời gian thực chỉ giữ vài frame để kết quả không bị trễ (xem BATCH_PIPELINE_DEPTH)
+            pipeline_depth = 0
+            if self.inference_scheduler:
+                pipeline_depth = self.inference_scheduler.max_batch_size
+                if playback_speed > 0:
+                    pipeline_depth = max(1, min(BATCH_PIPELINE_DEPTH, pipeline_depth))
             
             # Vòng lặp xử lý video
             while self.is_processing:
-                # Đọc frame từ video
-                ret, frame = cap.read()
+                # Đổi mô hình giữa hai frame nếu có yêu cầu
+                if self.pending_swap is not None:
+                    self._apply_model_swap()
+                
+                # Chỉ tách frame khỏi luồng (grab), việc giải mã ảnh (retrieve) để dành cho frame cần dùng
+                ret = cap.grab()
                 
                 # Nếu không đọc được frame, có thể đã hết video
                 if not ret:
                     logger.warning("Đã đọc hết video hoặc có lỗi khi đọc frame")
+                    reached_end = True
                     break
                 
+                # PTS của frame vừa tách; khi backend không cung cấp (hoặc không tăng) thì tính theo FPS
+                frame_time_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                if frame_time_ms <= video_time_ms or (frame_time_ms <= 0 and frame_count > 0):
+                    frame_time_ms = video_time_ms + frame_interval
+                video_time_ms = frame_time_ms
+                
                 try:
-                    # Tính thời gian hiện tại
-                    current_frame_time = time.time() * 1000  # ms
+                    # Thời điểm frame này cần được phát theo tốc độ phát lại
+                    if playback_speed > 0:
+                        frame_due_time = playback_start + frame_count * frame_interval / playback_speed
+                    else:
+                        frame_due_time = 0
+                    behind_schedule = playback_speed > 0 and time.time() * 1000 > frame_due_time + frame_interval
                     
-                    # Chỉ xử lý 1 frame trong mỗi N frame để giảm tải
-                    should_process = frame_count % process_every_n_frames == 0
+                    # Bước nhảy frame được chọn theo trạng thái đèn và khoảng cách xe tới vạch
+                    should_process = self.frame_sampler.should_process(frame_count)
                     
                     if should_process:
-                        # Tăng chất lượng ảnh bằng cách giữ nguyên kích thước
-                        # Nếu cần, resize lên kích thước lớn hơn để tăng chất lượng
-                        target_width = FRAME_WIDTH
-                        target_height = FRAME_HEIGHT
-                        
-                        # Chỉ resize nếu kích thước hiện tại nhỏ hơn kích thước mục tiêu
-                        if frame.shape[1] < target_width or frame.shape[0] < target_height:
-                            # Tính tỷ lệ để giữ nguyên aspect ratio
-                            ratio = min(target_width / frame.shape[1], target_height / frame.shape[0])
-                            new_width = int(frame.shape[1] * ratio)
-                            new_height = int(frame.shape[0] * ratio)
-                            
-                            # Resize frame với chất lượng cao (INTER_CUBIC)
-                            frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
+                        # Giữ nguyên độ phân giải gốc: biên được biên dịch theo kích thước frame,
+                        # mô hình tự letterbox về kích thước đầu vào
+                        ret, frame = cap.retrieve()
+                        if not ret:
+                            raise RuntimeError("Không thể giải mã frame")
                         
                         # Bắt đầu đo thời gian xử lý
                         start_time = time.time() * 1000  # ms
                         
+                        # Kiểm tra chuyển động trong vùng phương tiện trước khi suy luận
+                        has_motion = self.motion_gate.has_motion(frame) if self.motion_gate else True
+                        
+                        # Chỉ lấy kết quả từ cache cho frame cần suy luận (giống lần xử lý đã ghi cache)
+                        cached = self.detection_cache.get(frame_count) if self.detection_cache and has_motion else None
+                        
                         # Xử lý frame với detector
-                        if self.current_detector:
-                            if isinstance(self.current_detector, ViolationDetector):
-                                # Sử dụng ViolationDetector để xử lý frame
-                                annotated_frame, vehicle_counts, traffic_light_status, new_violations = self.current_detector.process_frame(frame)
-                                
-                                # Cập nhật thông tin
-                                self.vehicle_counts = vehicle_counts
-                                self.traffic_light_status = traffic_light_status
-                                
-                                # Thêm vi phạm mới vào danh sách
-                                if new_violations:
-                                    self.current_violations.extend(new_violations)
-                                    # Giới hạn số lượng vi phạm lưu trữ để tiết kiệm bộ nhớ
-                                    if len(self.current_violations) > 100:
-                                        # Chỉ giữ lại 100 vi phạm mới nhất
-                                        self.current_violations = self.current_violations[-100:]
-                            else:
-                                # Sử dụng detector thông thường để phát hiện đối tượng
-                                # Phát hiện tất cả các phương tiện trong khung hình mà không cần vùng nhận diện
-                                vehicles, traffic_lights, license_plates = self.global_detector.detect_objects(frame)
-                                
-                                # Đếm số lượng phương tiện theo loại
-                                vehicle_counts = {
-                                    'car': 0,
-                                    'motorbike': 0,
-                                    'truck': 0,
-                                    'bus': 0
-                                }
-                                
-                                # Đếm số lượng phương tiện
-                                for _, _, _, _, class_id, _ in vehicles:
-                                    if class_id == 1:  # car
-                                        vehicle_counts['car'] += 1
-                                    elif class_id == 4:  # motorbike
-                                        vehicle_counts['motorbike'] += 1
-                                    elif class_id == 6:  # truck
-                                        vehicle_counts['truck'] += 1
-                                    elif class_id == 0:  # bus
-                                        vehicle_counts['bus'] += 1
-                                
-                                # Cập nhật số lượng phương tiện
-                                self.vehicle_counts = vehicle_counts
-                                
-                                # Xác định trạng thái đèn giao thông
-                                light_counts = {'red': 0, 'yellow': 0, 'green': 0}
-                                for _, _, _, _, class_id, _ in traffic_lights:
-                                    if class_id == 5:  # red-light
-                                        light_counts['red'] += 1
-                                    elif class_id == 7:  # yellow-light
-                                        light_counts['yellow'] += 1
-                                    elif class_id == 2:  # green-light
-                                        light_counts['green'] += 1
-                                
-                                # Xác định trạng thái đèn dựa trên số lượng
-                                max_count = 0
-                                max_light = 'unknown'
-                                for light_type, count in light_counts.items():
-                                    if count > max_count:
-                                        max_count = count
-                                        max_light = light_type
-                                
-                                # Cập nhật trạng thái đèn giao thông nếu có phát hiện
-                                if max_count > 0:
-                                    self.traffic_light_status = max_light
-                                
-                                # Vẽ kết quả phát hiện lên frame
-                                annotated_frame = self.global_detector.draw_detections(frame, self.global_detector.model(frame)[0])
-                                
-                                # Hiển thị trạng thái đèn giao thông
-                                light_color = (255, 255, 255)  # Màu mặc định (trắng)
-                                if self.traffic_light_status == 'red':
-                                    light_color = (0, 0, 255)  # Đỏ
-                                elif self.traffic_light_status == 'yellow':
-                                    light_color = (0, 255, 255)  # Vàng
-                                elif self.traffic_light_status == 'green':
-                                    light_color = (0, 255, 0)  # Xanh
-                                
-                                cv2.putText(annotated_frame, f"Đèn: {self.traffic_light_status.upper()}", (10, 30), 
-                                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, light_color, 2)
-                                
-                                # Giảm log thông tin phát hiện (mỗi 100 frame thay vì 30)
-                                if processed_frames % 100 == 0:
-                                    logger.info(f"Phát hiện: Ô tô={vehicle_counts['car']}, Xe máy={vehicle_counts['motorbike']}, "
-                                                f"Xe tải={vehicle_counts['truck']}, Xe buýt={vehicle_counts['bus']}, "
-                                                f"Đèn giao thông={self.traffic_light_status}")
+                        if self.inference_scheduler and self.current_detector:
+                            # Gửi frame đi suy luận theo lô; xử lý frame cũ nhất khi pipeline đầy
+                            # hoặc khi kết quả của nó đã sẵn sàng để giữ đúng thứ tự frame
+                            future = None
+                            if cached is not None:
+                                future = Future()
+                                future.set_result(cached)
+                            elif has_motion:
+                                regions = None
+                                if isinstance(self.current_detector, ViolationDetector):
+                                    regions = self.current_detector.get_inference_regions(frame.shape[1], frame.shape[0])
+                                future = self.inference_scheduler.submit(frame, regions)
+                            pending_frames.append((frame_count, video_time_ms, frame, future, True))
+                            while pending_frames and self._pending_ready(pending_frames, pipeline_depth):
+                                processed_frames = self._publish_next_pending(pending_frames, processed_frames)
                         else:
-                            # Nếu không có detector, chỉ hiển thị frame gốc
-                            annotated_frame = frame
+                            self._process_and_publish(frame, frame_count, video_time_ms, processed_frames, cached,
+                                                      reuse_detections=not has_motion)
+                            processed_frames += 1
                         
-                        # Lưu frame đã xử lý với chất lượng cao hơn
-                        frame_path = f"frame_{frame_count % 30}.jpg"
-                        # Lưu với chất lượng cao hơn (100 thay vì mặc định 75)
-                        cv2.imwrite(os.path.join(PROCESSED_FOLDER, frame_path), annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
+                        # Cập nhật bước nhảy theo trạng thái cảnh mới nhất
+                        if isinstance(self.current_detector, ViolationDetector):
+                            self.frame_sampler.update(self.traffic_light_status,
+                                                      self.current_detector.min_distance_to_line(),
+                                                      self.current_detector.frames_to_crossing())
+                        else:
+                            self.frame_sampler.update(self.traffic_light_status)
                         
                         # Tính thời gian xử lý
                         process_time = time.time() * 1000 - start_time  # ms
                         
-                        processed_frames += 1
-                        
                         # Giảm log để tránh làm chậm hệ thống
                         if processed_frames % 100 == 0:  # Chỉ log mỗi 100 frame được xử lý thay vì 30
-                            logger.info(f"Đã xử lý {processed_frames} frames, thời gian xử lý frame hiện tại: {process_time:.1f}ms")
-                    else:
-                        # Nếu không xử lý frame này, vẫn cập nhật thời gian xử lý để tính toán delay
-                        process_time = 0
-                    
-                    # Tính toán thời gian cần delay để duy trì tốc độ phát đúng
-                    target_delay = (frame_interval / playback_speed) - process_time
+                            logger.info(f"Đã xử lý {processed_frames} frames, thời gian xử lý frame hiện tại: {process_time:.1f}ms, "
+                                        f"bước nhảy={self.frame_sampler.current_stride}")
+                    elif isinstance(self.current_detector, ViolationDetector) and not behind_schedule:
+                        # Frame không chạy nhận diện phương tiện: cập nhật trạng thái đèn và di chuyển hộp xe.
+                        # Khi còn frame chờ kết quả suy luận, frame này được xếp hàng sau chúng (giữ đúng
+                        # thứ tự frame) và được xử lý ngay khi các kết quả trước nó đã sẵn sàng.
+                        # Bỏ qua khi đang chậm so với tốc độ phát (để việc giải mã bắt kịp video)
+                        ret, frame = cap.retrieve()
+                        if ret:
+                            if pending_frames:
+                                pending_frames.append((frame_count, video_time_ms, frame, None, False))
+                                while pending_frames and self._pending_ready(pending_frames, pipeline_depth):
+                                    processed_frames = self._publish_next_pending(pending_frames, processed_frames)
+                            else:
+                                self._process_intermediate_frame(frame, frame_count, video_time_ms)
                     
-                    # Đợi để duy trì tốc độ phát chính xác
+                    # Đợi tới thời điểm phát của frame để duy trì tốc độ phát chính xác
+                    target_delay = frame_due_time - time.time() * 1000
                     if target_delay > 0:
                         time.sleep(target_delay / 1000.0)  # Chuyển đổi ms sang giây
-                        # Giảm log
-                        if frame_count % 100 == 0 and should_process:  # Giảm từ 30 xuống 100 frame
-                            logger.info(f"Frame {frame_count}: process_time={process_time:.1f}ms, delay={target_delay:.1f}ms")
-                    else:
+                    elif frame_count % 100 == 0 and should_process and playback_speed > 0:
                         # Nếu xử lý quá chậm, ghi log
-                        if frame_count % 100 == 0 and should_process:  # Giảm từ 30 xuống 100 frame
-                            logger.info(f"Frame {frame_count}: process_time={process_time:.1f}ms, không cần delay")
-                    
-                    # Cập nhật thời gian frame trước đó
-                    previous_frame_time = current_frame_time
+                        logger.info(f"Frame {frame_count}: chậm {-target_delay:.1f}ms so với tốc độ phát")
                     
                     # Tăng biến đếm frame
                     frame_count += 1
@@ -335,28 +544,300 @@ class VideoProcessor:
                     save_frame(error_frame, f"frame_{frame_count % 30}.jpg")
                     frame_count += 1
             
+            # Phân tích các frame còn lại trong pipeline suy luận theo lô
+            while pending_frames and self.is_processing:
+                pending_idx = pending_frames[0][0]
+                try:
+                    processed_frames = self._publish_next_pending(pending_frames, processed_frames)
+                except Exception as e:
+                    logger.error(f"Lỗi xử lý frame {pending_idx}: {str(e)}")
+            
             cap.release()
             logger.warning(f"Xử lý video kết thúc. Tổng số frame đã xử lý: {processed_frames}")
             
+            # Chỉ lưu cache khi đã xử lý hết video, để lần sau không thiếu phần cuối video
+            if self.detection_cache_writer and reached_end and self.is_processing:
+                try:
+                    self.detection_cache_writer.save()
+                except Exception as e:
+                    logger.error(f"Lỗi khi lưu cache phát hiện: {str(e)}")
+            
+            # Nhật ký theo dõi được lưu cả khi dừng giữa chừng (đánh giá trên phần video đã xử lý)
+            if self.track_log is not None:
+                try:
+                    self.track_log.save()
+                except Exception as e:
+                    logger.error(f"Lỗi khi lưu nhật ký theo dõi: {str(e)}")
+            
         except Exception as e:
             logger.error(f"Lỗi xử lý video: {str(e)}")
             error_frame = create_empty_frame(message=f"Lỗi: {str(e)}")
             save_frame(error_frame, "frame_error.jpg")
         finally:
             self.is_processing = False
+            if ENABLE_THREAD_BUDGET:
+                thread_budget.release_stream()
             logger.info("Xử lý video hoàn tất")
             
             # Giải phóng bộ nhớ
             import gc
             gc.collect()
     
-    def start_processing(self, video_path, boundaries=None):
+    def _open_detection_cache(self, video_path, boundaries):
+        """
+        Mở cache kết quả phát hiện của video và bộ ghi cho các frame chưa có trong cache
+        
+        Khóa cache gồm nội dung video, nội dung mô hình và các thiết lập ảnh hưởng tới kết quả
+        suy luận; vùng phát hiện chỉ thuộc khóa ở chế độ 'zones' và 'tracks' (mô hình chỉ chạy trên vùng cắt).
+        
+        Trả về:
+            (DetectionCache hoặc None nếu chưa có, DetectionCacheWriter hoặc None nếu tắt cache)
+        """
+        from src.models.violation_detector import ViolationDetector
+        from src.services.detection_cache import DetectionCache, DetectionCacheWriter, detection_cache_key, file_hash
+        
+        if not ENABLE_DETECTION_CACHE or not isinstance(self.current_detector, ViolationDetector):
+            return None, None
+        
+        try:
+            detector = self.global_detector
+            settings = {
+                'backend': detector.backend.name,
+                'input_size': detector.input_size,
+                'conf': 0.25,
+                'inference_mode': INFERENCE_MODE
+            }
+            if detector.fast_backend is not None:
+                # Frame chỉ qua mô hình nhỏ có kết quả khác mô hình đầy đủ
+                settings['cascade'] = {
+                    'model': file_hash(getattr(detector.fast_backend, 'model_path', CASCADE_FAST_MODEL_PATH)),
+                    'near_line_distance': CASCADE_NEAR_LINE_DISTANCE,
+                    'confident_score': CASCADE_CONFIDENT_SCORE,
+                    'ambiguous_ratio': CASCADE_AMBIGUOUS_RATIO
+                }
+            if INFERENCE_MODE in ('zones', 'tracks'):
+                settings['zones'] = [boundaries.get('vehiclePolygon'), boundaries.get('trafficLightPolygon')]
+                settings['zone_margin'] = ZONE_CROP_MARGIN
+            if INFERENCE_MODE == 'tracks':
+                # Vạch dừng quyết định mép vào của vùng phương tiện
+                settings['line'] = boundaries.get('line')
+            model_path = getattr(detector.backend, 'model_path', detector.model_path)
+            key = detection_cache_key(video_path, model_path, settings)
+        except Exception as e:
+            logger.error(f"Không thể tạo khóa cache phát hiện: {str(e)}")
+            return None, None
+        
+        cache = DetectionCache.open(key)
+        if cache is not None:
+            logger.info(f"Dùng cache phát hiện ({len(cache)} frame) cho video {video_path}")
+        return cache, DetectionCacheWriter(key, base=cache)
+    
+    def _pending_ready(self, pending_frames, pipeline_depth):
+        """
+        Kiểm tra frame đầu pipeline có thể được xử lý ngay không
+        
+        Frame đầu được xử lý khi kết quả suy luận của nó đã sẵn sàng (hoặc không cần suy luận), hoặc
+        khi số frame đã chọn trong pipeline đạt pipeline_depth (khi đó phải chờ kết quả của nó).
+        
+        Tham số:
+            pending_frames: Hàng đợi (frame_idx, video_time_ms, frame, future, sampled) theo thứ tự frame
+            pipeline_depth: Số frame đã chọn tối đa được giữ trong pipeline
+        """
+        future = pending_frames[0][3]
+        if future is None or future.done():
+            return True
+        return sum(1 for entry in pending_frames if entry[4]) >= pipeline_depth
+    
+    def _publish_next_pending(self, pending_frames, processed_frames):
+        """
+        Lấy frame đầu pipeline ra và xử lý: phân tích frame đã chọn, hoặc cập nhật đèn và hộp xe
+        cho frame không chạy nhận diện
+        
+        Trả về:
+            int: Số frame đã phân tích sau khi xử lý
+        """
+        frame_idx, video_time_ms, frame, future, sampled = pending_frames.popleft()
+        if not sampled:
+            self._process_intermediate_frame(frame, frame_idx, video_time_ms)
+            return processed_frames
+        self._publish_pending(frame, frame_idx, video_time_ms, processed_frames, future)
+        return processed_frames + 1
+    
+    def _process_intermediate_frame(self, frame, frame_idx, video_time_ms):
+        """
+        Cập nhật trạng thái đèn bằng bộ phân loại màu giá rẻ trên frame không chạy nhận diện phương tiện;
+        khi đèn đỏ, di chuyển hộp các xe đang theo dõi bằng optical flow để phát hiện vượt vạch
+        đúng frame dù mô hình chỉ chạy mỗi vài frame
+        
+        Tham số:
+            frame: Frame đã giải mã
+            frame_idx: Chỉ số của frame trong video
+            video_time_ms: Thời điểm của frame trong video (ms, PTS)
+        """
+        self.traffic_light_status = self.current_detector.update_light_state(frame)
+        moved_vehicles = []
+        if self.traffic_light_status == 'red' and len(self.current_detector.tracks):
+            self._add_violations(self.current_detector.propagate_frame(frame, frame_idx, video_time_ms))
+            moved_vehicles = self.current_detector.last_propagated_vehicles
+        
+        # Ghi trạng thái đèn và hộp đã di chuyển để lần chạy lại (what-if) khớp với lần chạy trực tiếp
+        if self.track_log is not None:
+            self.track_log.add(frame_idx, moved_vehicles, self.traffic_light_status,
+                               (frame.shape[1], frame.shape[0]), propagated=True)
+    
+    def _publish_pending(self, frame, frame_idx, video_time_ms, processed_frames, future):
+        """
+        Phân tích một frame lấy ra từ pipeline suy luận theo lô
+        
+        Tham số:
+            future: Kết quả suy luận của frame, hoặc None nếu bộ lọc chuyển động đã bỏ qua suy luận
+        """
+        if future is None:
+            self._process_and_publish(frame, frame_idx, video_time_ms, processed_frames, reuse_detections=True)
+        else:
+            self._process_and_publish(frame, frame_idx, video_time_ms, processed_frames, future.result())
+    
+    def _process_and_publish(self, frame, frame_idx, video_time_ms, processed_frames, detections=None,
+                             reuse_detections=False):
+        """
+        Phân tích một frame đã chọn và lưu frame đã chú thích để giao diện web hiển thị
+        
+        Tham số:
+            frame: Frame cần xử lý
+            frame_idx: Chỉ số của frame trong video
+            video_time_ms: Thời điểm của frame trong video (ms, PTS)
+            processed_frames: Số frame đã xử lý trước đó (dùng để giảm log)
+            detections: Kết quả phát hiện đã có của frame (ví dụ từ bộ suy luận theo lô)
+            reuse_detections: Dùng lại kết quả phát hiện và trạng thái đèn của frame trước (không có chuyển động)
+        """
+        from src.models.violation_detector import ViolationDetector
+        
+        # Xử lý frame với detector
+        if self.current_detector:
+            if isinstance(self.current_detector, ViolationDetector):
+                # Kết quả lấy từ cache: frame chỉ được theo dõi và vẽ, không chạy lại mô hình tìm biển số
+                from_cache = (detections is not None and self.detection_cache is not None
+                              and frame_idx in self.detection_cache)
+                
+                # Sử dụng ViolationDetector để xử lý frame
+                annotated_frame, vehicle_counts, traffic_light_status, new_violations = self.current_detector.process_frame(
+                    frame, detections, reuse_detections=reuse_detections, frame_idx=frame_idx,
+                    video_time_ms=video_time_ms, from_cache=from_cache)
+                
+                # Ghi lại kết quả phát hiện vừa suy luận (frame chưa có trong cache) để lần xử lý sau dùng lại
+                if self.detection_cache_writer and not reuse_detections:
+                    self.detection_cache_writer.add(frame_idx, self.current_detector.last_detections)
+                
+                # Ghi mọi phương tiện (chưa lọc theo vùng) và trạng thái đèn đã dùng khi theo dõi frame này
+                if self.track_log is not None:
+                    self.track_log.add(frame_idx, self.current_detector.last_detections.vehicles,
+                                       traffic_light_status, (frame.shape[1], frame.shape[0]))
+
+                # Cập nhật thông tin
+                self.vehicle_counts = vehicle_counts
+                self.traffic_light_status = traffic_light_status
+
+                # Thêm vi phạm mới vào danh sách
+                self._add_violations(new_violations)
+            else:
+                # Sử dụng detector thông thường để phát hiện đối tượng
+                # Phát hiện tất cả các phương tiện trong khung hình mà không cần vùng nhận diện
+                if detections is None:
+                    detections = self.global_detector.detect(frame)
+                vehicles, traffic_lights, license_plates = detections.as_tuple()
+
+                # Đếm số lượng phương tiện theo loại
+                vehicle_counts = {
+                    'car': 0,
+                    'motorbike': 0,
+                    'truck': 0,
+                    'bus': 0
+                }
+
+                # Đếm số lượng phương tiện
+                for _, _, _, _, class_id, _ in vehicles:
+                    if class_id == 1:  # car
+                        vehicle_counts['car'] += 1
+                    elif class_id == 4:  # motorbike
+                        vehicle_counts['motorbike'] += 1
+                    elif class_id == 6:  # truck
+                        vehicle_counts['truck'] += 1
+                    elif class_id == 0:  # bus
+                        vehicle_counts['bus'] += 1
+
+                # Cập nhật số lượng phương tiện
+                self.vehicle_counts = vehicle_counts
+
+                # Xác định trạng thái đèn giao thông
+                light_counts = {'red': 0, 'yellow': 0, 'green': 0}
+                for _, _, _, _, class_id, _ in traffic_lights:
+                    if class_id == 5:  # red-light
+                        light_counts['red'] += 1
+                    elif class_id == 7:  # yellow-light
+                        light_counts['yellow'] += 1
+                    elif class_id == 2:  # green-light
+                        light_counts['green'] += 1
+
+                # Xác định trạng thái đèn dựa trên số lượng
+                max_count = 0
+                max_light = 'unknown'
+                for light_type, count in light_counts.items():
+                    if count > max_count:
+                        max_count = count
+                        max_light = light_type
+
+                # Cập nhật trạng thái đèn giao thông nếu có phát hiện
+                if max_count > 0:
+                    self.traffic_light_status = max_light
+
+                # Vẽ kết quả phát hiện lên frame
+                annotated_frame = self.global_detector.draw_detections(frame, detections)
+
+                # Hiển thị trạng thái đèn giao thông
+                light_color = (255, 255, 255)  # Màu mặc định (trắng)
+                if self.traffic_light_status == 'red':
+                    light_color = (0, 0, 255)  # Đỏ
+                elif self.traffic_light_status == 'yellow':
+                    light_color = (0, 255, 255)  # Vàng
+                elif self.traffic_light_status == 'green':
+                    light_color = (0, 255, 0)  # Xanh
+
+                cv2.putText(annotated_frame, f"Đèn: {self.traffic_light_status.upper()}", (10, 30), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, light_color, 2)
+
+                # Giảm log thông tin phát hiện (mỗi 100 frame thay vì 30)
+                if processed_frames % 100 == 0:
+                    logger.info(f"Phát hiện: Ô tô={vehicle_counts['car']}, Xe máy={vehicle_counts['motorbike']}, "
+                                f"Xe tải={vehicle_counts['truck']}, Xe buýt={vehicle_counts['bus']}, "
+                                f"Đèn giao thông={self.traffic_light_status}")
+        else:
+            # Nếu không có detector, chỉ hiển thị frame gốc
+            annotated_frame = frame
+
+        # Lưu frame đã xử lý với chất lượng cao hơn
+        frame_path = f"frame_{frame_idx % 30}.jpg"
+        # Lưu với chất lượng cao hơn (100 thay vì mặc định 75)
+        cv2.imwrite(os.path.join(PROCESSED_FOLDER, frame_path), annotated_frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    
+    def _add_violations(self, new_violations):
+        """
+        Thêm vi phạm mới vào danh sách vi phạm hiện tại
+        """
+        if new_violations:
+            self.current_violations.extend(new_violations)
+            # Giới hạn số lượng vi phạm lưu trữ để tiết kiệm bộ nhớ
+            if len(self.current_violations) > 100:
+                # Chỉ giữ lại 100 vi phạm mới nhất
+                self.current_violations = self.current_violations[-100:]
+    
+    def start_processing(self, video_path, boundaries=None, model_path=None):
         """
         Bắt đầu xử lý video trong một luồng riêng biệt
         
         Tham số:
             video_path: Đường dẫn đến file video
             boundaries: Dữ liệu biên giới (tùy chọn)
+            model_path: Mô hình riêng cho camera/video này (tùy chọn, mặc định giữ mô hình đang dùng)
             
         Trả về:
             bool: True nếu bắt đầu xử lý thành công, False nếu không
@@ -383,6 +864,10 @@ class VideoProcessor:
         # Xóa các frame cũ trước khi bắt đầu video mới
         clear_processed_frames()
         
+        # Trọng số riêng của camera: lấy từ sổ đăng ký (chỉ tải nếu chưa được giữ lại)
+        if model_path and os.path.abspath(model_path) != os.path.abspath(self.active_model_path or ''):
+            self.swap_model(model_path)
+        
         # Đảm bảo model được tải (hoặc bắt đầu tải nếu chưa)
         if not self.model_loaded and not self.model_loading:
             self.load_model_async()
@@ -437,8 +922,12 @@ class VideoProcessor:
         """
         self.current_boundaries = boundaries
         
+        # Bộ lọc chuyển động phải kiểm tra vùng phương tiện mới, nếu không có thể bỏ qua suy luận sai
+        if self.motion_gate is not None:
+            self.motion_gate.set_polygon(boundaries.get('vehiclePolygon'))
+        
         # Cập nhật biên trong bộ phát hiện vi phạm nếu đang hoạt động
-        if self.current_detector is not None and isinstance(self.current_detector, ViolationDetector):
+        if self.current_detector is not None and hasattr(self.current_detector, 'update_boundaries'):
             try:
                 self.current_detector.update_boundaries(boundaries)
                 logger.info("Đã cập nhật biên trong bộ phát hiện hiện tại")
@@ -449,6 +938,40 @@ class VideoProcessor:
         
         return False
     
+    def evaluate_boundaries(self, boundaries, video_id=None):
+        """
+        Đánh giá số vi phạm mà biên mới sẽ tạo ra trên toàn bộ phần video đã xử lý
+        
+        Chạy lại logic vượt vạch trên nhật ký theo dõi, không giải mã video và không cần mô hình đã tải.
+        
+        Tham số:
+            boundaries: Dữ liệu biên cần đánh giá
+            video_id: ID video đã tải lên (mặc định là video đang/vừa xử lý)
+            
+        Trả về:
+            dict: Danh sách vi phạm và thông tin nhật ký, hoặc None nếu chưa có nhật ký của video
+        """
+        from src.services.track_log import TrackLog, replay_violations
+        
+        track_log = None
+        if video_id is None or (self.current_video_path
+                                and os.path.basename(self.current_video_path).startswith(f"{video_id}_")):
+            track_log = self.track_log
+        if track_log is None and video_id is not None:
+            track_log = TrackLog.find(video_id)
+        if track_log is None or not len(track_log):
+            return None
+        
+        start_time = time.time()
+        vehicle_classes = self.global_detector.vehicle_classes if self.global_detector is not None else None
+        violations = replay_violations(track_log, boundaries, vehicle_classes)
+        return {
+            'violations': violations,
+            'violation_count': len(violations),
+            'frames': len(track_log),
+            'elapsed_ms': round((time.time() - start_time) * 1000, 1)
+        }
+    
     def get_stats(self):
         """
         Lấy thống kê hiện tại
@@ -486,9 +1009,45 @@ class VideoProcessor:
             'traffic_light_status': self.traffic_light_status,
             'traffic_light_status_vi': light_status_vi,
             'violation_count': len(self.current_violations),
+            'inference_batching': self.inference_scheduler.get_stats() if self.inference_scheduler else None,
+            'cascade': self.global_detector.get_cascade_stats() if self.global_detector else None,
+            'light_engine': self._get_light_engine_stats(),
+            'box_propagation': self._get_box_propagation_stats(),
+            'plate_tiling': self.current_detector.get_plate_tiling_stats() if hasattr(self.current_detector, 'get_plate_tiling_stats') else None,
+            'plate_crops': self.current_detector.get_plate_crop_stats() if hasattr(self.current_detector, 'get_plate_crop_stats') else None,
+            'roi_inference': self.current_detector.get_roi_stats() if hasattr(self.current_detector, 'get_roi_stats') else None,
+            'track_store': self.current_detector.tracks.get_stats() if hasattr(self.current_detector, 'tracks') else None,
+            'thread_budget': thread_budget.get_stats(),
+            'detection_cache': self.detection_cache_writer.get_stats() if self.detection_cache_writer else None,
+            'model_state': self.model_state,
+            'model_ready': self.model_state == 'ready',
+            'model_warmup': self.global_detector.warmup_stats if self.global_detector else None,
+            'active_model': os.path.basename(self.active_model_path) if self.active_model_path else None,
+            'model_registry': self.model_registry.get_stats(),
+            'frame_stride': self.frame_sampler.current_stride if self.frame_sampler else None,
+            'motion_gate': self.motion_gate.get_stats() if self.motion_gate else None,
             'timestamp': int(time.time() * 1000)  # Thêm timestamp để tránh cache trình duyệt
         }
     
+    def _get_light_engine_stats(self):
+        """
+        Lấy thống kê của bộ xác định trạng thái đèn (nếu có)
+        """
+        # Chỉ ViolationDetector có light_engine (kiểm tra thuộc tính để không phải nạp module mô hình)
+        light_engine = getattr(self.current_detector, 'light_engine', None)
+        if light_engine:
+            return light_engine.get_stats()
+        return None
+    
+    def _get_box_propagation_stats(self):
+        """
+        Lấy thống kê di chuyển hộp bằng optical flow (nếu có)
+        """
+        box_propagator = getattr(self.current_detector, 'box_propagator', None)
+        if box_propagator:
+            return box_propagator.get_stats()
+        return None
+    
     def get_violations(self, page=1, per_page=10):
         """
         Lấy danh sách vi phạm có phân trang
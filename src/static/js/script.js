@@ -1867,6 +1867,9 @@ function setupEventListeners() {
 
 // Hàm simulateTrafficLights đã được định nghĩa trước đó
 
+// Trạng thái sẵn sàng của mô hình lần kiểm tra trước
+let lastModelState = null;
+
 // Lấy dữ liệu thống kê từ API
 async function getStats() {
     try {
@@ -1875,6 +1878,16 @@ async function getStats() {
         
         if (!data) return;
         
+            // Thông báo khi mô hình đã tải và khởi động xong
+            if (data.model_state && data.model_state !== lastModelState) {
+                if (data.model_state === 'ready' && lastModelState !== null) {
+                    showToast('Mô hình đã sẵn sàng', 'success');
+                } else if (data.model_state === 'error') {
+                    showToast('Không thể tải mô hình nhận diện', 'error');
+                }
+                lastModelState = data.model_state;
+            }
+            
             // Cập nhật số lượng phương tiện
             const vehicleCounts = data.vehicle_counts || {};
             
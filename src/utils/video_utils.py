@@ -172,4 +172,44 @@ def read_frame(file_path):
         return frame
     except Exception as e:
         logger.error(f"Lỗi khi đọc frame: {str(e)}")
-        return None 
\ No newline at end of file
+        return None 
+
+def sample_video_frames(video_path, count=32, synthetic_size=(1080, 1920)):
+    """
+    Lấy mẫu các frame cách đều nhau từ một video (dùng cho benchmark và hiệu chỉnh)
+    
+    Args:
+        video_path: Đường dẫn video, hoặc None để tạo frame ngẫu nhiên
+        count: Số frame cần lấy
+        synthetic_size: Kích thước (height, width) của frame ngẫu nhiên khi không có video
+        
+    Returns:
+        list: Danh sách frame (np.ndarray BGR)
+    """
+    if not video_path:
+        rng = np.random.default_rng(0)
+        height, width = synthetic_size
+        return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+    
+    frames = []
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, total // count) if total > 0 else 1
+        
+        frame_idx = 0
+        while len(frames) < count:
+            ret = cap.grab()
+            if not ret:
+                break
+            if frame_idx % step == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    frames.append(frame)
+            frame_idx += 1
+    finally:
+        cap.release()
+    
+    if not frames:
+        logger.warning(f"Không đọc được frame nào từ video: {video_path}")
+    return frames
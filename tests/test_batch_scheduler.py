@@ -0,0 +1,30 @@
+"""
+Kiểm thử bộ lập lịch suy luận theo lô
+"""
+import pytest
+
+from src.services.batch_scheduler import BatchInferenceScheduler
+
+class FakeDetector:
+    def detect_batch(self, images):
+        return [f"detections-{image}" for image in images]
+
+def test_stop_fails_pending_requests():
+    scheduler = BatchInferenceScheduler(FakeDetector())
+    # Không khởi động thread: các yêu cầu nằm lại trong hàng đợi khi dừng
+    scheduler.running = True
+    futures = [scheduler.submit(index, regions=None) for index in range(3)]
+    scheduler.stop()
+
+    for future in futures:
+        assert future.done()
+        with pytest.raises(RuntimeError):
+            future.result(timeout=0)
+    assert scheduler.request_queue.empty()
+
+def test_infer_runs_batch():
+    scheduler = BatchInferenceScheduler(FakeDetector(), max_batch_size=2, max_wait_ms=0)
+    try:
+        assert scheduler.infer("frame", timeout=5) == "detections-frame"
+    finally:
+        scheduler.stop()
@@ -0,0 +1,31 @@
+"""
+Kiểm thử bộ xác định trạng thái đèn giao thông
+"""
+import numpy as np
+
+from src.models.light_state import TrafficLightStateEngine
+
+def run_fallbacks(engine, frames):
+    runs = 0
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for _ in range(frames):
+        if engine.needs_detector():
+            runs += 1
+            engine.observe_detections([])
+        elif engine.is_locked:
+            engine.classify(frame)
+        else:
+            engine.skip_frame()
+    return runs
+
+def test_unlocked_fallback_is_rate_limited():
+    engine = TrafficLightStateEngine(refresh_interval=30, retry_interval=10)
+    # Frame đầu tiên chạy YOLO, sau đó mỗi lần cách nhau 10 frame không chạy YOLO
+    assert run_fallbacks(engine, 100) == len(range(0, 100, 11))
+
+def test_low_confidence_fallback_is_rate_limited():
+    engine = TrafficLightStateEngine(lock_after=1, refresh_interval=30, retry_interval=5)
+    engine.observe_detections([(10, 10, 20, 30, 5, 0.9)])
+    assert engine.is_locked
+    # Vùng đèn tối: phân loại màu không chắc chắn ở mọi frame
+    assert run_fallbacks(engine, 50) == len(range(5, 50, 6))
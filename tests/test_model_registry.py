@@ -0,0 +1,41 @@
+"""
+Kiểm thử sổ đăng ký mô hình
+"""
+import threading
+
+from src.services.model_registry import ModelRegistry
+
+def test_stats_and_other_models_not_blocked_while_loading(tmp_path):
+    started = threading.Event()
+    finish = threading.Event()
+    loaded = []
+
+    def loader(model_path):
+        loaded.append(model_path)
+        if model_path.endswith('slow.pt'):
+            started.set()
+            assert finish.wait(timeout=5)
+        return f"detector:{model_path}"
+
+    registry = ModelRegistry(loader)
+    slow_path = str(tmp_path / 'slow.pt')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.acquire(slow_path))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(timeout=5)
+
+    # Trong lúc mô hình chậm đang tải: thống kê thấy nó đang tải, mô hình khác vẫn tải được
+    assert registry.get_stats()['loading'] == ['slow.pt']
+    assert registry.acquire(str(tmp_path / 'fast.pt')).endswith('fast.pt')
+
+    finish.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    # Hai luồng cùng yêu cầu mô hình chậm chỉ tải một lần và cùng giữ nó
+    assert results == [f"detector:{slow_path}"] * 2
+    assert loaded.count(slow_path) == 1
+    stats = registry.get_stats()
+    assert stats['loading'] == []
+    assert {entry['model']: entry['refs'] for entry in stats['resident']} == {'slow.pt': 2, 'fast.pt': 1}
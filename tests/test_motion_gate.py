@@ -0,0 +1,26 @@
+"""
+Kiểm thử bộ lọc chuyển động trong vùng phương tiện
+"""
+import numpy as np
+
+from src.services.motion_gate import MotionGate
+
+LEFT_HALF = [{'x': 0, 'y': 0}, {'x': 0.5, 'y': 0}, {'x': 0.5, 'y': 1}, {'x': 0, 'y': 1}]
+RIGHT_HALF = [{'x': 0.5, 'y': 0}, {'x': 1, 'y': 0}, {'x': 1, 'y': 1}, {'x': 0.5, 'y': 1}]
+
+def frame_with_block(x):
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    frame[40:80, x:x + 20] = 255
+    return frame
+
+def test_polygon_change_checks_the_new_region():
+    gate = MotionGate(polygon_points=LEFT_HALF, max_skipped_frames=100)
+    assert gate.has_motion(frame_with_block(100))
+    # Chuyển động chỉ xảy ra ở nửa phải: nằm ngoài vùng cũ
+    assert not gate.has_motion(frame_with_block(120))
+
+    gate.set_polygon(RIGHT_HALF)
+    # Frame đầu tiên sau khi đổi vùng luôn được suy luận, sau đó chuyển động ở nửa phải được phát hiện
+    assert gate.has_motion(frame_with_block(120))
+    assert gate.has_motion(frame_with_block(140))
+    assert not gate.has_motion(frame_with_block(140))
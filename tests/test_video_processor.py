@@ -0,0 +1,87 @@
+"""
+Kiểm thử vòng lặp xử lý video với bộ lập lịch suy luận theo lô
+"""
+import time
+
+import cv2
+import numpy as np
+
+from src.models.violation_detector import ViolationDetector
+from src.services import video_processor
+from src.services.batch_scheduler import BatchInferenceScheduler
+from src.services.video_processor import VideoProcessor
+
+class SlowDetector:
+    """
+    Detector giả: kết quả chỉ sẵn sàng sau một khoảng thời gian, nên frame đã chọn
+    còn nằm trong pipeline khi các frame không chạy nhận diện tới
+    """
+    def detect_batch(self, images):
+        time.sleep(0.02)
+        return [None] * len(images)
+
+class RecordingViolationDetector(ViolationDetector):
+    """
+    ViolationDetector giả: ghi lại thứ tự các frame được phân tích và được di chuyển hộp xe
+    """
+    def __init__(self):
+        self.calls = []
+        self.tracks = [object()]
+        self.last_detections = None
+
+    def set_video_clock(self, fps, start_time=None):
+        pass
+
+    def get_inference_regions(self, frame_width, frame_height):
+        return None
+
+    def process_frame(self, frame, detections=None, reuse_detections=False, frame_idx=None, video_time_ms=None,
+                      from_cache=False):
+        self.calls.append(('process', frame_idx))
+        return frame, {}, 'red', []
+
+    def update_light_state(self, frame):
+        return 'red'
+
+    def propagate_frame(self, frame, frame_idx=None, video_time_ms=None):
+        self.calls.append(('propagate', frame_idx))
+        return []
+
+    def min_distance_to_line(self):
+        return None
+
+    def frames_to_crossing(self):
+        return None
+
+def write_video(path, frame_count):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+    for index in range(frame_count):
+        writer.write(np.full((48, 64, 3), index, dtype=np.uint8))
+    writer.release()
+
+def test_batched_stream_propagates_intermediate_frames(tmp_path, monkeypatch):
+    for name in ('ENABLE_MOTION_GATE', 'ENABLE_DETECTION_CACHE', 'ENABLE_TRACK_LOG', 'ENABLE_THREAD_BUDGET'):
+        monkeypatch.setattr(video_processor, name, False)
+    monkeypatch.setattr(video_processor, 'PLAYBACK_SPEED', 0)
+    monkeypatch.setattr(video_processor, 'PROCESSED_FOLDER', str(tmp_path))
+
+    video_path = tmp_path / 'stream.avi'
+    write_video(video_path, 30)
+
+    processor = VideoProcessor(model_path=None)
+    processor.global_detector = SlowDetector()
+    processor.model_loaded = True
+    processor.inference_scheduler = BatchInferenceScheduler(processor.global_detector, max_batch_size=4)
+    detector = RecordingViolationDetector()
+    processor.current_detector = detector
+    try:
+        processor.process_video(str(video_path))
+    finally:
+        processor.inference_scheduler.stop()
+
+    processed = [frame_idx for kind, frame_idx in detector.calls if kind == 'process']
+    propagated = [frame_idx for kind, frame_idx in detector.calls if kind == 'propagate']
+    assert processed and propagated
+    # Mọi frame không chạy nhận diện đều được di chuyển hộp xe, theo đúng thứ tự frame
+    assert sorted(processed + propagated) == list(range(30))
+    assert [frame_idx for _, frame_idx in detector.calls] == list(range(30))
@@ -0,0 +1,80 @@
+"""
+Kiểm thử theo dõi phương tiện và phát hiện vượt vạch của ViolationDetector
+"""
+import numpy as np
+
+from src.core.config import TRACK_MAX_MISSES
+from src.models import violation_detector as violation_module
+from src.models.detector import Detections
+from src.models.violation_detector import ViolationDetector
+
+BOUNDARIES = {
+    'line': [{'x': 0.1, 'y': 0.5}, {'x': 0.9, 'y': 0.5}],
+    'vehiclePolygon': [{'x': 0, 'y': 0}, {'x': 1, 'y': 0}, {'x': 1, 'y': 1}, {'x': 0, 'y': 1}],
+    'trafficLightPolygon': [{'x': 0, 'y': 0}, {'x': 0.05, 'y': 0}, {'x': 0.05, 'y': 0.05}]
+}
+
+class ClassNames:
+    vehicle_classes = {2: 'car'}
+
+class ShiftPropagator:
+    """
+    Optical flow giả: mọi hộp dịch lên trên một khoảng cố định mỗi frame
+    """
+    def __init__(self, dy):
+        self.dy = dy
+
+    def propagate(self, frame, boxes):
+        return [(x1, y1 - self.dy, x2, y2 - self.dy) for x1, y1, x2, y2 in boxes]
+
+    def set_reference(self, frame):
+        pass
+
+def make_detector(monkeypatch):
+    detector = ViolationDetector(ClassNames(), BOUNDARIES)
+    detector.compile_boundaries(1280, 720)
+    detector.box_propagator = ShiftPropagator(dy=5)
+    detector.current_light_status = 'red'
+    writes = []
+    monkeypatch.setattr(violation_module.cv2, 'imwrite', lambda path, image, *args: writes.append(path))
+    return detector, writes
+
+def test_propagated_boxes_are_not_measurements(monkeypatch):
+    detector, writes = make_detector(monkeypatch)
+    detector.replay_frame([(100, 500, 150, 600, 2, 0.9)], 0)
+    slot = int(detector.tracks.active_slots()[0])
+    state = detector.motion_model.state[slot].copy()
+
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    for frame_idx in range(1, 6):
+        detector.propagate_frame(frame, frame_idx)
+
+    # Hộp và lịch sử đi theo optical flow, trạng thái Kalman và số frame bỏ sót giữ nguyên
+    assert detector.tracks.boxes[slot, 3] == 575
+    assert detector.tracks.history_count[slot] == 6
+    assert detector.tracks.last_frame[slot] == 0
+    assert np.array_equal(detector.motion_model.state[slot], state)
+    assert not writes
+
+    # Mô hình không phát hiện lại phương tiện: nó bị xóa sau TRACK_MAX_MISSES frame phân tích
+    for frame_idx in range(6, 7 + TRACK_MAX_MISSES):
+        detector.replay_frame([], frame_idx)
+    assert len(detector.tracks) == 0
+
+def test_cached_detections_skip_plate_inference(monkeypatch):
+    detector, _ = make_detector(monkeypatch)
+    detector.light_engine = None
+    plate_calls = []
+    monkeypatch.setattr(detector, 'detect_plates_tiled',
+                        lambda frame, plates: plate_calls.append('tiled') or plates)
+    monkeypatch.setattr(detector, 'detect_vehicle_plates',
+                        lambda frame, boxes: plate_calls.append('crop') or [None] * len(boxes))
+
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    for frame_idx, (y1, y2) in enumerate(((500, 600), (200, 300))):
+        detections = Detections([(100, y1, 200, y2)], [0.9], [1])
+        detector.process_frame(frame, detections, frame_idx=frame_idx, from_cache=True)
+
+    # Vi phạm vẫn được ghi nhận, nhưng không chạy lại mô hình tìm biển số
+    assert len(detector.violations) == 1
+    assert not plate_calls